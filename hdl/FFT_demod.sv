@@ -214,6 +214,9 @@ if (HALF_CP_ADVANCE) begin
     reg [MULT_DELAY - 1 : 0] last_SC_delay;
     reg [USER_WIDTH_OUT - 1 : 0] meta_delay [MULT_DELAY - 1 : 0];
 
+    // One lut is correct for CP1 and CP2 symbols: the phase of a carrier only depends on how many samples
+    // before the end of the CP the FFT window starts. SKIP_CP skips CP_LEN - CP2 / 2 samples of every symbol,
+    // so this is CP2 / 2 for both CP lengths. A second lut is only needed if this advance becomes different per symbol.
     reg [OUT_DW - 1 : 0] coeff [0 : 2**NFFT - 1];
     reg [NFFT - 1 : 0] coeff_idx;
 
@@ -37,7 +37,11 @@ reg [OUTPUT_WIDTH - 1 : 0]  atan_lut[0 : MAX_LUT_IN_VAL];
 initial begin
     $display("tan lut has %d entries", MAX_LUT_IN_VAL+1);
     for (integer i = 0; i <= MAX_LUT_IN_VAL; i = i + 1) begin
-        atan_lut[i] = $atan($itor(i)/MAX_LUT_IN_VAL) / (3.14159 / 4) * MAX_LUT_OUT_VAL;
+        // 3.14159 is slightly less than pi, the last entry has to be limited so that it does not wrap around
+        if ($atan($itor(i)/MAX_LUT_IN_VAL) / (3.14159 / 4) * MAX_LUT_OUT_VAL > MAX_LUT_OUT_VAL)
+            atan_lut[i] = MAX_LUT_OUT_VAL;
+        else
+            atan_lut[i] = $atan($itor(i)/MAX_LUT_IN_VAL) / (3.14159 / 4) * MAX_LUT_OUT_VAL;
         // $display("atan %d  = %d", i, atan_lut[i]);
     end
 end
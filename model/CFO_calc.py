@@ -0,0 +1,97 @@
+import numpy as np
+import importlib.util
+import os
+
+spec = importlib.util.spec_from_file_location('atan2', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'atan2.py'))
+atan2 = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(atan2)
+spec = importlib.util.spec_from_file_location('complex_multiplier', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'complex_multiplier.py'))
+complex_multiplier = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(complex_multiplier)
+
+
+class Model:
+    '''
+    Bit exact model of the outputs of CFO_calc.sv for arrays of (C0, C1) pairs
+
+    INPUT_SCALING lowers input_max_used_MSB until one of the four C_DW / 2 bit parts of C0 and C1 uses that bit
+    (for negative numbers a used bit is a 0) or it reaches 0, then all parts are shifted left so that the largest
+    part uses bit C_DW / 2 - 2. complex_multiplier calculates C0 * conj(C1) and keeps the upper ATAN_IN_DW bits
+    of the C_DW + 1 bit results, atan2 calculates the angle from these and CFO_DDS_inc is angle >>> 7.
+    calc() does all steps for all pairs at once. For C_DW > 62 the words are python ints (object arrays).
+
+    latency() is the number of clock edges from the edge that samples valid_i to the edge that sets valid_o,
+    it depends on the number of clock cycles that INPUT_SCALING needs for a pair.
+    '''
+    def __init__(self, C_DW = 32, CFO_DW = 20, DDS_DW = 20, ATAN_IN_DW = 8):
+        self.C_DW = int(C_DW)
+        self.CFO_DW = int(CFO_DW)
+        self.DDS_DW = int(DDS_DW)
+        self.ATAN_IN_DW = int(ATAN_IN_DW)
+        self.OP_DW = self.C_DW // 2
+        self.dtype = np.int64 if self.C_DW <= 62 else object
+        self.atan2 = atan2.Model(self.ATAN_IN_DW, self.ATAN_IN_DW, self.CFO_DW)
+        self.mult = complex_multiplier.Model(self.OP_DW, self.OP_DW, self.ATAN_IN_DW)
+
+    def _signed(self, val, bits):
+        val = (np.asarray(val) & ((1 << bits) - 1)).astype(self.dtype)
+        return np.where(val >> (bits - 1), val - (1 << bits), val)
+
+    def unpack(self, C):
+        """real and imaginary part of packed C_DW bit words"""
+        C = np.asarray(C).astype(self.dtype)
+        return self._signed(C, self.OP_DW), self._signed(C >> self.OP_DW, self.OP_DW)
+
+    def pack(self, re, im):
+        MASK = (1 << self.OP_DW) - 1
+        return (np.asarray(re).astype(self.dtype) & MASK) | ((np.asarray(im).astype(self.dtype) & MASK) << self.OP_DW)
+
+    def max_used_MSB(self, parts):
+        """value of input_max_used_MSB at the end of INPUT_SCALING, parts has shape (4, ...)"""
+        parts = np.asarray(parts).astype(self.dtype)
+        # for negative numbers a bit is used if it is 0, that is the same as for the positive number ~x
+        used = np.where(parts < 0, ~parts, parts)
+        MSB = np.zeros(parts.shape[1:], np.int64)
+        for pos in range(1, self.OP_DW - 1):
+            MSB = np.where(np.any((used >> pos) != 0, axis = 0), pos, MSB)
+        return MSB
+
+    def scale(self, C0, C1):
+        """C0 and C1 after INPUT_SCALING as packed words and the number of clock cycles spent in INPUT_SCALING"""
+        C0_re, C0_im = self.unpack(C0)
+        C1_re, C1_im = self.unpack(C1)
+        MSB = self.max_used_MSB([C0_im, C0_re, C1_im, C1_re])
+        shift = self.OP_DW - 2 - MSB
+        scaled = [self._signed(part << shift, self.OP_DW) for part in (C0_re, C0_im, C1_re, C1_im)]
+        return self.pack(scaled[0], scaled[1]), self.pack(scaled[2], scaled[3]), shift + 1
+
+    def multiply(self, C0, C1):
+        """prod_re and prod_im, the upper ATAN_IN_DW bits of C0 * conj(C1)"""
+        a_re, a_im = self.unpack(C0)
+        C1_re, C1_im = self.unpack(C1)
+        # C1_conj negates the imaginary part in OP_DW bits
+        return self.mult.multiply(a_re, a_im, C1_re, -C1_im)
+
+    def DDS_inc(self, angle):
+        """CFO_DDS_inc_o for CFO_angle_o"""
+        angle_rshift7 = np.asarray(angle, np.int64) >> 7
+        if self.CFO_DW >= self.DDS_DW:
+            return angle_rshift7 >> (self.CFO_DW - self.DDS_DW)
+        return angle_rshift7
+
+    def latency(self, C0, C1):
+        _, _, scaling_clks = self.scale(C0, C1)
+        # WAIT_FOR_MULT sets atan_valid_in one clock cycle after the product is valid, atan2 samples it with
+        # the next edge, CALC_ATAN and OUTPUT take one clock cycle each
+        return scaling_clks + self.mult.LATENCY + self.atan2.LATENCY + 4
+
+    def calc(self, C0, C1):
+        '''
+        CFO_angle_o and CFO_DDS_inc_o for arrays of C0_i and C1_i words
+
+        The results are signed int64 arrays with CFO_DW and DDS_DW bit values.
+        '''
+        C0_scaled, C1_scaled, _ = self.scale(C0, C1)
+        prod_re, prod_im = self.multiply(C0_scaled, C1_scaled)
+        angle = self.atan2.calc(prod_im, prod_re)
+        return angle, self.DDS_inc(angle)
@@ -0,0 +1,51 @@
+import numpy as np
+import importlib.util
+import os
+
+spec = importlib.util.spec_from_file_location('dds', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dds.py'))
+dds = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(dds)
+spec = importlib.util.spec_from_file_location('complex_multiplier', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'complex_multiplier.py'))
+complex_multiplier = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(complex_multiplier)
+
+
+class Model:
+    '''
+    Bit accurate model of the CFO correction in test_CFO_correction.sv and receiver.sv (HAS_CFO_COR = 1)
+
+    A phase accumulator advances by inc for every input sample, the dds turns the phase into
+    cos + j * sin with DDS_OUT_DW / 2 bits per part and complex_multiplier rotates the input samples by it,
+    keeping the upper COMPL_MULT_OUT_DW / 2 bits with GROWTH_BITS = -2.
+    inc = CFO_hz / fs * 2 ** DDS_PHASE_DW shifts the signal by +CFO_hz.
+    process_block() works on blocks of samples and keeps the accumulator state between calls.
+    '''
+    def __init__(self, IN_DW = 32, DDS_PHASE_DW = 20, DDS_OUT_DW = 32, COMPL_MULT_OUT_DW = 32, GROWTH_BITS = -2,
+                 LUT_DW = 16, LUT_FILE = '', DDS_DELAY = 0):
+        self.IN_DW = int(IN_DW)
+        self.DDS_PHASE_DW = int(DDS_PHASE_DW)
+        self.DDS_OUT_DW = int(DDS_OUT_DW)
+        self.COMPL_MULT_OUT_DW = int(COMPL_MULT_OUT_DW)
+        self.dds = dds.Model(self.DDS_PHASE_DW, self.DDS_OUT_DW // 2, 1, LUT_DW, LUT_FILE = LUT_FILE, DELAY = DDS_DELAY)
+        self.mult = complex_multiplier.Model(self.DDS_OUT_DW // 2, self.IN_DW // 2, self.COMPL_MULT_OUT_DW // 2, GROWTH_BITS)
+        self.reset()
+
+    def reset(self):
+        self.dds.reset()
+        self.inc = 0
+
+    def set_inc(self, inc):
+        """phase increment for the following samples, like CFO_norm_in or CFO_DDS_inc_f"""
+        self.inc = int(inc)
+
+    def process_block(self, re, im):
+        """rotate a block of signed IN_DW / 2 bit samples, returns the real and imaginary part of the output"""
+        sin, cos = self.dds.process_block(len(re), self.inc)
+        return self.mult.multiply(cos, sin, re, im)
+
+    def process_words(self, tdata):
+        """rotate a block of packed s_axis_in_tdata words, returns the packed output words"""
+        tdata = np.asarray(tdata, np.int64)
+        sin, cos = self.dds.process_block(len(tdata), self.inc)
+        DDS_MASK = (1 << (self.DDS_OUT_DW // 2)) - 1
+        return self.mult.multiply_words((cos & DDS_MASK) | ((sin & DDS_MASK) << (self.DDS_OUT_DW // 2)), tdata)
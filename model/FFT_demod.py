@@ -0,0 +1,153 @@
+import numpy as np
+import importlib.util
+import os
+
+spec = importlib.util.spec_from_file_location('complex_multiplier', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'complex_multiplier.py'))
+complex_multiplier = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(complex_multiplier)
+spec = importlib.util.spec_from_file_location('generate_FFT_demod_tap_file', os.path.join(os.path.dirname(os.path.abspath(__file__)), '../tools/generate_FFT_demod_tap_file.py'))
+generate_FFT_demod_tap_file = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(generate_FFT_demod_tap_file)
+
+
+class Model:
+    '''
+    Model of FFT_demod.sv followed by BWP_extractor.sv
+
+    FFT_demod skips CP_len - CP2 / 2 (HALF_CP_ADVANCE) or CP_len samples of every symbol, so every FFT window starts
+    at the same offset before the end of the CP and the windows of the 7 symbols of a half subframe are
+    FFT_LEN + CP2 samples apart. process() uses this to demodulate all symbols of a sample stream
+    in one batched FFT over a strided view of the samples, without copying them into windows.
+
+    The FFT core runs with FORMAT = 1 and DBS = 1, its outputs are the OUT_DW / 2 MSBs of a IN_DW / 2 + NFFT bit result.
+    Dynamic block scaling shifts all results of a symbol left by blk_exp, the number of redundant sign bits of the
+    largest result, so the largest result uses the MSB. The FFT core is not part of this repository, the results are
+    the exact DFT rounded to integers, the rounding of the twiddle factors inside the core is not modeled.
+    With HALF_CP_ADVANCE the carriers are
+    rotated by the lut with complex_multiplier (GROWTH_BITS = -2), CP1 and CP2 symbols use the same lut.
+    BWP_extractor keeps the N_PRB * 12 carriers of the BWP, tags the PBCH symbols 3, 4, 5 and the SSS symbol 4
+    of subframe 0 and outputs tuser = {sfn, subframe, symbol, blk_exp, is_PBCH_symbol}.
+    '''
+    SFN_MAX = 1023
+    SUBFRAMES_PER_FRAME = 20
+    SYM_PER_SF = 14
+    SYM_PER_HALF_SF = 7
+    SSS_LEN = 127
+    PBCH_LEN = 240
+    N_PRB = {8: 20, 9: 25, 10: 52, 11: 106}
+
+    def __init__(self, IN_DW = 32, OUT_DW = 32, NFFT = 8, HALF_CP_ADVANCE = 1, BLK_EXP_LEN = 8):
+        self.IN_DW = int(IN_DW)
+        self.OUT_DW = int(OUT_DW)
+        self.NFFT = int(NFFT)
+        self.HALF_CP_ADVANCE = int(HALF_CP_ADVANCE)
+        self.BLK_EXP_LEN = int(BLK_EXP_LEN)
+        self.FFT_LEN = 2 ** self.NFFT
+        assert self.IN_DW // 2 + self.NFFT >= self.OUT_DW // 2, 'OUT_DW / 2 is wider than the FFT result'
+        self.CP1_LEN, self.CP2_LEN = generate_FFT_demod_tap_file.CP_lengths(self.NFFT)
+        # distance from the start of the FFT window to the end of the CP
+        self.WINDOW_ADVANCE = self.CP2_LEN // 2 if self.HALF_CP_ADVANCE else 0
+        self.SYM_LEN = self.FFT_LEN + self.CP2_LEN
+        self.HALF_SF_LEN = self.CP1_LEN + self.FFT_LEN + (self.SYM_PER_HALF_SF - 1) * self.SYM_LEN
+        self.BWP_LEN = self.N_PRB[self.NFFT] * 12
+        self.SC_START = self.FFT_LEN // 2 - self.BWP_LEN // 2
+        self.SSS_START = self.FFT_LEN // 2 - (self.SSS_LEN + 1) // 2
+        self.PBCH_START = self.FFT_LEN // 2 - self.PBCH_LEN // 2
+
+        OUT_OP_DW = self.OUT_DW // 2
+        self.mult = complex_multiplier.Model(OUT_OP_DW, OUT_OP_DW, OUT_OP_DW, -2)
+        taps = generate_FFT_demod_tap_file.create_lut(self.NFFT, self.CP2_LEN, self.CP2_LEN // 2, self.OUT_DW)
+        self.lut = (complex_multiplier._signed(taps, OUT_OP_DW), complex_multiplier._signed(taps >> OUT_OP_DW, OUT_OP_DW))
+
+    def fft(self, windows):
+        """FFT_demod output for an array of FFT windows [..., FFT_LEN], returns (carriers, blk_exp)"""
+        OUT_OP_DW = self.OUT_DW // 2
+        W = self.IN_DW // 2 + self.NFFT
+        spectrum = np.fft.fftshift(np.fft.fft(windows, axis = -1), axes = -1)
+        re = np.clip(np.rint(spectrum.real), -2 ** (W - 1), 2 ** (W - 1) - 1).astype(np.int64)
+        im = np.clip(np.rint(spectrum.imag), -2 ** (W - 1), 2 ** (W - 1) - 1).astype(np.int64)
+        # for negative numbers the redundant sign bits are the leading zeros of ~x
+        used = np.maximum((re ^ (re >> 63)).max(axis = -1), (im ^ (im >> 63)).max(axis = -1))
+        used_bits = np.frexp(used.astype(float))[1]
+        blk_exp = np.clip(W - 1 - used_bits, 0, 2 ** self.BLK_EXP_LEN - 1)[..., None]
+        re = (re << blk_exp) >> (W - OUT_OP_DW)
+        im = (im << blk_exp) >> (W - OUT_OP_DW)
+        if self.HALF_CP_ADVANCE:
+            re, im = self.mult.multiply(re, im, self.lut[0], self.lut[1])
+        return re + 1j * im, blk_exp[..., 0]
+
+    def window_starts(self, start, first_symbol, num_symbols):
+        """first sample of the FFT windows of num_symbols symbols, start is the first CP sample of symbol first_symbol"""
+        first_row = first_symbol % self.SYM_PER_HALF_SF
+        half_sf_start = start - (0 if first_row == 0 else self.CP1_LEN + self.FFT_LEN + (first_row - 1) * self.SYM_LEN)
+        pos = first_row + np.arange(num_symbols)
+        return (half_sf_start + pos // self.SYM_PER_HALF_SF * self.HALF_SF_LEN + self.CP1_LEN - self.WINDOW_ADVANCE
+            + pos % self.SYM_PER_HALF_SF * self.SYM_LEN)
+
+    def _view(self, samples, first, shape, strides):
+        step = samples.strides[0]
+        return np.lib.stride_tricks.as_strided(samples[first:], shape = shape,
+            strides = tuple(s * step for s in strides), writeable = False)
+
+    def _windows(self, samples, start, first_symbol, num_symbols):
+        """FFT windows of all symbols as a list of strided views, a partial half subframe at the start and end
+        of the stream gets a 2D view, all complete half subframes are in one 3D view"""
+        starts = self.window_starts(start, first_symbol, num_symbols)
+        head = min((self.SYM_PER_HALF_SF - first_symbol % self.SYM_PER_HALF_SF) % self.SYM_PER_HALF_SF, num_symbols)
+        num_half_sf = (num_symbols - head) // self.SYM_PER_HALF_SF
+        tail = num_symbols - head - num_half_sf * self.SYM_PER_HALF_SF
+        views = []
+        if head:
+            views.append(self._view(samples, starts[0], (head, self.FFT_LEN), (self.SYM_LEN, 1)))
+        if num_half_sf:
+            views.append(self._view(samples, starts[head], (num_half_sf, self.SYM_PER_HALF_SF, self.FFT_LEN),
+                (self.HALF_SF_LEN, self.SYM_LEN, 1)))
+        if tail:
+            views.append(self._view(samples, starts[num_symbols - tail], (tail, self.FFT_LEN), (self.SYM_LEN, 1)))
+        return views
+
+    def process(self, samples, start, first_symbol = 0, subframe = 0, sfn = 0, num_symbols = None):
+        '''
+        Demodulate the symbols of a stream of complex samples with IN_DW / 2 bits per part
+
+        The timing reference is start, the first CP sample of symbol first_symbol of subframe subframe of frame sfn.
+        If num_symbols is None, all symbols whose FFT window is complete are demodulated.
+        Returns a dict with 'carriers' [symbol, BWP_LEN] and per symbol 'blk_exp', 'sfn', 'subframe', 'symbol',
+        'PBCH_symbol', 'SSS_symbol' and 'tuser', and 'SSS' [SSS symbol, SSS_LEN] and 'PBCH' [PBCH symbol, PBCH_LEN]
+        with the carriers that BWP_extractor outputs with SSS_valid_o and PBCH_valid_o.
+        '''
+        samples = np.asarray(samples, complex)
+        start = int(start)
+        assert start >= 0, 'start has to be inside the samples'
+        if num_symbols is None:
+            num_symbols = (len(samples) - start) // self.SYM_LEN + 1
+            num_symbols = int(np.count_nonzero(self.window_starts(start, first_symbol, num_symbols) + self.FFT_LEN <= len(samples)))
+        else:
+            assert self.window_starts(start, first_symbol, num_symbols)[-1] + self.FFT_LEN <= len(samples), 'not enough samples'
+
+        pos = first_symbol + np.arange(num_symbols)
+        symbol = pos % self.SYM_PER_SF
+        subframes = subframe + pos // self.SYM_PER_SF
+        sfns = (sfn + subframes // self.SUBFRAMES_PER_FRAME) % (self.SFN_MAX + 1)
+        subframes = subframes % self.SUBFRAMES_PER_FRAME
+
+        carriers, blk_exp = [], []
+        for view in self._windows(samples, start, first_symbol, num_symbols):
+            count = int(np.prod(view.shape[:-1]))
+            c, e = self.fft(view)
+            carriers.append(c.reshape(count, self.FFT_LEN))
+            blk_exp.append(e.reshape(count))
+        carriers = np.concatenate(carriers) if carriers else np.zeros((0, self.FFT_LEN), complex)
+        blk_exp = np.concatenate(blk_exp) if blk_exp else np.zeros(0, np.int64)
+
+        PBCH_symbol = (subframes == 0) & ((symbol == 3) | (symbol == 4) | (symbol == 5))
+        SSS_symbol = (subframes == 0) & (symbol == 4)
+        SUBFRAME_NUMBER_WIDTH = int(np.ceil(np.log2(self.SUBFRAMES_PER_FRAME - 1)))
+        SYMBOL_NUMBER_WIDTH = int(np.ceil(np.log2(self.SYM_PER_SF - 1)))
+        tuser = ((((sfns << SUBFRAME_NUMBER_WIDTH | subframes) << SYMBOL_NUMBER_WIDTH | symbol) << self.BLK_EXP_LEN
+            | blk_exp) << 1) | PBCH_symbol
+        return {'carriers': carriers[:, self.SC_START:self.SC_START + self.BWP_LEN], 'blk_exp': blk_exp,
+            'sfn': sfns, 'subframe': subframes, 'symbol': symbol, 'PBCH_symbol': PBCH_symbol, 'SSS_symbol': SSS_symbol,
+            'tuser': tuser.astype(np.int64),
+            'SSS': carriers[SSS_symbol, self.SSS_START:self.SSS_START + self.SSS_LEN],
+            'PBCH': carriers[PBCH_symbol, self.PBCH_START:self.PBCH_START + self.PBCH_LEN]}
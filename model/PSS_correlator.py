@@ -6,6 +6,11 @@ def _twos_comp(val, bits):
         val = val - (1 << bits)
     return int(val)
 
+def _twos_comp_array(val, bits):
+    """compute the 2's complement of every element of an int array"""
+    val = np.asarray(val, dtype = np.int64) & ((1 << bits) - 1)
+    return np.where(val & (1 << (bits - 1)), val - (1 << bits), val)
+
 class Model:
     def __init__(self, IN_DW, OUT_DW, TAP_DW, PSS_LEN, PSS_LOCAL, ALGO, USE_TAP_FILE = 0, TAP_FILE = ''):
         self.PSS_LEN = int(PSS_LEN)
@@ -15,22 +20,10 @@ class Model:
         self.POSSIBLE_IN_DW = int(self.OUT_DW - (np.ceil(np.log2(self.PSS_LEN) + 1)) * 2  - 3)
         self.IN_OP_DW = self.POSSIBLE_IN_DW // 2
         self.TAP_OP_DW = self.POSSIBLE_IN_DW // 2 + (self.POSSIBLE_IN_DW % 2)
+        self.truncate = max(int(np.ceil(np.log2(self.PSS_LEN)) + self.IN_DW // 2 + self.TAP_DW // 2 + 1 - self.OUT_DW), 0)
 
-        # print(f'model IN_DW = {IN_DW}')
-        # print(f'model OUT_DW = {OUT_DW}')
-        # print(f'model PSS_LEN = {PSS_LEN}')
-        # print(f'model PSS_LOCAL = {PSS_LOCAL}')
         self.taps = np.empty(PSS_LEN, 'complex')
 
-        if False:
-            # don't do rounding for truncations, because its also not implemented in HDL
-            if self.trunc_taps > 1:
-                round_bits = 2 ** (self.trunc_taps - 2) - 1
-            else:
-                round_bits = 0
-        else:
-            round_bits = 0
-
         if USE_TAP_FILE:
             print(f'using tap file {TAP_FILE}')
             temp_taps = np.loadtxt(TAP_FILE, delimiter = ' ', dtype = int, converters={0:lambda s: int(s, 16)})
@@ -45,50 +38,92 @@ class Model:
                             + 1j*_twos_comp(((PSS_LOCAL >> (self.TAP_DW * i + self.TAP_DW // 2)) & (2 ** (self.TAP_DW // 2) - 1)),
                                 self.TAP_DW // 2)
 
-        # for i in range(PSS_LEN):
-        #     print(f'taps[{i}] = {self.taps[i]}')
+        # integer copies of the taps for the block engine, taps are at most 32 bit wide,
+        # so the conversion from complex float is exact
+        self.taps_re = self.taps.real.astype(np.int64)
+        self.taps_im = self.taps.imag.astype(np.int64)
 
         self.reset()
 
-    def tick(self):
-        self.valid[1:] = self.valid[:-1]
-        self.result[1:] = self.result[:-1]
-        self.valid[0] = False
+    def unpack(self, data_in):
+        """split packed s_axis_in_tdata words into signed real and imaginary parts"""
+        data_in = np.asarray(data_in, dtype = np.int64)
+        data_re = _twos_comp_array(data_in,                        self.IN_DW // 2)
+        data_im = _twos_comp_array(data_in >> (self.IN_DW // 2),   self.IN_DW // 2)
+        return data_re, data_im
+
+    def correlate(self, data_re, data_im):
+        """correlate a block of input samples with the PSS taps
+
+        data_re and data_im are signed integer arrays, the last PSS_LEN - 1 samples are kept
+        as history for the next call, so that consecutive blocks give the same result as one large block.
+        Returns result_abs >> truncate for every input sample.
+        """
+        data_re = np.asarray(data_re, dtype = np.int64)
+        data_im = np.asarray(data_im, dtype = np.int64)
+        if len(data_re) == 0:
+            return np.zeros(0, np.int64)
+        in_re = np.concatenate((self.history_re, data_re))
+        in_im = np.concatenate((self.history_im, data_im))
+        self.history_re = in_re[len(in_re) - (self.PSS_LEN - 1):]
+        self.history_im = in_im[len(in_im) - (self.PSS_LEN - 1):]
+
+        # bit growth is ceil(log2(PSS_LEN)) + IN_DW/2 + TAP_DW/2 + 1 for result_re and result_im,
+        # which fits into int64 for IN_DW and TAP_DW up to 32 bits
+        result_re = np.convolve(in_re, self.taps_re, 'valid') - np.convolve(in_im, self.taps_im, 'valid')
+        result_im = np.convolve(in_im, self.taps_re, 'valid') + np.convolve(in_re, self.taps_im, 'valid')
+        # result_abs = result_re ** 2 + result_im ** 2
+        abs_re = np.abs(result_re)
+        abs_im = np.abs(result_im)
+        result_abs = np.where(abs_re > abs_im, abs_re + (abs_im >> 2), abs_im + (abs_re >> 2))
+        return (result_abs >> self.truncate) & (2 ** self.OUT_DW - 1)
+
+    def process_block(self, samples, valid = None):
+        """process a block of clock cycles at once
 
+        samples contains the packed s_axis_in_tdata word for every clock cycle,
+        valid contains s_axis_in_tvalid for every clock cycle, all samples are valid if valid is None.
+        Returns the arrays (data, valid) that get_data() and data_valid() would return
+        after each of the corresponding calls to tick(), including the pipeline latency.
+        """
+        samples = np.asarray(samples, dtype = np.int64)
+        if valid is None:
+            valid = np.ones(len(samples), bool)
+        else:
+            valid = np.asarray(valid, bool)
+        data_re, data_im = self.unpack(samples[valid])
+
+        # first pipeline stage, it keeps its value in clock cycles without valid input
+        stage0 = np.empty(len(samples) + 1, np.int64)
+        stage0[0] = self.result[0]
+        stage0[1:][valid] = self.correlate(data_re, data_im)
+        idx = np.where(np.concatenate(([True], valid)), np.arange(len(samples) + 1), 0)
+        stage0 = stage0[np.maximum.accumulate(idx)][1:]
+
+        # the remaining pipeline stages are a delay line
+        result = np.concatenate((self.result[::-1], stage0))
+        valid_out = np.concatenate((self.valid[::-1], valid))
+        self.result = result[:-len(self.result) - 1:-1].copy()
+        self.valid = valid_out[:-len(self.valid) - 1:-1].copy()
+        return result[1:][:len(samples)], valid_out[1:][:len(samples)]
+
+    def tick(self):
         if self.in_buffer is not None:
-            self.in_pipeline[1:] = self.in_pipeline[:-1]
-            self.in_pipeline[0] = self.in_buffer
-            self.valid[0] = True
+            self.process_block([self.in_buffer])
             self.in_buffer = None
-
-            result_re = 0
-            result_im = 0
-            for i in range(self.PSS_LEN):
-                # bit growth inside this loop is ceil(log2(PSS_LEN)) + IN_DW/2 for result_re and result_im
-                result_re += (  int(self.taps[i].real) * int(self.in_pipeline[i].real) \
-                                - int(self.taps[i].imag) * int(self.in_pipeline[i].imag))
-                result_im += (  int(self.taps[i].real) * int(self.in_pipeline[i].imag) \
-                                + int(self.taps[i].imag) * int(self.in_pipeline[i].real))
-            # result_abs = result_re ** 2 + result_im ** 2
-            if np.abs(result_re) > np.abs(result_im):
-                result_abs = np.abs(result_re) + (int(np.abs(result_im))>>2)
-            else:
-                result_abs = np.abs(result_im) + (int(np.abs(result_re))>>2)
-            truncate = int(np.ceil(np.log2(self.PSS_LEN)) + self.IN_DW//2 + self.TAP_DW//2 + 1 - self.OUT_DW)
-            if truncate < 0:
-                truncate = 0
-            self.result[0] = (result_abs >> truncate) & (2 ** self.OUT_DW - 1)
+        else:
+            self.process_block([0], [False])
 
     def set_data(self, data_in):
-        self.in_buffer =      _twos_comp((data_in & (2 ** (self.IN_DW // 2) - 1)),                        self.IN_DW // 2) \
-                         + 1j*_twos_comp(((data_in >> (self.IN_DW // 2)) & (2 ** (self.IN_DW // 2) - 1)), self.IN_DW // 2)
+        self.in_buffer = data_in
 
     def reset(self):
-        self.in_pipeline = np.zeros(self.PSS_LEN, 'complex')
+        self.history_re = np.zeros(self.PSS_LEN - 1, np.int64)
+        self.history_im = np.zeros(self.PSS_LEN - 1, np.int64)
         self.in_buffer = None
         pipeline_stages = 3
         self.valid = np.zeros(pipeline_stages, bool)
-        self.result = np.zeros(pipeline_stages)
+        self.result = np.zeros(pipeline_stages, np.int64)
 
     def data_valid(self):
         return self.valid[-1]
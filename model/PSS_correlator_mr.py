@@ -0,0 +1,251 @@
+import numpy as np
+import scipy.fft
+from collections import deque
+
+def _twos_comp(val, bits):
+    """compute the 2's complement of int value val"""
+    if (val & (1 << (bits - 1))) != 0:
+        val = val - (1 << bits)
+    return int(val)
+
+def _twos_comp_array(val, bits):
+    """compute the 2's complement of every element of an int array"""
+    val = np.asarray(val, dtype = np.int64) & ((1 << bits) - 1)
+    return val - ((val >> (bits - 1)) << bits)
+
+def _complex_convolve(in_re, in_im, taps_re, taps_im):
+    """integer complex FIR, returns only the outputs where all taps overlap with the input"""
+    result_re = np.convolve(in_re, taps_re, 'valid') - np.convolve(in_im, taps_im, 'valid')
+    result_im = np.convolve(in_im, taps_re, 'valid') + np.convolve(in_re, taps_im, 'valid')
+    return result_re, result_im
+
+def _fft_convolve(in_re, in_im, taps_spectrum, num_taps):
+    """integer complex FIR like _complex_convolve with float FFTs, taps_spectrum is the FFT of the complex taps
+
+    Inputs and taps are integers, so the results are integers plus the rounding error of the FFTs, which is
+    orders of magnitude below 0.5 for the widths used here. If any result is further than 0.1 from an integer,
+    None is returned, so the caller can fall back to the exact FIR.
+    """
+    y = scipy.fft.ifft(scipy.fft.fft(in_re + 1j * in_im, len(taps_spectrum)) * taps_spectrum)[num_taps - 1:len(in_re)]
+    result_re = np.round(y.real)
+    result_im = np.round(y.imag)
+    if max(np.abs(y.real - result_re).max(), np.abs(y.imag - result_im).max()) > 0.1:
+        return None
+    return result_re.astype(np.int64), result_im.astype(np.int64)
+
+class Model:
+    '''
+    Model of PSS_correlator_mr.sv, or of PSS_correlator.sv if MULT_REUSE = 0
+
+    Besides the magnitude output m_axis_out_tdata, this model also calculates the partial correlations C0_o and C1_o
+    which are used by CFO_calc. Which taps go into C0 and C1 depends on ALGO for PSS_correlator.sv
+    and on MULT_REUSE for PSS_correlator_mr.sv, exactly like in the HDL.
+    MULT_REUSE > 0 requires PSS_LEN = 128, because the HDL uses a 7 bit write pointer for its input buffer.
+    MULT_STAGES is the pipeline depth of the complex_multiplier submodule, it only affects LATENCY.
+
+    process_block() with partial = False skips C0 and C1 and calculates the correlation with FFTs, which is
+    much faster for long blocks. partial_correlations() then calculates C0 and C1 only for selected samples.
+    '''
+    def __init__(self, IN_DW, OUT_DW, TAP_DW, PSS_LEN, PSS_LOCAL, MULT_REUSE, ALGO = 0, USE_TAP_FILE = 0, TAP_FILE = '',
+                 START_DELAY = 1, MULT_STAGES = 3):
+        self.IN_DW = int(IN_DW)
+        self.OUT_DW = int(OUT_DW)
+        self.TAP_DW = int(TAP_DW)
+        self.PSS_LEN = int(PSS_LEN)
+        self.MULT_REUSE = int(MULT_REUSE)
+        self.ALGO = int(ALGO)
+        self.START_DELAY = int(START_DELAY)
+        self.MULT_STAGES = int(MULT_STAGES)
+
+        self.IN_OP_DW = self.IN_DW // 2
+        self.TAP_OP_DW = self.TAP_DW // 2
+        self.REQUIRED_OUT_DW = self.IN_OP_DW + self.TAP_OP_DW + 1 + int(np.ceil(np.log2(self.PSS_LEN)))
+        self.C_DW = self.IN_DW + self.TAP_DW + 2 + 2 * int(np.ceil(np.log2(self.PSS_LEN)))
+        self.truncate = max(self.REQUIRED_OUT_DW - self.OUT_DW, 0)
+
+        if USE_TAP_FILE:
+            print(f'using tap file {TAP_FILE}')
+            temp_taps = np.loadtxt(TAP_FILE, delimiter = ' ', dtype = np.int64, converters={0:lambda s: int(s, 16)})
+        else:
+            temp_taps = np.array([(PSS_LOCAL >> (self.TAP_DW * i)) & (2 ** self.TAP_DW - 1) for i in range(self.PSS_LEN)],
+                np.int64)
+        taps_re = _twos_comp_array(temp_taps,                       self.TAP_OP_DW)
+        taps_im = _twos_comp_array(temp_taps >> self.TAP_OP_DW,     self.TAP_OP_DW)
+        self.taps = taps_re + 1j * taps_im
+
+        # C0 uses the taps selected by C0_mask, C1 uses all other taps
+        self.C0_mask = np.zeros(self.PSS_LEN, bool)
+        if self.MULT_REUSE == 0:
+            self.LATENCY = 2
+            if self.ALGO == 0:
+                self.C0_mask[:self.PSS_LEN // 2] = True
+            else:
+                # ALGO = 1 exploits the central symmetry of the PSS: tap i and tap PSS_LEN - i are treated as
+                # complex conjugates of each other, taps 0 and PSS_LEN / 2 are not used
+                idx = np.arange(1, self.PSS_LEN // 2)
+                taps_re[self.PSS_LEN - idx] = taps_re[idx]
+                taps_im[self.PSS_LEN - idx] = -taps_im[idx]
+                taps_re[[0, self.PSS_LEN // 2]] = 0
+                taps_im[[0, self.PSS_LEN // 2]] = 0
+                self.C0_mask[1 : self.PSS_LEN // 4] = True
+                self.C0_mask[self.PSS_LEN - self.PSS_LEN // 4 + 1:] = True
+        else:
+            # every multiplier does MULT_REUSE consecutive taps, C0 is the sum of the first REQ_MULTS / 2 multipliers
+            self.REQ_MULTS = int(np.ceil(self.PSS_LEN / self.MULT_REUSE))
+            if self.REQ_MULTS < 2:
+                raise ValueError(f'MULT_REUSE = {self.MULT_REUSE} is not supported for PSS_LEN = {self.PSS_LEN}!')
+            self.C0_mask[:(self.REQ_MULTS // 2) * self.MULT_REUSE] = True
+            self.LATENCY = self.MULT_REUSE + self.MULT_STAGES + 5
+        self.taps_C0_re = np.where(self.C0_mask, taps_re, 0)
+        self.taps_C0_im = np.where(self.C0_mask, taps_im, 0)
+        self.taps_C1_re = np.where(self.C0_mask, 0, taps_re)
+        self.taps_C1_im = np.where(self.C0_mask, 0, taps_im)
+        # FFT of the taps for every FFT length that _correlate() used
+        self.taps_spectrum = {}
+
+        self.reset()
+
+    def unpack(self, data_in):
+        """split packed s_axis_in_tdata words into signed real and imaginary parts"""
+        data_in = np.asarray(data_in, dtype = np.int64)
+        data_re = _twos_comp_array(data_in,                     self.IN_OP_DW)
+        data_im = _twos_comp_array(data_in >> self.IN_OP_DW,    self.IN_OP_DW)
+        return data_re, data_im
+
+    def _wrap(self, val):
+        return _twos_comp_array(val, self.REQUIRED_OUT_DW)
+
+    def process_block(self, samples, clks = None, partial = True):
+        """process a block of valid input samples at once
+
+        samples contains the packed s_axis_in_tdata words,
+        clks optionally contains the clock cycle of every sample, it is used to check that the samples are at least
+        MULT_REUSE cycles apart and to find the first output after START_DELAY exactly.
+        If clks is None, samples are assumed to arrive with gaps, like they do with MULT_REUSE > 1.
+        Returns the arrays (m_axis_out_tdata, C0, C1) with one entry per input sample,
+        C0 and C1 are complex with integer real and imaginary parts of C_DW / 2 bits each,
+        they are None if partial is False.
+        """
+        samples = np.asarray(samples, dtype = np.int64)
+        N = len(samples)
+        if N == 0:
+            return np.zeros(0, np.int64), np.zeros(0, 'complex') if partial else None, np.zeros(0, 'complex') if partial else None
+        data_re, data_im = self.unpack(samples)
+        in_re = np.concatenate((self.history_re, data_re))
+        in_im = np.concatenate((self.history_im, data_im))
+        self.history_re = in_re[N:]
+        self.history_im = in_im[N:]
+
+        if partial:
+            C0_re, C0_im = _complex_convolve(in_re, in_im, self.taps_C0_re, self.taps_C0_im)
+            C1_re, C1_im = _complex_convolve(in_re, in_im, self.taps_C1_re, self.taps_C1_im)
+            sum_re, sum_im = C0_re + C1_re, C0_im + C1_im
+        else:
+            sum_re, sum_im = self._correlate(in_re, in_im)
+
+        # sums are done with REQUIRED_OUT_DW bit wide registers
+        sum_re = self._wrap(sum_re)
+        sum_im = self._wrap(sum_im)
+        abs_re = np.abs(sum_re)
+        abs_im = np.abs(sum_im)
+        # https://openofdm.readthedocs.io/en/latest/verilog.html
+        filter_result = np.where(abs_im > abs_re, abs_im + (abs_re >> 2), abs_re + (abs_im >> 2))
+        result = (filter_result >> self.truncate) & (2 ** self.OUT_DW - 1)
+        if partial:
+            C0 = self._wrap(C0_re) + 1j * self._wrap(C0_im)
+            C1 = self._wrap(C1_re) + 1j * self._wrap(C1_im)
+        else:
+            C0, C1 = None, None
+
+        if clks is not None:
+            clks = np.concatenate(([self.last_clk], np.asarray(clks, dtype = np.int64)))
+            if self.MULT_REUSE > 0 and np.any(np.diff(clks) < self.MULT_REUSE):
+                raise ValueError(f'input samples need to be at least MULT_REUSE = {self.MULT_REUSE} cycles apart!')
+            self.last_clk = clks[-1]
+
+        # PSS_correlator_mr feeds zeros into the multipliers until the input buffer is filled once
+        if self.MULT_REUSE > 0 and self.START_DELAY:
+            # the last sample needs to arrive at least 2 cycles after the previous one to be used
+            first_valid = self.PSS_LEN - 1
+            if clks is not None and self.sample_cnt <= first_valid < self.sample_cnt + N:
+                if clks[first_valid - self.sample_cnt + 1] - clks[first_valid - self.sample_cnt] < 2:
+                    self.first_valid = first_valid + 1
+            num_zeros = min(max(self.first_valid - self.sample_cnt, 0), N)
+            result[:num_zeros] = 0
+            if partial:
+                C0[:num_zeros] = 0
+                C1[:num_zeros] = 0
+        else:
+            num_zeros = 0
+        self.block = (in_re, in_im, num_zeros)
+        self.sample_cnt += N
+        return result, C0, C1
+
+    def _correlate(self, in_re, in_im):
+        """C0 + C1 without wrap around, with FFTs if the results fit into the float64 mantissa"""
+        if self.REQUIRED_OUT_DW <= 50:
+            nfft = scipy.fft.next_fast_len(len(in_re))
+            if nfft not in self.taps_spectrum:
+                self.taps_spectrum[nfft] = scipy.fft.fft(self.taps_C0_re + self.taps_C1_re + 1j * (self.taps_C0_im + self.taps_C1_im), nfft)
+            result = _fft_convolve(in_re, in_im, self.taps_spectrum[nfft], self.PSS_LEN)
+            if result is not None:
+                return result
+        return _complex_convolve(in_re, in_im, self.taps_C0_re + self.taps_C1_re, self.taps_C0_im + self.taps_C1_im)
+
+    def partial_correlations(self, idx):
+        """C0 and C1 of the samples idx of the last process_block() call, same values as with partial = True"""
+        idx = np.asarray(idx, dtype = np.int64)
+        in_re, in_im, num_zeros = self.block
+        # output k uses the inputs k ... k + PSS_LEN - 1 with the taps in reverse order
+        window = idx[:, None] + np.arange(self.PSS_LEN)
+        re = in_re[window]
+        im = in_im[window]
+        C = []
+        for taps_re, taps_im in [(self.taps_C0_re, self.taps_C0_im), (self.taps_C1_re, self.taps_C1_im)]:
+            C_re = re @ taps_re[::-1] - im @ taps_im[::-1]
+            C_im = re @ taps_im[::-1] + im @ taps_re[::-1]
+            C.append(np.where(idx < num_zeros, 0, self._wrap(C_re) + 1j * self._wrap(C_im)))
+        return C[0], C[1]
+
+    def output_clks(self, clks):
+        """clock cycles in which m_axis_out_tvalid is high for the samples that were input at clks"""
+        return np.asarray(clks, dtype = np.int64) + self.LATENCY
+
+    def tick(self):
+        self.clk_cnt += 1
+        if self.in_buffer is not None:
+            result, C0, C1 = self.process_block([self.in_buffer])
+            self.pipeline.append((self.clk_cnt + self.LATENCY, result[0], C0[0], C1[0]))
+            self.in_buffer = None
+        self.valid = len(self.pipeline) > 0 and self.pipeline[0][0] == self.clk_cnt
+        if self.valid:
+            _, self.result, self.C0, self.C1 = self.pipeline.popleft()
+
+    def set_data(self, data_in):
+        self.in_buffer = data_in
+
+    def reset(self):
+        self.history_re = np.zeros(self.PSS_LEN - 1, np.int64)
+        self.history_im = np.zeros(self.PSS_LEN - 1, np.int64)
+        self.sample_cnt = 0
+        self.first_valid = self.PSS_LEN - 1
+        self.last_clk = -self.MULT_REUSE
+        self.clk_cnt = 0
+        self.in_buffer = None
+        self.pipeline = deque()
+        self.valid = False
+        self.result = 0
+        self.C0 = 0
+        self.C1 = 0
+
+    def data_valid(self):
+        return self.valid
+
+    def get_data(self):
+        return self.result
+
+    def get_C0(self):
+        return self.C0
+
+    def get_C1(self):
+        return self.C1
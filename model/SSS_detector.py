@@ -0,0 +1,146 @@
+import numpy as np
+import importlib.util
+import os
+
+spec = importlib.util.spec_from_file_location('sss_codebook', os.path.join(os.path.dirname(os.path.abspath(__file__)), '../tools/sss_codebook.py'))
+sss_codebook = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sss_codebook)
+
+class Model:
+    '''
+    Cycle accurate model of SSS_detector.sv
+
+    The detector stores the sign bits of the first SSS_LEN - 1 input samples, then compares them with one
+    SSS sequence per N_id_1 and one carrier per clock cycle. A sequence takes SSS_LEN cycles, SSS_LEN - 1 compares
+    and one cycle to update the maximum, so a detection takes DETECT_CLKS = 336 * 127 = 42672 cycles.
+    Instead of running the loop, all 336 correlations are calculated with one matrix product and the
+    cycle at which m_axis_out_tvalid is set is calculated from the input timing.
+
+    process() takes per clock cycle arrays of the inputs, clock cycle n is the n-th rising edge since reset()
+    at which the inputs are sampled. The model keeps its state across calls, so a long stream can be processed
+    in arbitrary chunks. Inputs that arrive while the detector is busy are dropped like in the HDL.
+    The LFSRs are assumed to have filled m_seq_0 and m_seq_1 before the first detection starts,
+    which takes SSS_LEN cycles in STATE_READ_SSS after reset.
+    '''
+    SSS_LEN = 127
+    N_ID_1_MAX = 335
+    DETECT_CLKS = (N_ID_1_MAX + 1) * SSS_LEN
+    # clock cycles from the SSS_LEN - 1-th input sample to m_axis_out_tvalid, if N_id_2 is already known
+    LATENCY = DETECT_CLKS + 1
+
+    STATE_READ_SSS = 0
+    STATE_DETECT_SSS = 1
+
+    def __init__(self, IN_DW = 16):
+        self.IN_DW = int(IN_DW)
+        self.reset()
+
+    def reset(self):
+        self.clk = 0
+        self.state = self.STATE_READ_SSS
+        self.copy_counter = 0
+        self.sss_in_I = np.zeros(self.SSS_LEN, np.int8)
+        self.sss_in_Q = np.zeros(self.SSS_LEN, np.int8)
+        self.N_id_2_f = 0
+        self.N_id_2_set = False
+        self.done_clk = None
+        self.N_id_1 = 0
+        self.N_id = 0
+        self.acc_max = 0
+
+    def correlate(self, sss_in_I, sss_in_Q, N_id_2):
+        """correlations max(|acc_I|, |acc_Q|) of the sign bits (1 for >= 0) with the sequences of all N_id_1"""
+        seqs = sss_codebook.codebook()[N_id_2::3, :self.SSS_LEN - 1].astype(np.int16)
+        sign_I = 2 * np.asarray(sss_in_I[:self.SSS_LEN - 1], np.int16) - 1
+        sign_Q = 2 * np.asarray(sss_in_Q[:self.SSS_LEN - 1], np.int16) - 1
+        return np.maximum(np.abs(seqs @ sign_I), np.abs(seqs @ sign_Q))
+
+    def detect(self, sss_in_I, sss_in_Q, N_id_2):
+        """N_id_1 and N_id like m_axis_out_tdata and N_id_o after a detection
+
+        acc_max starts at 0 and is only updated by a larger correlation, therefore the smallest N_id_1 wins a tie
+        and the previous result stays if all correlations are 0.
+        """
+        acc = self.correlate(sss_in_I, sss_in_Q, N_id_2)
+        best = int(np.argmax(acc))
+        if acc[best] > 0:
+            self.N_id_1 = best
+            self.N_id = 3 * best + N_id_2
+        self.acc_max = int(acc[best])
+        return self.N_id_1, self.N_id
+
+    def process(self, tdata, tvalid, N_id_2 = None, N_id_2_valid = None):
+        '''
+        process the inputs of len(tdata) clock cycles
+
+        tdata, tvalid, N_id_2 and N_id_2_valid are s_axis_in_tdata, s_axis_in_tvalid, N_id_2_i and N_id_2_valid_i
+        for every clock cycle. Returns the arrays (clk, N_id_1, N_id) with one entry per rising edge at which
+        m_axis_out_tvalid and N_id_valid_o are set, m_axis_out_tdata and N_id_o have the given values
+        from this edge on.
+        '''
+        tdata = np.asarray(tdata, np.int64)
+        tvalid = np.asarray(tvalid).astype(bool)
+        N = len(tdata)
+        if N_id_2_valid is None:
+            N_id_2_valid = np.zeros(N, bool)
+        N_id_2_valid = np.asarray(N_id_2_valid).astype(bool)
+        N_id_2 = np.broadcast_to(np.asarray(0 if N_id_2 is None else N_id_2, np.int64), (N,))
+        valid_idx = np.flatnonzero(tvalid)
+        N_id_2_idx = np.flatnonzero(N_id_2_valid)
+
+        def N_id_2_before(i):
+            """value of the N_id_2_f and N_id_2_set registers at local clock cycle i"""
+            k = np.searchsorted(N_id_2_idx, i)
+            if k == 0:
+                return self.N_id_2_f, self.N_id_2_set
+            return int(N_id_2[N_id_2_idx[k - 1]]), True
+
+        out_clk, out_N_id_1, out_N_id = [], [], []
+        i = 0
+        while i < N:
+            if self.state == self.STATE_DETECT_SSS:
+                if self.done_clk >= self.clk + N:
+                    break
+                out_clk.append(self.done_clk)
+                out_N_id_1.append(self.N_id_1)
+                out_N_id.append(self.N_id)
+                i = self.done_clk - self.clk + 1
+                self.state = self.STATE_READ_SSS
+                self.copy_counter = 0
+                continue
+
+            # STATE_READ_SSS: samples 0 .. SSS_LEN - 2 are stored, the last sample only overwrites sss_in[SSS_LEN - 1]
+            beats = valid_idx[valid_idx >= i]
+            num = min(self.SSS_LEN - 1 - self.copy_counter, len(beats))
+            if num > 0:
+                data = tdata[beats[:num]]
+                pos = slice(self.copy_counter, self.copy_counter + num)
+                self.sss_in_I[pos] = ((data >> (self.IN_DW // 2 - 1)) & 1) ^ 1
+                self.sss_in_Q[pos] = ((data >> (self.IN_DW - 1)) & 1) ^ 1
+                self.copy_counter += num
+                start = beats[num - 1] + 1
+            else:
+                start = i
+            if self.copy_counter < self.SSS_LEN - 1:
+                break
+            # wait for N_id_2, N_id_2_set is registered and therefore visible one cycle after N_id_2_valid_i
+            if not N_id_2_before(start)[1]:
+                if len(N_id_2_idx) == 0:
+                    break
+                start = max(start, N_id_2_idx[0] + 1)
+            if start >= N:
+                break
+            N_id_2_cur = N_id_2_before(start)[0]
+            self.detect(self.sss_in_I, self.sss_in_Q, N_id_2_cur)
+            self.state = self.STATE_DETECT_SSS
+            self.done_clk = self.clk + int(start) + self.DETECT_CLKS
+
+        if len(N_id_2_idx):
+            self.N_id_2_f = int(N_id_2[N_id_2_idx[-1]])
+            self.N_id_2_set = True
+        self.clk += N
+        return np.array(out_clk, np.int64), np.array(out_N_id_1, np.int64), np.array(out_N_id, np.int64)
+
+    def latency_s(self, CLK_FREQ):
+        """time from the SSS_LEN - 1-th SSS sample to m_axis_out_tvalid in seconds"""
+        return self.LATENCY / CLK_FREQ
@@ -0,0 +1,79 @@
+import numpy as np
+import importlib.util
+import os
+
+spec = importlib.util.spec_from_file_location('div', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'div.py'))
+div = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(div)
+
+
+def atan_lut(INPUT_WIDTH, OUTPUT_WIDTH):
+    '''
+    content of atan_lut in atan.sv, atan(i / (2 ** INPUT_WIDTH - 1)) scaled so that pi / 4 is 2 ** OUTPUT_WIDTH - 1
+
+    Like the HDL the scaling uses 3.14159 instead of pi and the real values are rounded to the nearest integer,
+    values above 2 ** OUTPUT_WIDTH - 1 are limited to it.
+    '''
+    MAX_LUT_IN_VAL = 2 ** INPUT_WIDTH - 1
+    MAX_LUT_OUT_VAL = 2 ** OUTPUT_WIDTH - 1
+    value = np.arctan(np.arange(MAX_LUT_IN_VAL + 1) / MAX_LUT_IN_VAL) / (3.14159 / 4) * MAX_LUT_OUT_VAL
+    return np.where(value > MAX_LUT_OUT_VAL, MAX_LUT_OUT_VAL, np.floor(value + 0.5)).astype(np.int64)
+
+
+class Model:
+    '''
+    Bit accurate model of the results and timing of atan2.sv
+
+    The operands are sorted so that abs(numerator) <= abs(denominator), divided by div.sv with
+    LUT_DW result bits, the quotient is the index into the atan lut and the octant is restored from
+    the signs and the swap flag. The angle has OUTPUT_WIDTH bits and pi corresponds to 2 ** (OUTPUT_WIDTH - 1) - 1.
+    calc() takes arrays of operands and calculates all results at once.
+
+    atan2.sv always uses the pipelined divider, so it accepts a new operand pair every clock cycle
+    and valid_o is set LATENCY clock edges after the edge that samples valid_i: one for the input register,
+    the divider, one each for the atan lut input, the octant correction and angle_o.
+    '''
+    def __init__(self, INPUT_WIDTH = 16, LUT_DW = 16, OUTPUT_WIDTH = 16):
+        self.INPUT_WIDTH = int(INPUT_WIDTH)
+        self.LUT_DW = int(LUT_DW)
+        self.OUTPUT_WIDTH = int(OUTPUT_WIDTH)
+        self.ATAN_OUT_DW = self.OUTPUT_WIDTH - 3
+        self.PI_HALF = 2 ** (self.OUTPUT_WIDTH - 1) - 1
+        self.PI_QUARTER = 2 ** (self.OUTPUT_WIDTH - 2) - 1
+        self.atan_lut = atan_lut(self.LUT_DW, self.ATAN_OUT_DW)
+        # operands of the divider need INPUT_WIDTH + LUT_DW bits
+        self.div = div.Model(self.INPUT_WIDTH + self.LUT_DW, self.LUT_DW, PIPELINED = 1)
+        self.dtype = self.div.dtype
+        self.LATENCY = 1 + self.div.LATENCY + 3
+
+    def _signed(self, val, bits):
+        val = np.asarray(val).astype(self.dtype) & ((1 << bits) - 1)
+        return np.where(val >> (bits - 1), val - (1 << bits), val)
+
+    def calc(self, numerator, denominator):
+        """angle_o for arrays of numerator_i and denominator_i, the result is a signed int64 array"""
+        numerator = self._signed(numerator, self.INPUT_WIDTH)
+        denominator = self._signed(denominator, self.INPUT_WIDTH)
+        # abs() returns INPUT_WIDTH unsigned bits, so abs(-2 ** (INPUT_WIDTH - 1)) is 2 ** (INPUT_WIDTH - 1)
+        abs_num = np.abs(numerator)
+        abs_den = np.abs(denominator)
+        inv = ~(abs_den > abs_num)
+        num = np.where(inv, abs_den, abs_num)
+        den = np.where(inv, abs_num, abs_den)
+        num_wide = np.where(num != 0, (num << self.LUT_DW) - 1, 0)
+        quotient = self.div.calc(num_wide, den)
+
+        angle = self.atan_lut[np.asarray(quotient, np.int64)]
+        angle = np.where(inv, self.PI_QUARTER - angle, angle)
+        num_pos = numerator >= 0
+        den_pos = denominator >= 0
+        angle = np.where(num_pos & ~den_pos, self.PI_HALF - angle, angle)
+        angle = np.where(~num_pos & ~den_pos, angle - self.PI_HALF, angle)
+        angle = np.where(~num_pos & den_pos, -angle, angle)
+        return np.asarray(self._signed(angle, self.OUTPUT_WIDTH), np.int64)
+
+    def latency(self, numerator, denominator):
+        return np.full(np.shape(numerator), self.LATENCY, np.int64)
+
+    def interval(self, numerator, denominator):
+        return np.ones(np.shape(numerator), np.int64)
@@ -0,0 +1,57 @@
+import numpy as np
+
+
+class Model:
+    '''
+    Bit accurate model of the CIC decimator cic_d.sv from the CIC submodule with VAR_RATE = 0
+
+    The filter has CIC_N integrators at the input rate, a downsampler that passes every CIC_R-th sample
+    and CIC_N combs with differential delay CIC_M at the output rate. All registers have
+    B_MAX = INP_DW + CIC_N * log2(CIC_R * CIC_M) bits and wrap around like in the HDL, the output are
+    the upper OUT_DW bits of the last comb. The integrators are cumulative sums over a whole block.
+
+    The downsampler passes input sample CIC_R - 1, 2 * CIC_R - 1, ... after reset().
+    Integrator, comb and downsampler state is kept across calls of process_block(),
+    so a long stream can be processed in arbitrary chunks with the same result as in one piece.
+    '''
+    def __init__(self, INP_DW, OUT_DW, CIC_R, CIC_N = 3, CIC_M = 1):
+        self.INP_DW = int(INP_DW)
+        self.OUT_DW = int(OUT_DW)
+        self.CIC_R = int(CIC_R)
+        self.CIC_N = int(CIC_N)
+        self.CIC_M = int(CIC_M)
+        self.B_MAX = self.INP_DW + self.CIC_N * int(np.ceil(np.log2(self.CIC_R * self.CIC_M)))
+        assert self.B_MAX <= 62, 'registers wider than 62 bits are not supported'
+        self.MASK = (1 << self.B_MAX) - 1
+        self.reset()
+
+    def reset(self):
+        self.integrators = np.zeros(self.CIC_N, np.int64)
+        self.combs = np.zeros((self.CIC_N, self.CIC_M), np.int64)
+        self.phase = 0
+
+    def process_block(self, data):
+        """process a block of valid input samples (signed INP_DW bit values), returns the decimated output samples"""
+        x = np.asarray(data, dtype = np.int64) & ((1 << self.INP_DW) - 1)
+        x = np.where(x >> (self.INP_DW - 1), x - (1 << self.INP_DW), x)
+        N = len(x)
+        if N == 0:
+            return np.zeros(0, np.int64)
+
+        # int64 wraps around modulo 2 ** 64, which is a multiple of 2 ** B_MAX,
+        # so the integrators only need to be masked after the downsampler
+        for k in range(self.CIC_N):
+            x = np.cumsum(x)
+            x += self.integrators[k]
+            self.integrators[k] = x[-1] & self.MASK
+
+        y = x[self.CIC_R - 1 - self.phase::self.CIC_R] & self.MASK
+        self.phase = (self.phase + N) % self.CIC_R
+
+        for k in range(self.CIC_N):
+            buf = np.concatenate((self.combs[k], y))
+            y = (buf[self.CIC_M:] - buf[:len(y)]) & self.MASK
+            self.combs[k] = buf[len(buf) - self.CIC_M:]
+
+        y = np.where(y >> (self.B_MAX - 1), y - (1 << self.B_MAX), y)
+        return y >> (self.B_MAX - self.OUT_DW)
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def _signed(val, bits, dtype = np.int64):
+    val = (np.asarray(val) & ((1 << bits) - 1)).astype(dtype, copy = False)
+    return val - ((val >> (bits - 1)) << bits)
+
+
+class Model:
+    '''
+    Bit accurate model of the results of the complex_multiplier core
+
+    The full precision products a_re * b_re - a_im * b_im and a_re * b_im + a_im * b_re have
+    OPERAND_WIDTH_A + OPERAND_WIDTH_B + 1 bits, GROWTH_BITS removes (negative) or adds bits at the top.
+    The outputs are the upper OPERAND_WIDTH_OUT bits of that range, the bits below are truncated and the bits above
+    wrap around. Operands and results are packed with the imaginary part in the upper half of the word.
+    Products wider than 63 bits are calculated with python ints (object arrays).
+
+    m_axis_dout_tvalid is set LATENCY = STAGES clock edges after the edge that sets the input valid, FFT_demod.sv
+    (STAGES = 6) and channel_estimator.sv (default STAGES) delay the tuser of the product by the same 6 clock cycles.
+    '''
+    def __init__(self, OPERAND_WIDTH_A = 16, OPERAND_WIDTH_B = 16, OPERAND_WIDTH_OUT = 16, GROWTH_BITS = 0, STAGES = 6):
+        self.OPERAND_WIDTH_A = int(OPERAND_WIDTH_A)
+        self.OPERAND_WIDTH_B = int(OPERAND_WIDTH_B)
+        self.OPERAND_WIDTH_OUT = int(OPERAND_WIDTH_OUT)
+        self.GROWTH_BITS = int(GROWTH_BITS)
+        self.LATENCY = int(STAGES)
+        self.SHIFT = self.OPERAND_WIDTH_A + self.OPERAND_WIDTH_B + 1 + self.GROWTH_BITS - self.OPERAND_WIDTH_OUT
+        assert self.SHIFT >= 0, 'output is wider than the product'
+        self.dtype = np.int64 if self.OPERAND_WIDTH_A + self.OPERAND_WIDTH_B + 1 <= 63 else object
+
+    def multiply(self, a_re, a_im, b_re, b_im):
+        """real and imaginary part of a * b for arrays of signed operands"""
+        a_re = _signed(a_re, self.OPERAND_WIDTH_A, self.dtype)
+        a_im = _signed(a_im, self.OPERAND_WIDTH_A, self.dtype)
+        b_re = _signed(b_re, self.OPERAND_WIDTH_B, self.dtype)
+        b_im = _signed(b_im, self.OPERAND_WIDTH_B, self.dtype)
+        return (_signed((a_re * b_re - a_im * b_im) >> self.SHIFT, self.OPERAND_WIDTH_OUT),
+                _signed((a_re * b_im + a_im * b_re) >> self.SHIFT, self.OPERAND_WIDTH_OUT))
+
+    def multiply_words(self, a, b):
+        """m_axis_dout_tdata for arrays of packed s_axis_a_tdata and s_axis_b_tdata words"""
+        a = np.asarray(a, np.int64)
+        b = np.asarray(b, np.int64)
+        re, im = self.multiply(a, a >> self.OPERAND_WIDTH_A, b, b >> self.OPERAND_WIDTH_B)
+        MASK = (1 << self.OPERAND_WIDTH_OUT) - 1
+        return (re & MASK) | ((im & MASK) << self.OPERAND_WIDTH_OUT)
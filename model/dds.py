@@ -0,0 +1,100 @@
+import numpy as np
+
+
+def sine_lut(LUT_DW = 16, OUT_DW = 16):
+    """quarter wave sine table with 2 ** LUT_DW entries, same content as tests/sine_lut_{LUT_DW}_{OUT_DW}.hex"""
+    return np.round((2 ** (OUT_DW - 1) - 1) * np.sin(np.pi / 2 * np.arange(2 ** LUT_DW) / 2 ** LUT_DW)).astype(np.int64)
+
+def read_lut_file(filename):
+    """read a $readmemh file with '@address value value ...' lines"""
+    lut = []
+    with open(filename) as f:
+        for line in f:
+            words = line.split()
+            if not words:
+                continue
+            if words[0].startswith('@'):
+                assert int(words[0][1:], 16) == len(lut), f'{filename} is not contiguous'
+                words = words[1:]
+            lut.extend(int(word, 16) for word in words)
+    return np.array(lut, np.int64)
+
+
+class Model:
+    '''
+    Bit accurate model of the dds core with SIN_COS = 1
+
+    The upper 2 bits of the PHASE_DW bit phase select the quadrant, the lower bits are the position inside
+    the quadrant, which is inverted for the 2nd and 4th quadrant. The upper LUT_DW bits of the position address
+    a quarter wave sine table, the result is negated for the 3rd and 4th quadrant. With USE_TAYLOR the remaining
+    TAYLOR_DW bits d correct the table value with the first order Taylor series sin(x + d) = sin(x) + d * cos(x),
+    cos(x) is the mirrored table entry and the correction is truncated like an arithmetic right shift.
+    The cosine is the sine of the next quadrant. m_axis_out_tdata is {sin, cos} with OUT_DW bits each.
+
+    The phase accumulator in front of the dds adds inc for every valid input sample. The sample that is valid
+    at the same clock as the accumulator update is multiplied with the phase before the update,
+    DELAY delays the phase by additional samples like a longer dds pipeline when samples arrive at every clock.
+    process_block() returns the dds outputs for a block of samples and keeps the accumulator state,
+    so a stream can be processed in arbitrary blocks.
+    '''
+    TWO_PI_FRAC = 16
+
+    def __init__(self, PHASE_DW = 20, OUT_DW = 16, USE_TAYLOR = 1, LUT_DW = 16, NEGATIVE_SINE = 0,
+                 NEGATIVE_COSINE = 0, LUT_FILE = '', DELAY = 0):
+        self.PHASE_DW = int(PHASE_DW)
+        self.OUT_DW = int(OUT_DW)
+        self.USE_TAYLOR = int(USE_TAYLOR)
+        self.LUT_DW = int(LUT_DW)
+        self.NEGATIVE_SINE = int(NEGATIVE_SINE)
+        self.NEGATIVE_COSINE = int(NEGATIVE_COSINE)
+        self.DELAY = int(DELAY)
+        self.TAYLOR_DW = self.PHASE_DW - 2 - self.LUT_DW
+        assert self.TAYLOR_DW >= 0, 'PHASE_DW has to be at least LUT_DW + 2'
+        self.PHASE_MASK = (1 << self.PHASE_DW) - 1
+        self.lut = read_lut_file(LUT_FILE) if LUT_FILE != '' else sine_lut(self.LUT_DW, self.OUT_DW)
+        assert len(self.lut) == 2 ** self.LUT_DW, f'sine lut needs {2 ** self.LUT_DW} entries'
+        self.TWO_PI = int(np.round(2 * np.pi * 2 ** self.TWO_PI_FRAC))
+        self.reset()
+
+    def reset(self):
+        self.phase = 0
+        self.history = np.zeros(self.DELAY, np.int64)
+
+    def _quarter_wave(self, quadrant, position):
+        """sine at a position of LUT_DW + TAYLOR_DW bits inside the quadrant, quadrant and position are arrays"""
+        # the 2nd and 4th quadrant run backwards through the table
+        position = np.where(quadrant & 1, ~position & ((1 << (self.LUT_DW + self.TAYLOR_DW)) - 1), position)
+        addr = position >> self.TAYLOR_DW
+        value = self.lut[addr]
+        if self.USE_TAYLOR and self.TAYLOR_DW > 0:
+            # the derivative cos(x) is the mirrored table entry
+            d = (position & ((1 << self.TAYLOR_DW) - 1)) * self.TWO_PI
+            value = value + ((self.lut[~addr & ((1 << self.LUT_DW) - 1)] * d) >> (self.PHASE_DW + self.TWO_PI_FRAC))
+        return np.where(quadrant >= 2, -value, value)
+
+    def lookup(self, phase):
+        """sin and cos output for an array of phases"""
+        phase = np.asarray(phase, np.int64) & self.PHASE_MASK
+        quadrant = phase >> (self.PHASE_DW - 2)
+        position = phase & ((1 << (self.PHASE_DW - 2)) - 1)
+        sin = self._quarter_wave(quadrant, position)
+        cos = self._quarter_wave((quadrant + 1) & 3, position)
+        if self.NEGATIVE_SINE:
+            sin = -sin
+        if self.NEGATIVE_COSINE:
+            cos = -cos
+        return sin, cos
+
+    def phases(self, num, inc):
+        """phases that the dds uses for the next num samples with a constant increment inc"""
+        acc = (self.phase + inc * np.arange(num, dtype = np.int64)) & self.PHASE_MASK
+        self.phase = (self.phase + inc * num) & self.PHASE_MASK
+        if self.DELAY == 0:
+            return acc
+        acc = np.concatenate((self.history, acc))
+        self.history = acc[len(acc) - self.DELAY:]
+        return acc[:num]
+
+    def process_block(self, num, inc):
+        """sin and cos outputs for the next num samples"""
+        return self.lookup(self.phases(num, inc))
@@ -0,0 +1,53 @@
+import numpy as np
+
+
+class Model:
+    '''
+    Bit accurate model of the results and timing of div.sv
+
+    Both variants do a restoring division with RESULT_WIDTH result bits, so the result is
+    floor(numerator / denominator) limited to 2 ** RESULT_WIDTH - 1.
+    PIPELINED = 1 has RESULT_WIDTH + 1 register stages, it accepts a new operand pair every clock cycle
+    and x / 0 gives 2 ** RESULT_WIDTH - 1. PIPELINED = 0 calculates one result bit per clock cycle
+    and ignores valid_i while it is busy, x / 0 and 0 / x give 0 without calculation.
+
+    latency() is the number of clock edges from the edge that samples valid_i to the edge that sets valid_o,
+    interval() is the minimum distance in clock cycles from one valid_i to the next.
+    calc(), latency() and interval() take arrays of operands and return the values for all of them at once.
+    '''
+    def __init__(self, INPUT_WIDTH = 16, RESULT_WIDTH = 16, PIPELINED = 0):
+        self.INPUT_WIDTH = int(INPUT_WIDTH)
+        self.RESULT_WIDTH = int(RESULT_WIDTH)
+        self.PIPELINED = int(PIPELINED)
+        self.MAX_RESULT = (1 << self.RESULT_WIDTH) - 1
+        # latency of the pipeline or of a division that is not skipped
+        self.LATENCY = self.RESULT_WIDTH
+        self.dtype = np.int64 if self.INPUT_WIDTH <= 62 and self.RESULT_WIDTH <= 62 else object
+
+    def _unsigned(self, val):
+        return np.asarray(val).astype(self.dtype) & ((1 << self.INPUT_WIDTH) - 1)
+
+    def _skipped(self, numerator, denominator):
+        """operands for which the not pipelined FSM returns 0 immediately"""
+        return (self._unsigned(numerator) == 0) | (self._unsigned(denominator) == 0)
+
+    def calc(self, numerator, denominator):
+        """result_o for arrays of numerator_i and denominator_i"""
+        numerator = self._unsigned(numerator)
+        denominator = self._unsigned(denominator)
+        safe = np.where(denominator == 0, 1, denominator)
+        result = np.where(denominator == 0, self.MAX_RESULT, np.minimum(numerator // safe, self.MAX_RESULT))
+        if not self.PIPELINED:
+            result = np.where((numerator == 0) | (denominator == 0), 0, result)
+        return result
+
+    def latency(self, numerator, denominator):
+        if self.PIPELINED:
+            return np.full(np.shape(numerator), self.LATENCY, np.int64)
+        return np.where(self._skipped(numerator, denominator), 0, self.LATENCY).astype(np.int64)
+
+    def interval(self, numerator, denominator):
+        if self.PIPELINED:
+            return np.ones(np.shape(numerator), np.int64)
+        # the FSM is back in state 0 one clock cycle after the last result bit
+        return np.where(self._skipped(numerator, denominator), 1, self.LATENCY + 1).astype(np.int64)
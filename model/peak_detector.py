@@ -2,12 +2,82 @@ import numpy as np
 
 
 class Model:
-    def __init__(self, IN_DW, WINDOW_LEN):
+    '''
+    Model of Peak_detector.sv
+
+    detection_shift, noise_limit and enable correspond to the inputs detection_shift_i, noise_limit_i and enable_i,
+    they can be changed between calls of process_block() or tick().
+    The model keeps its window and init_counter across calls, so that a long stream
+    can be processed in arbitrary chunks with the same result as in one piece.
+    '''
+    def __init__(self, IN_DW, WINDOW_LEN, DETECTION_SHIFT = 4, NOISE_LIMIT = 0):
         self.IN_DW = int(IN_DW)
         self.WINDOW_LEN = int(WINDOW_LEN)
+        self.AVERAGE_DW = self.IN_DW + int(np.ceil(np.log2(self.WINDOW_LEN)))
+        self.detection_shift = int(DETECTION_SHIFT)
+        self.noise_limit = int(NOISE_LIMIT)
+        self.enable = True
+        self.reset()
+
+    def process_block(self, data):
+        """process a block of valid input samples at once
+
+        Returns the arrays (peak_detected, score, peak_valid) with one entry per input sample,
+        these are the values of peak_detected_o, score_o and peak_valid_o one clock cycle after the input sample.
+        """
+        data = np.asarray(data, dtype = np.int64)
+        N = len(data)
+        W = self.WINDOW_LEN
+
+        # the registered average lags one sample behind in_buffer, therefore the window for sample n is
+        # data[n - WINDOW_LEN] ... data[n - 2]. The cumulative sum is done in uint64,
+        # so that it can wrap around for long blocks while the differences stay exact.
+        buf = np.concatenate((self.history, data))
+        cumsum = np.concatenate(([0], np.cumsum(buf.astype(np.uint64))))
+        average = (cumsum[W - 1:][:N] - cumsum[:N]).astype(np.int64)
+        self.history = buf[N:]
+
+        # total_shift is a signed 8 bit wire in the HDL
+        total_shift = (int(np.ceil(np.log2(W))) - self.detection_shift) & 0xFF
+        total_shift = total_shift - 256 if total_shift >= 128 else total_shift
+        if total_shift > 0:
+            threshold = average >> total_shift
+        else:
+            threshold = (average << -total_shift) & (2 ** self.AVERAGE_DW - 1)
+
+        warm = np.arange(self.init_counter, self.init_counter + N) >= W
+        self.init_counter = min(self.init_counter + N, W)
+        detected = warm & (data > threshold) & (data > self.noise_limit)
+        score = np.where(detected, (data - threshold) & (2 ** self.IN_DW - 1), 0)
+        return detected & bool(self.enable), score, warm
 
     def tick(self):
-        pass
+        if self.in_buffer is not None:
+            peak_detected, score, peak_valid = self.process_block([self.in_buffer])
+            self.peak_detected = bool(peak_detected[0])
+            self.score = int(score[0])
+            self.valid = bool(peak_valid[0])
+            self.in_buffer = None
+        else:
+            self.peak_detected = False
+            self.valid = False
+
+    def set_data(self, data_in):
+        self.in_buffer = data_in
 
     def reset(self):
-        pass
\ No newline at end of file
+        self.history = np.zeros(self.WINDOW_LEN, np.int64)
+        self.init_counter = 0
+        self.in_buffer = None
+        self.peak_detected = False
+        self.score = 0
+        self.valid = False
+
+    def data_valid(self):
+        return self.valid
+
+    def get_data(self):
+        return self.peak_detected
+
+    def get_score(self):
+        return self.score
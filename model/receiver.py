@@ -0,0 +1,646 @@
+import numpy as np
+import importlib.util
+import bisect
+import os
+
+spec = importlib.util.spec_from_file_location('pbch_sequences', os.path.join(os.path.dirname(os.path.abspath(__file__)), '../tools/pbch_sequences.py'))
+pbch_sequences = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pbch_sequences)
+
+def _twos_comp_array(val, bits):
+    """compute the 2's complement of every element of an int array"""
+    val = np.asarray(val, dtype = np.int64) & ((1 << bits) - 1)
+    return val - ((val >> (bits - 1)) << bits)
+
+def _load_model(name):
+    """load a model from the model directory, like the testbenches do"""
+    model_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'{name}.py')
+    spec = importlib.util.spec_from_file_location(name, model_file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class Model:
+    '''
+    Model of receiver.sv
+
+    The whole chain CFO correction -> PSS_detector -> frame_sync -> FFT_demod -> BWP_extractor -> SSS_detector,
+    channel_estimator, demap and ressource_grid_framer is processed in blocks with numpy. process() takes the packed
+    s_axis_in_tdata words of a whole capture and returns a dict with the streams that test_receiver.py collects
+    from the DUT.
+
+    The PSS detector runs in chunks of CHUNK_LEN samples. frame_sync and the CFO feedback loop act on the detector
+    input, therefore a chunk is rolled back and processed again up to the sample where a CFO update or a
+    detector reset (lost SSB) takes effect.
+    The CIC decimators use the bit accurate model/cic_d.py, which decimates at phase CIC_RATE - 1.
+    The correlators run with FFTs, C0 and C1 are only calculated for detected peaks.
+    The CFO correction uses the dds and complex_multiplier models, the CFO is calculated with the CFO_calc model.
+    channel_estimator uses the atan2, dds and complex_multiplier models, the dds core is not part of this
+    repository, its LUT_DW is assumed to be PHASE_DW - 2 like in the commented out parameter
+    in channel_estimator.sv. FFT_demod uses the FFT_demod model, see there for the block exponent.
+
+    The input gets a new sample every CLK_FREQ / SAMPLE_RATE clock cycles. Latencies are counted in clock cycles
+    along the FSMs of PSS_detector.sv, CFO_calc.sv and receiver.sv and converted to samples:
+    a CFO update takes effect CFO_calc.latency() + the detector pipeline later, and the timestamp of a symbol is
+    the sample count at the input when frame_sync signals sample_id_valid. CIC_LATENCY and DDS_LATENCY are
+    the latencies of the cic_d and dds cores, which are not part of this repository.
+    FFT_demod delays every symbol by the same number of clock cycles, so its latency does not change any output.
+    '''
+    PEAK_DELAY_LIMIT = 129
+    BLK_EXP_LEN = 8
+    FFT_OUT_DW = 16
+    DDS_PHASE_DW = 20
+    DDS_OUT_DW = 32
+    CFO_DW = 20
+    SSS_LEN = 127
+    PBCH_LEN = 240
+    PBCH_DMRS_LEN = 144
+    N_ID_1_MAX = 335
+    SYM_PER_SF = 14
+    SUBFRAMES_PER_FRAME = 20
+    SFN_MAX = 1023
+    CHEST_PHASE_DW = 12
+
+    SEARCH = 0
+    FIND = 1
+    PAUSE = 2
+
+    def __init__(self, IN_DW, OUT_DW, TAP_DW, PSS_LEN, PSS_LOCAL_0 = 0, PSS_LOCAL_1 = 0, PSS_LOCAL_2 = 0,
+                 WINDOW_LEN = 8, HALF_CP_ADVANCE = 1, USE_TAP_FILE = 0, TAP_FILE_0 = '', TAP_FILE_1 = '', TAP_FILE_2 = '',
+                 TAP_FILE_PATH = '', LLR_DW = 8, NFFT = 8, MULT_REUSE = 0, CLK_FREQ = 3840000, INITIAL_DETECTION_SHIFT = 4,
+                 INITIAL_CFO_MODE = 0, HAS_CFO_COR = 1, CHUNK_LEN = 2 ** 16, MULT_REUSE_FFT = 1, CIC_LATENCY = 8,
+                 DDS_LATENCY = 4):
+        self.IN_DW = int(IN_DW)
+        self.OUT_DW = int(OUT_DW)
+        self.TAP_DW = int(TAP_DW)
+        self.PSS_LEN = int(PSS_LEN)
+        self.WINDOW_LEN = int(WINDOW_LEN)
+        self.HALF_CP_ADVANCE = int(HALF_CP_ADVANCE)
+        self.LLR_DW = int(LLR_DW)
+        self.NFFT = int(NFFT)
+        self.MULT_REUSE = int(MULT_REUSE)
+        self.CLK_FREQ = int(CLK_FREQ)
+        self.DETECTION_SHIFT = int(INITIAL_DETECTION_SHIFT)
+        self.CFO_MODE = int(INITIAL_CFO_MODE)
+        self.HAS_CFO_COR = int(HAS_CFO_COR)
+        self.MULT_REUSE_FFT = int(MULT_REUSE_FFT)
+        self.CIC_LATENCY = int(CIC_LATENCY)
+        self.DDS_LATENCY = int(DDS_LATENCY)
+
+        self.FFT_LEN = 2 ** self.NFFT
+        self.CIC_RATE = self.FFT_LEN // 128
+        self.CHUNK_LEN = max(int(CHUNK_LEN) // self.CIC_RATE, 1) * self.CIC_RATE
+        self.CP1_LEN = 20 * self.FFT_LEN // 256
+        self.CP2_LEN = 18 * self.FFT_LEN // 256
+        self.SAMPLE_RATE = 3840000 * self.FFT_LEN // 256
+        self.N_PRB = {8: 20, 9: 25, 10: 52, 11: 106}[self.NFFT]
+        self.SYMBOL_LEN = self.N_PRB * 12
+        self.SC_START = self.FFT_LEN // 2 - self.SYMBOL_LEN // 2
+        self.PBCH_START = self.FFT_LEN // 2 - self.PBCH_LEN // 2
+        self.SSS_START = self.FFT_LEN // 2 - (self.SSS_LEN + 1) // 2
+        self.NUM_TIMESTAMP_SAMPLES = 64 // self.FFT_OUT_DW
+        self.FIND_SAMPLES_TOLERANCE = 3 * self.CIC_RATE
+        self.SYMS_BTWN_SSB = self.SUBFRAMES_PER_FRAME * self.SYM_PER_SF
+
+        # frame_sync counts clock cycles, everything else in this model counts samples
+        clks_per_sample = self.CLK_FREQ / self.SAMPLE_RATE
+        self.CLKS_PER_SAMPLE = max(self.CLK_FREQ // self.SAMPLE_RATE, 1)
+        CLKS_20MS = int(self.CLK_FREQ * 0.02)
+        CLKS_PSS_TOLERANCE = int(self.CLK_FREQ * 0.00001)
+        self.PAUSE_SAMPLES = int((CLKS_20MS - CLKS_PSS_TOLERANCE + 2) / clks_per_sample)
+        self.FIND_SAMPLES = int((CLKS_20MS + CLKS_PSS_TOLERANCE + 3) / clks_per_sample)
+        self.SSS_DETECT_SAMPLES = int(((self.N_ID_1_MAX + 1) * self.SSS_LEN + 4) / clks_per_sample)
+        self.DMRS_SAMPLES = int((2 * self.PBCH_DMRS_LEN + 1606) / clks_per_sample)
+
+        PSS_correlator_mr = _load_model('PSS_correlator_mr')
+        peak_detector = _load_model('peak_detector')
+        PSS_LOCAL = [PSS_LOCAL_0, PSS_LOCAL_1, PSS_LOCAL_2]
+        TAP_FILE = [TAP_FILE_0, TAP_FILE_1, TAP_FILE_2]
+        if USE_TAP_FILE and TAP_FILE_PATH != '':
+            TAP_FILE = [os.path.join(TAP_FILE_PATH, f'PSS_taps_{i}.hex') for i in range(3)]
+        self.correlators = [PSS_correlator_mr.Model(self.IN_DW, self.OUT_DW, self.TAP_DW, self.PSS_LEN, PSS_LOCAL[i],
+            self.MULT_REUSE, 0, USE_TAP_FILE, TAP_FILE[i]) for i in range(3)]
+        self.peak_detectors = [peak_detector.Model(self.OUT_DW, self.WINDOW_LEN, self.DETECTION_SHIFT) for i in range(3)]
+
+        self.dds = _load_model('dds').Model(self.DDS_PHASE_DW, self.DDS_OUT_DW // 2, 1, 16)
+        complex_multiplier = _load_model('complex_multiplier')
+        self.cfo_mult = complex_multiplier.Model(self.DDS_OUT_DW // 2, self.IN_DW // 2, self.IN_DW // 2, -2)
+        self.CFO_calc = _load_model('CFO_calc').Model(self.correlators[0].C_DW, self.CFO_DW, self.DDS_PHASE_DW)
+        # clock edges from the edge that sets a sample valid at the output of the input FIFO to the edge that sets
+        # N_id_2_valid and peak_valid_f for the correlator output that it completes: complex_multiplier, cic_d,
+        # PSS_correlator, Peak_detector and the registers in PSS_detector
+        self.PEAK_CLKS = ((self.cfo_mult.LATENCY if self.HAS_CFO_COR else 0) + (self.CIC_LATENCY if self.CIC_RATE > 1 else 0)
+            + self.correlators[0].LATENCY + 2)
+        # the dds output lags DDS_phase by DDS_LATENCY clock cycles, that are DDS_DELAY samples
+        self.DDS_DELAY = -(-(self.DDS_LATENCY + 1) // self.CLKS_PER_SAMPLE) - 1
+        # the data FIFO of PSS_detector releases a sample every RELEASE_CLKS clock cycles
+        self.RELEASE_CLKS = max(self.MULT_REUSE_FFT >> 1, 1)
+
+        self.chest_atan2 = _load_model('atan2').Model(self.FFT_OUT_DW // 2, 14, self.CHEST_PHASE_DW)
+        self.chest_dds = _load_model('dds').Model(self.CHEST_PHASE_DW, self.DDS_OUT_DW // 2, 0, self.CHEST_PHASE_DW - 2)
+        self.chest_mult = complex_multiplier.Model(self.DDS_OUT_DW // 2, self.FFT_OUT_DW // 2, self.FFT_OUT_DW // 2, -2)
+
+        cic_d = _load_model('cic_d')
+        self.cics = [cic_d.Model(self.IN_DW // 2, self.IN_DW // 2, self.CIC_RATE, 3) for i in range(2)]
+
+        self.fft_demod = _load_model('FFT_demod').Model(self.IN_DW, self.FFT_OUT_DW, self.NFFT, self.HALF_CP_ADVANCE, self.BLK_EXP_LEN)
+
+        self.sss_detector = _load_model('SSS_detector').Model(self.FFT_OUT_DW)
+        self.reset()
+
+    def reset(self):
+        self._reset_detector(0)
+        self.dds_phase = 0
+        self.CFO_DDS_inc_f = 0
+        self.pss_state = self.SEARCH
+        self.pss_last = 0
+        self.requested_N_id_2 = 0
+        self.cfo_busy_until = 0
+        self.synced = False
+        self.runs = []
+        self.run = None
+        self.pending = []
+        self.last_event = -1
+        self.dropped = 0
+        self.timestamps = []
+        self.peaks = []
+        self.N_id_2s = []
+        self.CFO_DDS_incs = []
+
+    def _reset_detector(self, base):
+        for correlator in self.correlators:
+            correlator.reset()
+        for peak_detector in self.peak_detectors:
+            peak_detector.reset()
+        for cic in self.cics:
+            cic.reset()
+        self.det_base = base
+        self.dec_cnt = 0
+
+    def _snapshot(self):
+        """state of the PSS detector chain, the arrays that the models update in place are copied"""
+        return ([(c.history_re, c.history_im, c.sample_cnt, c.first_valid, c.last_clk) for c in self.correlators],
+            [(p.history, p.init_counter) for p in self.peak_detectors],
+            [(c.integrators.copy(), c.combs.copy(), c.phase) for c in self.cics],
+            self.det_base, self.dec_cnt, self.dds_phase, self.CFO_DDS_inc_f)
+
+    def _restore(self, snapshot):
+        correlators, peak_detectors, cics, self.det_base, self.dec_cnt, self.dds_phase, self.CFO_DDS_inc_f = snapshot
+        for c, state in zip(self.correlators, correlators):
+            c.history_re, c.history_im, c.sample_cnt, c.first_valid, c.last_clk = state
+        for p, state in zip(self.peak_detectors, peak_detectors):
+            p.history, p.init_counter = state
+        for c, (integrators, combs, phase) in zip(self.cics, cics):
+            c.integrators, c.combs, c.phase = integrators.copy(), combs.copy(), phase
+
+    def _horizon(self):
+        """first sample that the data FIFO inside PSS_detector has not released yet"""
+        return self.det_base + max(self.dec_cnt - self.WINDOW_LEN - self.PEAK_DELAY_LIMIT, 0) * self.CIC_RATE
+
+    def _run_detector(self, in_re, in_im, start, stop):
+        """CFO correction and PSS detection for the input samples start ... stop - 1
+
+        Returns a list of (sample, N_id_2, C0, C1, detection_sample) for every correlator output
+        where one and only one peak detector fires, sample is the index of the sample that
+        leaves the data FIFO together with N_id_2_valid_o.
+        """
+        N = stop - start
+        OP_DW = self.IN_DW // 2
+        re = in_re[start:stop]
+        im = in_im[start:stop]
+        if self.HAS_CFO_COR:
+            phase = (self.dds_phase + self.CFO_DDS_inc_f * np.arange(N)) & (2 ** self.DDS_PHASE_DW - 1)
+            self.dds_phase = (self.dds_phase + self.CFO_DDS_inc_f * N) & (2 ** self.DDS_PHASE_DW - 1)
+            dds_im, dds_re = self.dds.lookup(phase)
+            re, im = self.cfo_mult.multiply(dds_re, dds_im, re, im)
+        self.out_re[start:stop] = re
+        self.out_im[start:stop] = im
+
+        if self.CIC_RATE > 1:
+            cic_re = self.cics[0].process_block(re)
+            cic_im = self.cics[1].process_block(im)
+        else:
+            cic_re, cic_im = re, im
+        words = (cic_re & (2 ** OP_DW - 1)) + ((cic_im & (2 ** OP_DW - 1)) << OP_DW)
+
+        detected = []
+        for correlator, peak_detector in zip(self.correlators, self.peak_detectors):
+            result, _, _ = correlator.process_block(words, partial = False)
+            detected.append(peak_detector.process_block(result)[0])
+        detected = np.array(detected)
+        d = self.dec_cnt + np.arange(len(words))
+        self.dec_cnt += len(words)
+        single = (detected.sum(axis = 0) == 1) & (d >= self.WINDOW_LEN + self.PEAK_DELAY_LIMIT)
+        candidates = []
+        for k in np.flatnonzero(single):
+            N_id_2 = int(np.argmax(detected[:, k]))
+            sample = self.det_base + (d[k] - self.WINDOW_LEN - self.PEAK_DELAY_LIMIT) * self.CIC_RATE
+            detection = self.det_base + d[k] * self.CIC_RATE + self.CIC_RATE - 1
+            C0, C1 = self.correlators[N_id_2].partial_correlations([k])
+            candidates.append((sample, N_id_2, C0[0], C1[0], detection))
+        return candidates
+
+    def _timestamp(self, start, fs_clks):
+        '''sample_cnt of the input FIFO output when frame_sync signals sample_id_valid for a symbol that starts with
+        sample start, fs_clks clock cycles after start leaves PSS_detector
+
+        The data FIFO of PSS_detector releases the CIC_RATE samples of a correlator output when the peak_fifo entry
+        WINDOW_LEN + PEAK_DELAY_LIMIT + 1 correlator outputs later is valid, one clock after peak_valid_f.
+        '''
+        k = (start - self.det_base) % self.CIC_RATE
+        last = start - k + (self.WINDOW_LEN + self.PEAK_DELAY_LIMIT + 1) * self.CIC_RATE - 1
+        return last + (self.PEAK_CLKS + 1 + k * self.RELEASE_CLKS + fs_clks + 1) // self.CLKS_PER_SAMPLE
+
+    def _pss_mode(self, sample):
+        if self.pss_state != self.SEARCH:
+            if sample - self.pss_last <= self.PAUSE_SAMPLES:
+                return self.PAUSE
+            if sample - self.pss_last <= self.FIND_SAMPLES:
+                return self.FIND
+            self.pss_state = self.SEARCH
+        return self.SEARCH
+
+    def _next_symbol(self, start, anchored):
+        """end_of_symbol in frame_sync, the next symbol starts at sample start"""
+        S, CP_len, sym, subframe, sfn = self.symbol
+        if sym == self.SYM_PER_SF - 1:
+            sym = 0
+            if subframe == self.SUBFRAMES_PER_FRAME - 1:
+                subframe = 0
+                sfn = 0 if sfn == self.SFN_MAX - 1 else sfn + 1
+            else:
+                subframe += 1
+        else:
+            sym += 1
+        CP_len = self.CP1_LEN if sym % self.SYM_PER_SF in [0, 7] else self.CP2_LEN
+        self.symbol = [start, CP_len, sym, subframe, sfn]
+        # sample_id_valid is one clock earlier if the symbol starts with an SSB
+        self.timestamps.append(self._timestamp(start, 1 if anchored else 2))
+
+    def _close_symbol(self, end):
+        S, CP_len, sym, subframe, sfn = self.symbol
+        last = S + self.FFT_LEN + CP_len - 1
+        self.run['symbols'].append((S, CP_len, sym, subframe, sfn, last if last < end else -1))
+
+    def _fs_advance(self, sample):
+        """frame_sync state for all samples before sample"""
+        while self.synced:
+            S, CP_len = self.symbol[:2]
+            L = self.FFT_LEN + CP_len
+            if self.syms_since_last_SSB == self.SYMS_BTWN_SSB - 1:
+                lost = S + 1 + L + self.FIND_SAMPLES_TOLERANCE
+                if lost < sample:
+                    self._close_symbol(lost)
+                    self.run['end'] = lost
+                    self.synced = False
+                    self.pending.append((self._timestamp(lost, 0), 'reset', lost))
+                break
+            if S + L >= sample:
+                break
+            self._close_symbol(S + L)
+            self.syms_since_last_SSB += 1
+            self._next_symbol(S + L, False)
+
+    def _fs_event(self, sample, N_id_2):
+        """N_id_2_valid_i at frame_sync"""
+        if not self.synced:
+            self.synced = True
+            self.run = {'start': sample, 'end': None, 'symbols': [], 'SSB_starts': [], 'events': []}
+            self.runs.append(self.run)
+            subframe, sfn = (self.symbol[3], self.symbol[4]) if self.runs[:-1] else (0, 0)
+            self.symbol = [sample, self.CP2_LEN, 2, subframe, sfn]
+            self.syms_since_last_SSB = 0
+            self.timestamps.append(self._timestamp(sample, 2))
+        elif self.syms_since_last_SSB == self.SYMS_BTWN_SSB - 1:
+            S, CP_len = self.symbol[:2]
+            L = self.FFT_LEN + CP_len
+            sample_cnt = sample - S - 1
+            if L - self.FIND_SAMPLES_TOLERANCE + 1 <= sample_cnt <= L + self.FIND_SAMPLES_TOLERANCE - 1:
+                self._close_symbol(sample)
+                self.run['SSB_starts'].append(sample - 1)
+                self.syms_since_last_SSB = 0
+                self._next_symbol(sample, True)
+        self.run['events'].append((sample, N_id_2))
+
+    def _handle_candidate(self, candidate):
+        sample, N_id_2, C0, C1, detection = candidate
+        mode = self._pss_mode(sample)
+        if (mode == self.PAUSE) or (mode == self.FIND and N_id_2 != self.requested_N_id_2):
+            return
+        self.pss_state = self.PAUSE
+        self.pss_last = sample
+        self.requested_N_id_2 = N_id_2
+        self.peaks.append(sample + 1 - self.dropped)
+        self.N_id_2s.append(N_id_2)
+        if self.HAS_CFO_COR and self.CFO_MODE == 0 and detection >= self.cfo_busy_until:
+            # C0 and C1 are integers below 2 ** 53, so they are exact in the complex float
+            C0 = self.CFO_calc.pack([int(C0.real)], [int(C0.imag)])
+            C1 = self.CFO_calc.pack([int(C1.real)], [int(C1.imag)])
+            _, CFO_DDS_inc = self.CFO_calc.calc(C0, C1)
+            CFO_calc_clks = int(self.CFO_calc.latency(C0, C1)[0])
+            # the CFO FSM of PSS_detector passes N_id_2_valid to CFO_calc and CFO_calc samples it one clock later,
+            # peaks are ignored until CFO_valid_o is set one clock after valid_o of CFO_calc
+            self.cfo_busy_until = detection + -(-(CFO_calc_clks + 3) // self.CLKS_PER_SAMPLE)
+            # receiver.sv registers CFO_DDS_inc_f one clock after CFO_valid_o and DDS_phase adds it with the next
+            # input sample, the samples that the dds output lags behind are rotated with the old increment
+            update_clks = self.PEAK_CLKS + CFO_calc_clks + 4
+            effect = detection + -(-update_clks // self.CLKS_PER_SAMPLE) + self.DDS_DELAY
+            self.pending.append((effect, 'cfo', int(CFO_DDS_inc[0])))
+        self._fs_event(sample, N_id_2)
+
+    def _handle(self, candidates, limit):
+        """returns True if a pending effect has to be applied before sample limit"""
+        def effect_before_limit():
+            return any(self._align(e) < limit for e, _, _ in self.pending)
+        resets = [e for e, kind, _ in self.pending if kind == 'reset']
+        for candidate in candidates:
+            if candidate[0] <= self.last_event or (resets and candidate[4] >= min(resets)):
+                continue
+            self._fs_advance(candidate[0])
+            if effect_before_limit():
+                return True
+            self._handle_candidate(candidate)
+            self.last_event = candidate[0]
+            if effect_before_limit():
+                return True
+        self._fs_advance(self._horizon())
+        return effect_before_limit()
+
+    def _align(self, sample):
+        offset = (sample - self.det_base) % self.CIC_RATE
+        return sample if offset == 0 else sample + self.CIC_RATE - offset
+
+    def _apply_effects(self, pos):
+        for effect in sorted([e for e in self.pending if self._align(e[0]) <= pos]):
+            self.pending.remove(effect)
+            _, kind, value = effect
+            if kind == 'cfo':
+                self.CFO_DDS_inc_f = int(_twos_comp_array(self.CFO_DDS_inc_f - value, self.DDS_PHASE_DW))
+                self.CFO_DDS_incs.append(value)
+            else:
+                # clear_detector_no resets PSS_detector including its data FIFO
+                self.dropped += pos - value
+                self._reset_detector(pos)
+
+    def process(self, samples):
+        """process the packed s_axis_in_tdata words of a whole capture
+
+        Returns a dict with numpy arrays:
+            peak_pos        position of every N_id_2_valid in the m_axis_PSS_out stream,
+                            this is the first sample of the symbol that contains the PSS
+            N_id_2          detected N_id_2 for every peak
+            CFO_DDS_inc     every CFO_DDS_inc that was applied
+            N_id, N_id_1    results of SSS_detector
+            SSS             SSS carriers (SSS_valid_o)
+            PBCH            PBCH carriers (PBCH_valid_o)
+            ibar_SSB        ibar_SSB_o of channel_estimator
+            cest            channel_estimator output, cest_blk_exp and cest_type are taken from its tuser
+            llr             demap output for PBCH symbols
+            rgs             ressource_grid_framer packets, one row per symbol:
+                            blk_exp, 4 timestamp words, SYMBOL_LEN IQ words
+        """
+        self.reset()
+        samples = np.asarray(samples, dtype = np.int64)
+        OP_DW = self.IN_DW // 2
+        in_re = _twos_comp_array(samples, OP_DW)
+        in_im = _twos_comp_array(samples >> OP_DW, OP_DW)
+        N = len(samples)
+        self.out_re = np.zeros(N, np.int64)
+        self.out_im = np.zeros(N, np.int64)
+
+        pos = 0
+        while True:
+            self._apply_effects(pos)
+            stop = pos + (min(pos + self.CHUNK_LEN, N) - pos) // self.CIC_RATE * self.CIC_RATE
+            if stop <= pos:
+                break
+            if self.pending:
+                stop = min(stop, min(self._align(e) for e, _, _ in self.pending))
+            snapshot = self._snapshot()
+            if self._handle(self._run_detector(in_re, in_im, pos, stop), stop):
+                # an effect lands inside this chunk, redo the chunk up to that sample
+                stop = min(stop, min(self._align(e) for e, _, _ in self.pending))
+                self._restore(snapshot)
+                self._handle(self._run_detector(in_re, in_im, pos, stop), stop)
+            pos = stop
+
+        end = self._horizon()
+        self._fs_advance(end)
+        if self.synced:
+            self._close_symbol(end)
+            self.run['end'] = end
+        return self._demodulate()
+
+    def _fft_windows(self, run):
+        """FFT_demod input FSM, returns (first sample, symbol index) for every FFT window"""
+        symbols = run['symbols']
+        if len(symbols) == 0:
+            return []
+        # python lists and bisect, because this loop runs once per symbol with scalar lookups
+        starts = [s[0] for s in symbols]
+        CPs = [s[1] for s in symbols]
+        lasts = sorted(s[5] for s in symbols if s[5] >= 0)
+        last_set = set(lasts)
+        SSB_starts = list(run['SSB_starts'])
+        def CP_at(sample):
+            return CPs[max(bisect.bisect_right(starts, sample) - 1, 0)]
+        def threshold(CP_len):
+            return CP_len - (self.CP2_LEN >> 1) - 1 if self.HALF_CP_ADVANCE else CP_len - 1
+        def next_after(array, sample):
+            idx = bisect.bisect_right(array, sample)
+            return array[idx] if idx < len(array) else None
+
+        windows = []
+        anchor = run['start']
+        while True:
+            # SKIP_CP
+            matches = [anchor + threshold(CP_len) for CP_len in [self.CP2_LEN, self.CP1_LEN]
+                if CP_at(anchor + threshold(CP_len)) == CP_len]
+            t = min(matches) if matches else anchor + threshold(CP_at(anchor))
+            SSB_start = next_after(SSB_starts, anchor)
+            if SSB_start is not None and SSB_start <= t:
+                anchor = SSB_start
+                continue
+            # PROCESS, the FFT core gets the samples t ... t + FFT_LEN - 1
+            last = t + self.FFT_LEN
+            if last >= run['end']:
+                break
+            windows.append((t, bisect.bisect_right(starts, last) - 1))
+            if last in last_set:
+                anchor = last + 1
+                continue
+            # SKIP_END
+            tlast = next_after(lasts, last)
+            SSB_start = next_after(SSB_starts, last)
+            if tlast is not None and (SSB_start is None or tlast <= SSB_start):
+                anchor = tlast + 1
+            elif SSB_start is not None:
+                anchor = SSB_start
+            else:
+                break
+        return windows
+
+    def _fft(self, starts):
+        """FFT_demod output for windows starting at starts, returns (carriers, blk_exp)"""
+        # frame_sync counts a symbol from the sample after the one where it starts, see peak_pos
+        idx = np.asarray(starts, np.int64)[:, None] + 1 + np.arange(self.FFT_LEN)
+        return self.fft_demod.fft(self.out_re[idx] + 1j * self.out_im[idx])
+
+    def _detect_SSS(self, SSS, N_id_2, N_id_1_last):
+        """SSS_detector, only the first SSS_LEN - 1 carriers are compared"""
+        acc = self.sss_detector.correlate(SSS.real >= 0, SSS.imag >= 0, N_id_2)
+        # acc_max starts at 0 and only a larger value updates the result
+        return int(np.argmax(acc)) if acc.max() > 0 else N_id_1_last
+
+    def _PBCH_DMRS(self, N_id):
+        """bits of the PBCH DMRS for all ibar_SSB as array [ibar_SSB, pilot, bit]"""
+        return pbch_sequences.dmrs_bits(N_id).astype(np.int64)
+
+    def _atan2(self, data):
+        return self.chest_atan2.calc(data.imag.astype(np.int64), data.real.astype(np.int64))
+
+    def _demodulate(self):
+        OUT_OP_DW = self.FFT_OUT_DW // 2
+        windows = [(run, t, sym) for run in self.runs for t, sym in self._fft_windows(run)]
+        if windows:
+            carriers, blk_exps = self._fft([t for _, t, _ in windows])
+        else:
+            carriers, blk_exps = np.zeros((0, self.FFT_LEN), 'complex'), np.zeros(0, np.int64)
+
+        result = {'peak_pos': np.array(self.peaks, np.int64), 'N_id_2': np.array(self.N_id_2s, np.int64),
+            'CFO_DDS_inc': np.array(self.CFO_DDS_incs, np.int64)}
+        N_ids, N_id_1s, SSS, PBCH, ibars, rgs = [], [], [], [], [], []
+        cest, cest_blk_exp, cest_type, llr = [], [], [], []
+        DMRS_angles = np.array([511, -511, 1533, -1533])   # DEG45, -DEG45, DEG135, -DEG135
+        run = None
+        for k, (window_run, t, sym_idx) in enumerate(windows):
+            if window_run is not run:
+                # reset_fft_no resets FFT_demod and everything behind it
+                run = window_run
+                SSS_busy_until = -1
+                N_id_1_last = 0
+                N_id_events = []
+                DMRS = None
+                DMRS_ready_at = None
+                DMRS_corr_rot = np.zeros(8, np.int64)
+                remaining_syms = 0
+                ibar_burst = 0
+                burst_pilot_cnt = 0
+                angles = []
+                data = []
+                data_user = []
+                num_out = 0
+            _, _, sym, subframe, sfn, _ = run['symbols'][sym_idx]
+            # FFT_demod and BWP_extractor delay every symbol by the same time, only differences of out_clk are used
+            out_clk = t + self.FFT_LEN
+            symbol = carriers[k]
+            blk_exp = int(blk_exps[k])
+
+            bwp = symbol[self.SC_START:][:self.SYMBOL_LEN]
+            words = (bwp.real.astype(np.int64) & (2 ** OUT_OP_DW - 1)) + ((bwp.imag.astype(np.int64) & (2 ** OUT_OP_DW - 1)) << OUT_OP_DW)
+            timestamp = self.timestamps[len(rgs)] if len(rgs) < len(self.timestamps) else 0
+            rgs.append(np.concatenate(([blk_exp], [(timestamp >> (self.FFT_OUT_DW * i)) & (2 ** self.FFT_OUT_DW - 1)
+                for i in range(self.NUM_TIMESTAMP_SAMPLES)], words)))
+
+            if sym == 4 and subframe == 0:
+                sss = symbol[self.SSS_START:][:self.SSS_LEN]
+                SSS.append(sss)
+                events = [e for e in run['events'] if e[0] < t]
+                if out_clk >= SSS_busy_until and events:
+                    N_id_2 = events[-1][1]
+                    N_id_1_last = self._detect_SSS(sss, N_id_2, N_id_1_last)
+                    SSS_busy_until = out_clk + self.SSS_DETECT_SAMPLES
+                    N_ids.append(3 * N_id_1_last + N_id_2)
+                    N_id_1s.append(N_id_1_last)
+                    N_id_events.append((SSS_busy_until, 3 * N_id_1_last + N_id_2))
+                    if DMRS is None:
+                        # the PBCH DMRS is only calculated for the first N_id after reset
+                        DMRS = self._PBCH_DMRS(3 * N_id_1_last + N_id_2)
+                        DMRS_ready_at = SSS_busy_until + self.DMRS_SAMPLES
+
+            if not (sym in [3, 4, 5] and subframe == 0):
+                continue
+            pbch = symbol[self.PBCH_START:][:self.PBCH_LEN]
+            PBCH.append(pbch)
+            known = [N_id for clk, N_id in N_id_events if clk <= out_clk]
+            start_idx = known[-1] % 4 if known else 0
+            DMRS_ready = DMRS_ready_at is not None and out_clk >= DMRS_ready_at
+            re_MSB = (pbch.real < 0).astype(np.int64)
+            im_MSB = (pbch.imag < 0).astype(np.int64)
+            if DMRS_ready:
+                # ibar_SSB detection compares the pilots of every PBCH symbol with the start of all PBCH DMRS
+                used = np.arange(self.PBCH_LEN - 1)
+                pilots = used[((used - start_idx) & 3) == 0]
+                ref = DMRS[:, :len(pilots), :]
+                match = lambda bit1, bit0: (np.where(ref[:, :, 0] == bit1[pilots], 1, -1)
+                                            + np.where(ref[:, :, 1] == bit0[pilots], 1, -1)).sum(axis = 1)
+                DMRS_corr = _twos_comp_array(match(re_MSB, im_MSB), 9)
+                # DMRS_corr_rot is never reset inside channel_estimator.sv
+                DMRS_corr_rot = _twos_comp_array(DMRS_corr_rot + match(1 - im_MSB, re_MSB), 9)
+                corr = np.maximum(np.abs(DMRS_corr) & 0xFF, np.abs(DMRS_corr_rot) & 0xFF)
+                ibar_SSB = int(np.argmax(corr)) if corr.max() > 0 else 0
+                ibars.append(ibar_SSB)
+
+            if remaining_syms > 0:
+                remaining_syms -= 1
+                calc = True
+            elif DMRS_ready:
+                ibar_burst = ibar_SSB
+                remaining_syms = 2
+                calc = True
+            else:
+                calc = False
+            # channel_estimator corrector: pilots produce correction angles, data carriers are buffered
+            SC = np.arange(self.PBCH_LEN)
+            is_pilot = ((SC - start_idx) & 3) == 0
+            if calc and remaining_syms == 1:
+                use_pilot = is_pilot & ~((SC >= 47) & (SC <= 191))
+                use_data = ~is_pilot & ~((SC >= 48) & (SC <= 191))
+            else:
+                use_pilot = is_pilot
+                use_data = ~is_pilot
+            num_pilots = int(use_pilot.sum())
+            if calc:
+                first = burst_pilot_cnt if remaining_syms < 2 else 0
+                burst_pilot_cnt = first + num_pilots
+                pilot_angle = DMRS_angles[DMRS[ibar_burst][first:][:num_pilots] @ np.array([2, 1])]
+                rx_angle = self._atan2(pbch[use_pilot])
+                angles.extend(_twos_comp_array(-(rx_angle - pilot_angle), self.CHEST_PHASE_DW))
+            else:
+                angles.extend([0] * num_pilots)
+            data.extend(pbch[use_data])
+            data_user.extend([(blk_exp, 1 if calc else 0)] * int(use_data.sum()))
+            # every correction angle is used for 3 consecutive data carriers
+            num_ready = min(len(data), 3 * len(angles))
+            if num_ready > num_out:
+                d = np.array(data[num_out:num_ready])
+                dds_im, dds_re = self.chest_dds.lookup(np.array(angles)[np.arange(num_out, num_ready) // 3])
+                out_re, out_im = self.chest_mult.multiply(dds_re, dds_im, d.real.astype(np.int64), d.imag.astype(np.int64))
+                out = out_re + 1j * out_im
+                user = np.array(data_user[num_out:num_ready])
+                cest.append(out)
+                cest_blk_exp.append(user[:, 0])
+                cest_type.append(user[:, 1])
+                num_out = num_ready
+                # demap: LLRs are the LLR_DW MSBs of I and Q, only for PBCH symbols
+                pbch_out = out[user[:, 1] == 1]
+                if self.LLR_DW <= OUT_OP_DW:
+                    llr_I = pbch_out.real.astype(np.int64) >> (OUT_OP_DW - self.LLR_DW)
+                    llr_Q = pbch_out.imag.astype(np.int64) >> (OUT_OP_DW - self.LLR_DW)
+                else:
+                    llr_I = pbch_out.real.astype(np.int64) << (self.LLR_DW - OUT_OP_DW)
+                    llr_Q = pbch_out.imag.astype(np.int64) << (self.LLR_DW - OUT_OP_DW)
+                llr.append(np.stack((llr_I, llr_Q), axis = 1).reshape(-1))
+
+        concat = lambda arrays, dtype: np.concatenate(arrays).astype(dtype) if arrays else np.zeros(0, dtype)
+        result['N_id'] = np.array(N_ids, np.int64)
+        result['N_id_1'] = np.array(N_id_1s, np.int64)
+        result['SSS'] = concat(SSS, 'complex')
+        result['PBCH'] = concat(PBCH, 'complex')
+        result['ibar_SSB'] = np.array(ibars, np.int64)
+        result['cest'] = concat(cest, 'complex')
+        result['cest_blk_exp'] = concat(cest_blk_exp, np.int64)
+        result['cest_type'] = concat(cest_type, np.int64)
+        result['llr'] = concat(llr, np.int64)
+        result['rgs'] = np.array(rgs, np.int64).reshape(-1, self.SYMBOL_LEN + self.NUM_TIMESTAMP_SAMPLES + 1)
+        return result
@@ -1,12 +1,12 @@
 import numpy as np
 import os
+import importlib.util
 import pytest
 import logging
 import matplotlib.pyplot as plt
 import os
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 
@@ -15,6 +15,12 @@ CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('CFO_calc_model', os.path.join(tests_dir, '../model/CFO_calc.py'))
+CFO_calc_model = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(CFO_calc_model)
 
 def _twos_comp(val, bits):
     """compute the 2's complement of int value val"""
@@ -22,12 +28,23 @@ def _twos_comp(val, bits):
         val = val - (1 << bits)
     return int(val)
 
+def _pack(C, C_DW):
+    """C0_i / C1_i words of complex values with magnitude <= 1, imaginary part is in the upper half"""
+    MAX_VAL = int(2 ** (C_DW // 2 - 1) - 1)
+    MASK = int(2 ** (C_DW // 2) - 1)
+    C = np.asarray(C, complex)
+    re = np.trunc(C.real * MAX_VAL).astype(np.int64) & MASK
+    im = np.trunc(C.imag * MAX_VAL).astype(np.int64) & MASK
+    return (im << (C_DW // 2)) + re
+
 class TB(object):
     def __init__(self, dut):
         self.dut = dut
         self.C_DW = int(dut.C_DW.value)
         self.CFO_DW = int(dut.CFO_DW.value)
         self.DDS_DW = int(dut.DDS_DW.value)
+        self.ATAN_IN_DW = int(dut.ATAN_IN_DW.value)
+        self.model = CFO_calc_model.Model(self.C_DW, self.CFO_DW, self.DDS_DW, self.ATAN_IN_DW)
 
         self.log = logging.getLogger('cocotb.tb')
         self.log.setLevel(logging.DEBUG)
@@ -51,14 +68,17 @@ async def simple_test(dut):
     angle = int(os.environ['ANGLE'])
     C0 = 1
     C1 = C0 * np.exp(1j * angle / 180 * np.pi)
-    MAX_VAL = int(2 ** (tb.C_DW // 2 - 1) - 1)
-    dut.C0_i.value = ((int(C0.imag*MAX_VAL) & int(2**(tb.C_DW//2)-1)) << (tb.C_DW//2)) + (int(C0.real*MAX_VAL) & int(2**(tb.C_DW//2)-1))
-    dut.C1_i.value = ((int(C1.imag*MAX_VAL) & int(2**(tb.C_DW//2)-1)) << (tb.C_DW//2)) + (int(C1.real*MAX_VAL) & int(2**(tb.C_DW//2)-1))
+    C0_word = int(_pack(C0, tb.C_DW))
+    C1_word = int(_pack(C1, tb.C_DW))
+    dut.C0_i.value = C0_word
+    dut.C1_i.value = C1_word
     dut.valid_i.value = 1
+    expected_angle, expected_DDS_inc = tb.model.calc([C0_word], [C1_word])
 
     await RisingEdge(dut.clk_i)
     dut.valid_i.value = 0
     received_angle = 0
+    received_valid = False
 
     clk_cnt = 0
     max_clk_cnt = 1000
@@ -66,19 +86,27 @@ async def simple_test(dut):
         await RisingEdge(dut.clk_i)
         clk_cnt += 1
         if (dut.valid_o.value == 1):
-            received_angle = _twos_comp(dut.CFO_angle_o.value.integer, tb.CFO_DW) / (2**(tb.CFO_DW-1) - 1) * 180
+            CFO_angle = _twos_comp(int(dut.CFO_angle_o.value), tb.CFO_DW)
+            received_angle = CFO_angle / (2**(tb.CFO_DW-1) - 1) * 180
             print(f'received CFO {received_angle} deg')
             print(f'expected CFO {angle} deg')
-            DDS_inc = _twos_comp(dut.CFO_DDS_inc_o.value.integer, tb.DDS_DW)
+            DDS_inc = _twos_comp(int(dut.CFO_DDS_inc_o.value), tb.DDS_DW)
             print(f'received DDS inc {DDS_inc}')
+            received_valid = True
             break
 
+    assert received_valid
     assert np.abs(received_angle + angle) < 1
+    assert CFO_angle == expected_angle[0]
+    assert DDS_inc == expected_DDS_inc[0]
+    # valid_i was sampled by the edge before the loop, valid_o is read one edge after the edge that sets it
+    assert clk_cnt == tb.model.latency([C0_word], [C1_word])[0] + 1
 
 @pytest.mark.parametrize("C_DW", [30, 32])
 @pytest.mark.parametrize("CFO_DW", [20, 32])
 @pytest.mark.parametrize("DDS_DW", [20])
-@pytest.mark.parametrize("ANGLE", [20, 60, 100, 150, 170, -20, -60, -100, -150, -170])
+# with CFO_DW = 32 the angles -45 and 135 use the last atan lut entry, which wrapped around before it was clamped
+@pytest.mark.parametrize("ANGLE", [20, 45, 60, 100, 135, 150, 170, -20, -45, -60, -100, -135, -150, -170])
 def test(C_DW, CFO_DW, DDS_DW, ANGLE):
     dut = 'CFO_calc'
     module = os.path.splitext(os.path.basename(__file__))[0]
@@ -104,7 +132,7 @@ def test(C_DW, CFO_DW, DDS_DW, ANGLE):
     parameters_dir['ANGLE'] = ANGLE
     
     sim_build='sim_build/_CFO_calc_' + '_'.join(('{}={}'.format(*i) for i in parameters_dir.items()))
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -113,9 +141,26 @@ def test(C_DW, CFO_DW, DDS_DW, ANGLE):
         parameters=parameters,
         sim_build=sim_build,
         testcase='simple_test',
-        force_compile=True,
         waves=True
     )
 
+@pytest.mark.parametrize("C_DW", [30, 32])
+@pytest.mark.parametrize("CFO_DW", [20, 32])
+@pytest.mark.parametrize("DDS_DW", [20, 24])
+@pytest.mark.parametrize("ATAN_IN_DW", [8, 16])
+def test_model(C_DW, CFO_DW, DDS_DW, ATAN_IN_DW):
+    # the HDL is only simulated at the angles of test(), the model that it has to match is checked for all angles
+    model = CFO_calc_model.Model(C_DW, CFO_DW, DDS_DW, ATAN_IN_DW)
+    angles = np.arange(-18000, 18000) / 100
+    # with 8 bit atan2 inputs the quantization of the product limits the accuracy to a few degrees
+    tolerance = 1 if ATAN_IN_DW >= 16 else 5
+    for magnitude in [1, 0.1]:
+        C0 = magnitude * np.exp(1j * np.arange(len(angles)))
+        C1 = C0 * np.exp(1j * angles / 180 * np.pi)
+        CFO_angle, DDS_inc = model.calc(_pack(C0, C_DW), _pack(C1, C_DW))
+        received_angle = CFO_angle / (2**(CFO_DW-1) - 1) * 180
+        assert np.max(np.abs((received_angle + angles + 180) % 360 - 180)) < tolerance
+        assert np.all(DDS_inc == (CFO_angle >> 7) >> max(CFO_DW - DDS_DW, 0))
+
 if __name__ == '__main__':
     test(C_DW = 30, CFO_DW = 32, DDS_DW = 20, ANGLE=80)
@@ -3,23 +3,33 @@ import scipy
 import os
 import pytest
 import logging
-import importlib
+import importlib.util
 import matplotlib.pyplot as plt
 import os
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import Timer
 from cocotb.triggers import RisingEdge
 
 import py3gpp
-import sigmf
 
 CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sigmf_reader', os.path.join(tests_dir, '../tools/sigmf_reader.py'))
+sigmf_reader = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sigmf_reader)
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('iq_codec', os.path.join(tests_dir, '../tools/iq_codec.py'))
+iq_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(iq_codec)
+spec = importlib.util.spec_from_file_location('generate_PSS_tap_file', os.path.join(tests_dir, '../tools/generate_PSS_tap_file.py'))
+generate_PSS_tap_file = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(generate_PSS_tap_file)
 
 def _twos_comp(val, bits):
     """compute the 2's complement of int value val"""
@@ -39,6 +49,8 @@ class TB(object):
         self.MULT_REUSE = int(dut.MULT_REUSE.value)
         self.CIC_OUT_DW = int(dut.CIC_OUT_DW.value)
         self.DDS_PHASE_DW = int(dut.DDS_PHASE_DW.value)
+        self.DDS_OUT_DW = int(dut.DDS_OUT_DW.value)
+        self.COMPL_MULT_OUT_DW = int(dut.COMPL_MULT_OUT_DW.value)
 
         self.log = logging.getLogger('cocotb.tb')
         self.log.setLevel(logging.DEBUG)
@@ -50,6 +62,16 @@ class TB(object):
         spec.loader.exec_module(foo)
         self.model = foo.Model(self.IN_DW, self.OUT_DW, self.TAP_DW, self.PSS_LEN, self.PSS_LOCAL, self.ALGO)
 
+        spec = importlib.util.spec_from_file_location('CFO_correction', os.path.join(tests_dir, '../model/CFO_correction.py'))
+        CFO_correction = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(CFO_correction)
+        self.cfo_model = CFO_correction.Model(self.IN_DW, self.DDS_PHASE_DW, self.DDS_OUT_DW, self.COMPL_MULT_OUT_DW,
+            LUT_FILE = os.path.join(tests_dir, 'sine_lut_16_16.hex'))
+        spec = importlib.util.spec_from_file_location('cic_d', os.path.join(tests_dir, '../model/cic_d.py'))
+        cic_d = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(cic_d)
+        self.cic_models = [cic_d.Model(self.COMPL_MULT_OUT_DW // 2, self.CIC_OUT_DW // 2, 2, 3) for i in range(2)]
+
         cocotb.start_soon(Clock(self.dut.clk_i, CLK_PERIOD_NS, units='ns').start())
         cocotb.start_soon(self.model_clk(CLK_PERIOD_NS, 'ns'))
 
@@ -71,11 +93,14 @@ class TB(object):
         self.dut.reset_ni.value = 1
         await RisingEdge(self.dut.clk_i)
         self.model.reset()
+        self.cfo_model.reset()
+        for cic_model in self.cic_models:
+            cic_model.reset()
 
 @cocotb.test()
 async def simple_test(dut):
     tb = TB(dut)
-    handle = sigmf.sigmffile.fromfile('../../tests/30720KSPS_dl_signal.sigmf-data')
+    handle = sigmf_reader.SigMFReader('../../tests/30720KSPS_dl_signal.sigmf-data')
     waveform = handle.read_samples()
     fs = 30720000
     CFO = int(os.getenv('CFO'))
@@ -110,6 +135,8 @@ async def simple_test(dut):
     C0 = []
     C1 = []
     C_DW = int(tb.CIC_OUT_DW + tb.TAP_DW + 2 + 2*np.ceil(np.log2(tb.PSS_LEN)))
+    received_cic = []
+    tdata = iq_codec.encode(waveform, tb.IN_DW)
     while rx_counter < num_items:
         await RisingEdge(dut.clk_i)
         if clk_div < (decimation_factor - 1):
@@ -117,13 +144,15 @@ async def simple_test(dut):
             clk_div += 1
         else:
             clk_div = 0
-            data = (((int(waveform[in_counter].imag)  & (2 ** (tb.IN_DW // 2) - 1)) << (tb.IN_DW // 2)) \
-                  + ((int(waveform[in_counter].real)) & (2 ** (tb.IN_DW // 2) - 1))) & (2 ** tb.IN_DW - 1)
+            data = int(tdata[in_counter])
             dut.s_axis_in_tdata.value = data
             dut.s_axis_in_tvalid.value = 1
             tb.model.set_data(data)
             in_counter += 1
 
+        if int(dut.m_axis_cic_debug_tvalid.value) == 1:
+            received_cic.append(int(dut.m_axis_cic_debug_tdata.value))
+
         if dut.m_axis_correlator_debug_tvalid.value.integer == 1:
             received[rx_counter] = dut.m_axis_correlator_debug_tdata.value.integer
             C0.append(_twos_comp(dut.C0.value.integer & (2 ** (C_DW // 2) - 1),C_DW // 2) \
@@ -132,6 +161,26 @@ async def simple_test(dut):
                     + 1j * _twos_comp((dut.C1.value.integer >> (C_DW // 2)) & (2 ** (C_DW // 2) - 1), C_DW // 2))
             rx_counter  += 1
 
+    # DDS, complex_multiplier and CIC have to match the models sample for sample from the first CIC output on.
+    # The input samples are decimation_factor clocks apart and DDS_phase only advances with them, so sample k
+    # is multiplied with the dds output of phase k * CFO_norm_in as long as the dds latency is below decimation_factor
+    # clocks. The dds and complex_multiplier latency only delays the CIC output, which is collected with its tvalid.
+    # DDS_phase_valid is 0 until the first input sample, so DDS_out_valid is still 0 when the first sample arrives.
+    # With BLOCKING = 0 complex_multiplier only calculates a product if s_axis_a_tvalid and s_axis_b_tvalid are set,
+    # that is why channel_estimator.sv ties s_axis_a_tvalid to 1. The first sample is dropped and the CIC gets
+    # the samples 1, 2, ... with the phases CFO_norm_in, 2 * CFO_norm_in, ...
+    OP_MASK = 2 ** (tb.COMPL_MULT_OUT_DW // 2) - 1
+    CIC_OP_DW = tb.CIC_OUT_DW // 2
+    tb.cfo_model.reset()
+    tb.cfo_model.set_inc(eff_CFO_corr_norm)
+    for cic_model in tb.cic_models:
+        cic_model.reset()
+    corrected = tb.cfo_model.process_words(tdata[:in_counter])[1:]
+    expected_cic = [tb.cic_models[i].process_block(corrected >> (i * tb.COMPL_MULT_OUT_DW // 2) & OP_MASK) & (2 ** CIC_OP_DW - 1) for i in range(2)]
+    expected_cic = expected_cic[0] + (expected_cic[1] << CIC_OP_DW)
+    assert 0 < len(received_cic) <= len(expected_cic)
+    assert np.array_equal(np.array(received_cic, np.int64), expected_cic[:len(received_cic)])
+
     PSS_LEN = 128
     ssb_start = np.argmax(received) - PSS_LEN
     received = np.array(received)[PSS_LEN:]
@@ -156,8 +205,12 @@ async def simple_test(dut):
     PSS[FFT_LEN//2-64:][:127] = py3gpp.nrPSS(2)
     taps = np.fft.ifft(np.fft.fftshift(PSS))
     ssb_start_model = 568
-    C0 = np.vdot(waveform[ssb_start_model:][:64], taps[:64])
-    C1 = np.vdot(waveform[ssb_start_model+64:][:64], taps[64:][:64])
+    # apply the CFO correction of the hdl with the bit accurate model
+    tb.cfo_model.reset()
+    tb.cfo_model.set_inc(eff_CFO_corr_norm)
+    corrected_waveform = iq_codec.decode(tb.cfo_model.process_words(tdata[:ssb_start_model + 128]), tb.COMPL_MULT_OUT_DW)
+    C0 = np.vdot(corrected_waveform[ssb_start_model:][:64], taps[:64])
+    C1 = np.vdot(corrected_waveform[ssb_start_model+64:][:64], taps[64:][:64])
     prod = C0 * np.conj(C1)
     # detectedCFO = np.arctan2(prod.imag, prod.real)
     detectedCFO = np.angle(prod)
@@ -167,14 +220,14 @@ async def simple_test(dut):
     if tb.ALGO == 0:
         if CFO != 0:
             if eff_CFO_corr_hz == 0:
-                assert (np.abs(detectedCFO_Hz - detectedCFO_Hz_model - eff_CFO_corr_hz))/np.abs(CFO) < 0.05
+                assert (np.abs(detectedCFO_Hz - detectedCFO_Hz_model))/np.abs(CFO) < 0.05
             else:
-                assert (np.abs(detectedCFO_Hz - detectedCFO_Hz_model - eff_CFO_corr_hz))/np.abs(CFO) < 0.08
+                assert (np.abs(detectedCFO_Hz - detectedCFO_Hz_model))/np.abs(CFO) < 0.08
         else:
             if eff_CFO_corr_hz == 0:
-                assert np.abs(detectedCFO_Hz - detectedCFO_Hz_model - eff_CFO_corr_hz) < 50
+                assert np.abs(detectedCFO_Hz - detectedCFO_Hz_model) < 50
             else:
-                assert np.abs(detectedCFO_Hz - detectedCFO_Hz_model - eff_CFO_corr_hz) < 60
+                assert np.abs(detectedCFO_Hz - detectedCFO_Hz_model) < 60
 
     assert ssb_start == 283
     assert len(received) == num_items - PSS_LEN
@@ -219,17 +272,7 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, CFO, MULT_REUSE, CFO_CORR, PSS_CORRELATOR_
     parameters['PSS_CORRELATOR_MR'] = PSS_CORRELATOR_MR
 
     # imaginary part is in upper 16 Bit
-    PSS = np.zeros(PSS_LEN, 'complex')
-    PSS[0:-1] = py3gpp.nrPSS(2)
-    taps = np.fft.ifft(np.fft.fftshift(PSS))
-    taps /= max(taps.real.max(), taps.imag.max())
-    taps *= 2 ** (TAP_DW // 2 - 1) - 1
-    # for i in range(10):
-    #     print(f'taps[{i}] = {taps[i]}')
-    parameters['PSS_LOCAL'] = 0
-    for i in range(len(taps)):
-        parameters['PSS_LOCAL'] += ((int(np.imag(taps[i])) & (2 ** (TAP_DW // 2) - 1)) << (TAP_DW * i + TAP_DW // 2)) \
-                                +  ((int(np.real(taps[i])) & (2 ** (TAP_DW // 2) - 1)) << (TAP_DW * i))
+    parameters['PSS_LOCAL'] = generate_PSS_tap_file.generate(PSS_LEN, TAP_DW, (2,))[1][0]
     extra_env = {f'PARAM_{k}': str(v) for k, v in parameters.items()}
     os.environ['CFO'] = str(CFO)
     os.environ['CFO_CORR'] = str(CFO_CORR)
@@ -240,7 +283,7 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, CFO, MULT_REUSE, CFO_CORR, PSS_CORRELATOR_
     parameters_dirname['CFO_CORR'] = CFO_CORR
     sim_build='sim_build/' + '_'.join(('{}={}'.format(*i) for i in parameters_dirname.items()))
     
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -251,10 +294,37 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, CFO, MULT_REUSE, CFO_CORR, PSS_CORRELATOR_
         sim_build=sim_build,
         extra_env=extra_env,
         testcase='simple_test',
-        compile_args = ['-DLUT_PATH=\"../../tests\"'],
-        force_compile=True
+        compile_args = ['-DLUT_PATH=\"../../tests\"']
     )
 
+@pytest.mark.parametrize("CFO_CORR", [1000, -1000, 6500, -5500])
+def test_model(CFO_CORR):
+    # residual error of the CFO correction over a long capture, a tone at -CFO_CORR is shifted to DC
+    DDS_PHASE_DW = 20
+    IN_DW = 32
+    fs = 3840000
+    spec = importlib.util.spec_from_file_location('CFO_correction', os.path.join(tests_dir, '../model/CFO_correction.py'))
+    CFO_correction = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(CFO_correction)
+    model = CFO_correction.Model(IN_DW, DDS_PHASE_DW, LUT_FILE = os.path.join(tests_dir, 'sine_lut_16_16.hex'))
+    DDS_inc = int(np.round(CFO_CORR / fs * 2 ** DDS_PHASE_DW))
+    model.set_inc(DDS_inc)
+
+    NUM_SAMPLES = 2 ** 22
+    BLOCK_LEN = 2 ** 16
+    amplitude = 0.9 * (2 ** (IN_DW // 2 - 1) - 1)
+    max_phase_error = 0
+    for start in range(0, NUM_SAMPLES, BLOCK_LEN):
+        n = start + np.arange(BLOCK_LEN)
+        tone = amplitude * np.exp(-1j * 2 * np.pi * DDS_inc * n / 2 ** DDS_PHASE_DW)
+        re, im = model.process_block(np.round(tone.real).astype(np.int64), np.round(tone.imag).astype(np.int64))
+        max_phase_error = max(max_phase_error, np.max(np.abs(np.angle(re + 1j * im))))
+        # the dds amplitude is 2 ** 15 - 1, GROWTH_BITS = -2 keeps the amplitude of the input
+        assert np.all(np.abs(np.abs(re + 1j * im) - amplitude) < 4)
+    print(f'max phase error {max_phase_error} rad')
+    # the dds table is accurate to about 1.3 LSBs of 2 ** 15
+    assert max_phase_error < 2 ** -12
+
 if __name__ == '__main__':
     # os.environ['PLOTS'] = "1"
     # this setup does not require output truncation
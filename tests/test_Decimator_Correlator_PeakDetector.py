@@ -3,22 +3,29 @@ import scipy
 import os
 import pytest
 import logging
-import importlib
+import importlib.util
 import matplotlib.pyplot as plt
 import os
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 
 import py3gpp
-import sigmf
 
 CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sigmf_reader', os.path.join(tests_dir, '../tools/sigmf_reader.py'))
+sigmf_reader = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sigmf_reader)
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('iq_codec', os.path.join(tests_dir, '../tools/iq_codec.py'))
+iq_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(iq_codec)
 
 def _twos_comp(val, bits):
     """compute the 2's complement of int value val"""
@@ -42,6 +49,10 @@ class TB(object):
 
         tests_dir = os.path.abspath(os.path.dirname(__file__))
         model_file = os.path.abspath(os.path.join(tests_dir, '../model/PSS_correlator.py'))
+        spec = importlib.util.spec_from_file_location('cic_d', os.path.join(tests_dir, '../model/cic_d.py'))
+        cic_d = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(cic_d)
+        self.cic_models = [cic_d.Model(self.IN_DW // 2, self.IN_DW // 2, 2, 3) for i in range(2)]
 
         cocotb.start_soon(Clock(self.dut.clk_i, CLK_PERIOD_NS, units='ns').start())
 
@@ -60,7 +71,7 @@ class TB(object):
 @cocotb.test()
 async def simple_test(dut):
     tb = TB(dut)
-    handle = sigmf.sigmffile.fromfile('../../tests/30720KSPS_dl_signal.sigmf-data')
+    handle = sigmf_reader.SigMFReader('../../tests/30720KSPS_dl_signal.sigmf-data')
     waveform = handle.read_samples()
     waveform /= max(waveform.real.max(), waveform.imag.max())
     waveform = scipy.signal.decimate(waveform, 16//2, ftype='fir')
@@ -76,10 +87,11 @@ async def simple_test(dut):
     received = np.empty(num_items, int)
     received_correlator = []
     received_data = []
+    received_cic = []
+    tdata = iq_codec.encode(waveform, tb.IN_DW)
     while rx_counter < num_items:
         await RisingEdge(dut.clk_i)
-        data = (((int(waveform[in_counter].imag)  & ((2 ** (tb.IN_DW // 2)) - 1)) << (tb.IN_DW // 2)) \
-              + ((int(waveform[in_counter].real)) & ((2 ** (tb.IN_DW // 2)) - 1))) & ((2 ** tb.IN_DW) - 1)
+        data = int(tdata[in_counter])
         dut.s_axis_in_tdata.value = data
         dut.s_axis_in_tvalid.value = 1
         in_counter += 1
@@ -90,12 +102,25 @@ async def simple_test(dut):
             received_correlator.append(dut.m_axis_correlator_debug_tdata.value.integer)
 
         if dut.m_axis_cic_debug_tvalid.value.binstr == '1':
+            received_cic.append(dut.m_axis_cic_debug_tdata.value.integer)
             received_data.append(1j*_twos_comp(dut.m_axis_cic_debug_tdata.value.integer & (2**(tb.OUT_DW//2) - 1), tb.OUT_DW//2)
                 + _twos_comp((dut.m_axis_cic_debug_tdata.value.integer>>(tb.OUT_DW//2)) & (2**(tb.OUT_DW//2) - 1), tb.OUT_DW//2))
 
         received[rx_counter] = dut.peak_detected_o.value.integer
         rx_counter += 1
 
+    # cic_real and cic_imag get a valid sample in every clock cycle, so the model gets the same samples
+    # and its output has to match m_axis_cic_debug_tdata sample for sample from the first output on.
+    # This also checks the model assumptions, full width registers without pruning and the decimation phase after reset
+    OP_DW = tb.IN_DW // 2
+    parts = [(tdata[:in_counter] >> (i * OP_DW)) & (2 ** OP_DW - 1) for i in range(2)]
+    expected_cic = [tb.cic_models[i].process_block(parts[i] - ((parts[i] >> (OP_DW - 1)) << OP_DW)) & (2 ** OP_DW - 1)
+        for i in range(2)]
+    expected_cic = expected_cic[0] + (expected_cic[1] << OP_DW)
+    print(f'comparing {len(received_cic)} CIC output samples with the model')
+    assert 0 < len(received_cic) <= len(expected_cic)
+    assert np.array_equal(np.array(received_cic, np.int64), expected_cic[:len(received_cic)])
+
     peak_pos = np.argmax(received)
     if 'PLOTS' in os.environ and os.environ['PLOTS'] == '1':
         _, (ax1, ax2) = plt.subplots(2,1)
@@ -150,14 +175,9 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, WINDOW_LEN):
     # parameters['TAP_FILE'] = f'\"../../{sim_build}/PSS_taps_{N_id_2}.hex\"'
     os.environ['TAP_FILE'] = f'{rtl_dir}/../{sim_build}/PSS_taps_{N_id_2}.hex'
 
-    os.makedirs(sim_build, exist_ok=True)
-    file_path = os.path.abspath(os.path.join(tests_dir, '../tools/generate_PSS_tap_file.py'))
-    spec = importlib.util.spec_from_file_location("generate_PSS_tap_file", file_path)
-    generate_PSS_tap_file = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(generate_PSS_tap_file)
-    generate_PSS_tap_file.main(['--PSS_LEN', str(PSS_LEN),'--TAP_DW', str(TAP_DW), '--N_id_2', str(N_id_2), '--path', sim_build])
+    generate_PSS_tap_file.link_tap_files(PSS_LEN, TAP_DW, sim_build, (N_id_2,))
 
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -166,8 +186,7 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, WINDOW_LEN):
         parameters=parameters,
         sim_build=sim_build,
         extra_env=extra_env,
-        testcase='simple_test',
-        force_compile=True
+        testcase='simple_test'
     )
 
 if __name__ == '__main__':
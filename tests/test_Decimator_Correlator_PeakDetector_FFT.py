@@ -8,17 +8,26 @@ import os
 import importlib.util
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 
-import py3gpp
-import sigmf
 
 CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sigmf_reader', os.path.join(tests_dir, '../tools/sigmf_reader.py'))
+sigmf_reader = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sigmf_reader)
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('iq_codec', os.path.join(tests_dir, '../tools/iq_codec.py'))
+iq_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(iq_codec)
+spec = importlib.util.spec_from_file_location('sss_codebook', os.path.join(tests_dir, '../tools/sss_codebook.py'))
+sss_codebook = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sss_codebook)
 
 def _twos_comp(val, bits):
     """compute the 2's complement of int value val"""
@@ -51,6 +60,12 @@ class TB(object):
         self.HALF_CP_ADVANCE = int(dut.HALF_CP_ADVANCE.value)
         self.NFFT = int(dut.NFFT.value)
         self.MULT_REUSE = int(dut.MULT_REUSE.value)
+        self.FFT_OUT_DW = 32
+
+        spec = importlib.util.spec_from_file_location('FFT_demod', os.path.join(tests_dir, '../model/FFT_demod.py'))
+        FFT_demod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(FFT_demod)
+        self.fft_demod_model = FFT_demod.Model(self.IN_DW, self.FFT_OUT_DW, self.NFFT, self.HALF_CP_ADVANCE)
 
         self.log = logging.getLogger('cocotb.tb')
         self.log.setLevel(logging.DEBUG)
@@ -66,20 +81,13 @@ class TB(object):
         self.dut.reset_ni.value = 1
         await RisingEdge(self.dut.clk_i)
 
-    def fft_dbs(self, fft_signal, width):
-        max_im = np.abs(fft_signal.imag).max()
-        max_re = np.abs(fft_signal.real).max()
-        max_abs_val = max(max_im, max_re)
-        shift_factor = width - np.ceil(np.log2(max_abs_val)) - 1
-        return fft_signal * (2 ** shift_factor)
-
 @cocotb.test()
 async def simple_test(dut):
     tb = TB(dut)
     FILE = '../../tests/' + os.environ['TEST_FILE'] + '.sigmf-data'
-    handle = sigmf.sigmffile.fromfile(FILE)
+    handle = sigmf_reader.SigMFReader(FILE)
     waveform = handle.read_samples()
-    fs = handle.get_global_field(sigmf.SigMFFile.SAMPLE_RATE_KEY)
+    fs = handle.sample_rate
 
     if os.environ['TEST_FILE'] == '30720KSPS_dl_signal':
         expected_N_id_1 = 69
@@ -130,21 +138,16 @@ async def simple_test(dut):
     rx_counter = 0
     clk_cnt = 0
     received = []
-    rx_ADC_data = []
     received_PBCH = []
     received_SSS = []
 
     NFFT = tb.NFFT
     FFT_LEN = 2 ** NFFT
     MAX_CLK_CNT = 3000 * FFT_LEN // 256
-    CP_LEN = 18 * FFT_LEN // 256
-    HALF_CP_ADVANCE = tb.HALF_CP_ADVANCE
-    FFT_OUT_DW = 32
+    FFT_OUT_DW = tb.FFT_OUT_DW
 
     SSS_LEN = 127
-    SSS_START = FFT_LEN // 2 - (SSS_LEN + 1) // 2
     PBCH_SYMBOL_LEN = 240
-    PBCH_START = FFT_LEN // 2 - (PBCH_SYMBOL_LEN + 1) // 2
     PSS_IDLE_CLKS = int(fs // 1920000)
     print(f'FREE_CYCLES = {PSS_IDLE_CLKS}')
     EXTRA_IDLE_CLKS = 0 if PSS_IDLE_CLKS >= tb.MULT_REUSE else tb.MULT_REUSE // PSS_IDLE_CLKS - 1 # insert additional valid 0 cycles if needed
@@ -159,11 +162,12 @@ async def simple_test(dut):
     tx_cnt = 0
     sample_cnt = 0
     rx_syms = []
+    rx_syms_blk_exp = []
+    tdata = iq_codec.encode(waveform, tb.IN_DW)
     while (((len(received_SSS) < SSS_LEN) or (len(rx_syms) < expected_rx_syms)) and (clk_cnt < MAX_CLK_CNT)):
         await RisingEdge(dut.clk_i)
         if (clk_div == 0 or EXTRA_IDLE_CLKS == 0):
-            data = (((int(waveform[tx_cnt].imag)  & ((2 ** (tb.IN_DW // 2)) - 1)) << (tb.IN_DW // 2)) \
-                + ((int(waveform[tx_cnt].real)) & ((2 ** (tb.IN_DW // 2)) - 1))) & ((2 ** tb.IN_DW) - 1)
+            data = int(tdata[tx_cnt])
             dut.s_axis_in_tdata.value = data
             dut.s_axis_in_tvalid.value = 1
             clk_div += 1
@@ -190,35 +194,29 @@ async def simple_test(dut):
         if dut.PBCH_valid_o.value.integer == 1:
             # print(f"rx PBCH[{len(received_PBCH):3d}] re = {dut.m_axis_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1):4x} " \
             #     "im = {(dut.m_axis_out_tdata.value.integer>>(FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1):4x}")
-            received_PBCH.append(_twos_comp(dut.m_axis_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2)
-                + 1j * _twos_comp((dut.m_axis_out_tdata.value.integer>>(FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2))
+            received_PBCH.append(dut.m_axis_out_tdata.value.integer)
 
         if dut.SSS_valid_o.value.integer == 1:
             # print(f"rx SSS[{len(received_SSS):3d}]")
-            sym = _twos_comp(dut.m_axis_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2) \
-                + 1j * _twos_comp((dut.m_axis_out_tdata.value.integer>>(FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2)
-            received_SSS.append(sym)
+            received_SSS.append(dut.m_axis_out_tdata.value.integer)
 
         if dut.m_axis_out_tvalid.value.integer == 1:
             blk_exp_len = 8
-            blk_exp = (dut.m_axis_out_tuser.value.integer >> 1) & (2 ** blk_exp_len - 1)
-            sym = (_twos_comp(dut.m_axis_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2) \
-                + 1j * _twos_comp((dut.m_axis_out_tdata.value.integer>>(FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2)) / (2 ** blk_exp)
-            rx_syms.append(sym)
+            rx_syms_blk_exp.append((dut.m_axis_out_tuser.value.integer >> 1) & (2 ** blk_exp_len - 1))
+            rx_syms.append(dut.m_axis_out_tdata.value.integer)
 
     
     assert clk_cnt < MAX_CLK_CNT, "timeout, did not receive enough data"
+    received_PBCH = list(iq_codec.decode(received_PBCH, FFT_OUT_DW))
+    received_SSS = list(iq_codec.decode(received_SSS, FFT_OUT_DW))
+    rx_syms = list(iq_codec.decode(rx_syms, FFT_OUT_DW, rx_syms_blk_exp))
     assert len(received_SSS) == SSS_LEN
 
     print(f'first peak at = {peaks[0]}')
-    rx_ADC_data = waveform[peaks[0] + CP_LEN + FFT_LEN - 1:]
-    CP_ADVANCE = CP_LEN // 2 if HALF_CP_ADVANCE else CP_LEN
-    ideal_SSS_sym = np.fft.fftshift(np.fft.fft(rx_ADC_data[CP_LEN + FFT_LEN + CP_ADVANCE:][:FFT_LEN]))
-    scaling_factor = 2 ** (tb.IN_DW / 2 + NFFT - FFT_OUT_DW / 2) # FFT core is in truncation mode
-    ideal_SSS_sym = ideal_SSS_sym.real / scaling_factor + 1j * ideal_SSS_sym.imag / scaling_factor
-    ideal_SSS_sym = tb.fft_dbs(ideal_SSS_sym, FFT_OUT_DW / 2)
-    ideal_SSS_sym *= np.exp(1j * (2 * np.pi * (CP_LEN - CP_ADVANCE) / FFT_LEN * np.arange(FFT_LEN) + np.pi * (CP_LEN - CP_ADVANCE)))
-    ideal_SSS = ideal_SSS_sym[SSS_START:][:SSS_LEN]
+    # the PSS symbol (symbol 2) starts one sample before the peak, demodulate it and the PBCH and SSS symbols after it
+    demod = tb.fft_demod_model.process(waveform, peaks[0] - 1, first_symbol = 2, num_symbols = 4)
+    ideal_SSS_sym = demod['carriers'][demod['SSS_symbol']][0]
+    ideal_SSS = demod['SSS'][0]
 
     # phase compensation for SSS symbol
     received_SSS = phase_comp(received_SSS, f_c, NFFT, 4) # SSS is always at symbol number 4 within a slot assuming ssb_idx == 0
@@ -250,10 +248,7 @@ async def simple_test(dut):
         plt.show()
 
     #received_PBCH= received_PBCH[9:][:FFT_SIZE-8*2 - 1]
-    received_PBCH_ideal = np.fft.fftshift(np.fft.fft(rx_ADC_data[CP_ADVANCE:][:FFT_LEN]))
-    received_PBCH_ideal *= np.exp(1j * ( 2 * np.pi * (CP_LEN - CP_ADVANCE) / FFT_LEN * np.arange(FFT_LEN) + np.pi * (CP_LEN - CP_ADVANCE)))
-    received_PBCH_ideal = received_PBCH_ideal[PBCH_START:][:PBCH_SYMBOL_LEN]
-    received_PBCH_ideal = (received_PBCH_ideal.real.astype(int) + 1j * received_PBCH_ideal.imag.astype(int))
+    received_PBCH_ideal = demod['PBCH'][0]
     if 'PLOTS' in os.environ and os.environ['PLOTS'] == '1':
         _, axs = plt.subplots(2, 2, figsize=(10, 10))
         axs[0, 0].plot(np.real(received_SSS), np.imag(received_SSS), '.')
@@ -318,12 +313,8 @@ async def simple_test(dut):
         if NFFT == 8:
             assert peak_pos == 2113
 
-    corr = np.zeros(335)
-    for i in range(335):
-        sss = py3gpp.nrSSS(i*3 + expected_N_id_2)
-        corr[i] = np.abs(np.vdot(sss, ideal_SSS))
-
-    detected_N_id_1 = np.argmax(corr)
+    candidates, corr, margin = sss_codebook.detect(ideal_SSS, expected_N_id_2)
+    detected_N_id_1 = candidates[0]
     assert detected_N_id_1 == expected_N_id_1
 
 
@@ -414,25 +405,9 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, WINDOW_LEN, HALF_CP_ADVANCE, NFFT, USE_TAP
     os.environ['TEST_FILE'] = FILE
 
     if USE_TAP_FILE:
-        FFT_LEN = 2 ** NFFT
-        CP_LEN = int(18 * FFT_LEN / 256)
-        CP_ADVANCE = CP_LEN // 2
-        os.makedirs(sim_build, exist_ok=True)
-
-        file_path = os.path.abspath(os.path.join(tests_dir, '../tools/generate_FFT_demod_tap_file.py'))
-        spec = importlib.util.spec_from_file_location("generate_FFT_demod_tap_file", file_path)
-        generate_FFT_demod_tap_file = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(generate_FFT_demod_tap_file)
-        generate_FFT_demod_tap_file.main(['--NFFT', str(NFFT),'--CP_LEN', str(CP_LEN), '--CP_ADVANCE', str(CP_ADVANCE),
-                                            '--OUT_DW', str(OUT_DW), '--path', sim_build])
-
-    for N_id_2 in range(3):
-        os.makedirs(sim_build, exist_ok=True)
-        file_path = os.path.abspath(os.path.join(tests_dir, '../tools/generate_PSS_tap_file.py'))
-        spec = importlib.util.spec_from_file_location("generate_PSS_tap_file", file_path)
-        generate_PSS_tap_file = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(generate_PSS_tap_file)
-        generate_PSS_tap_file.main(['--PSS_LEN', str(PSS_LEN),'--TAP_DW', str(TAP_DW), '--N_id_2', str(N_id_2), '--path', sim_build])
+        generate_FFT_demod_tap_file.link_lut_files(NFFT, HALF_CP_ADVANCE, OUT_DW, sim_build)
+
+    generate_PSS_tap_file.link_tap_files(PSS_LEN, TAP_DW, sim_build)
 
     extra_env = {f'PARAM_{k}': str(v) for k, v in parameters.items()}
 
@@ -441,7 +416,7 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, WINDOW_LEN, HALF_CP_ADVANCE, NFFT, USE_TAP
         compile_args = ['--build-jobs', '16', '--no-timing', '-Wno-fatal', '-Wno-PINMISSING','-y', tests_dir + '/../submodules/verilator-unisims']
     else:
         compile_args = ['-sglbl', '-y' + unisim_dir]
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -451,7 +426,6 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, WINDOW_LEN, HALF_CP_ADVANCE, NFFT, USE_TAP
         sim_build=sim_build,
         extra_env=extra_env,
         testcase='simple_test',
-        force_compile=True,
         compile_args = compile_args,
         waves=True
     )
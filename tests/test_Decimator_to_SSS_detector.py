@@ -9,18 +9,33 @@ import os
 import importlib.util
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import Timer
 from cocotb.triggers import RisingEdge
 
-import py3gpp
-import sigmf
 
 CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sigmf_reader', os.path.join(tests_dir, '../tools/sigmf_reader.py'))
+sigmf_reader = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sigmf_reader)
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('iq_codec', os.path.join(tests_dir, '../tools/iq_codec.py'))
+iq_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(iq_codec)
+spec = importlib.util.spec_from_file_location('stream_decimator', os.path.join(tests_dir, '../tools/stream_decimator.py'))
+stream_decimator = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_decimator)
+spec = importlib.util.spec_from_file_location('stream_driver', os.path.join(tests_dir, '../tools/stream_driver.py'))
+stream_driver = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_driver)
+spec = importlib.util.spec_from_file_location('sss_codebook', os.path.join(tests_dir, '../tools/sss_codebook.py'))
+sss_codebook = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sss_codebook)
 
 def _twos_comp(val, bits):
     """compute the 2's complement of int value val"""
@@ -61,22 +76,14 @@ class TB(object):
         self.dut.reset_ni.value = 1
         await RisingEdge(self.dut.clk_i)
 
-    def fft_dbs(self, fft_signal):
-        max_im = np.abs(fft_signal.imag).max()
-        max_re = np.abs(fft_signal.real).max()
-        max_abs_val = max(max_im, max_re)
-        width = 8
-        shift_factor = width - np.ceil(np.log2(max_abs_val)) - 1
-        return fft_signal * (2 ** shift_factor)
-
 @cocotb.test()
 async def simple_test(dut):
     tb = TB(dut)
     FILE = '../../tests/' + os.environ['TEST_FILE'] + '.sigmf-data'
     CFO = int(os.getenv('CFO'))
-    handle = sigmf.sigmffile.fromfile(FILE)
+    handle = sigmf_reader.SigMFReader(FILE)
     waveform = handle.read_samples()
-    fs = handle.get_global_field(sigmf.SigMFFile.SAMPLE_RATE_KEY)
+    fs = handle.sample_rate
     NFFT = tb.NFFT
     FFT_LEN =  2 ** NFFT
 
@@ -128,15 +135,10 @@ async def simple_test(dut):
     FFT_OUT_DW = 32
     SSS_LEN = 127
 
+    driver = stream_driver.StreamDriver(dut.s_axis_in_tdata, dut.s_axis_in_tvalid, stream_decimator.pack(waveform[:MAX_TX], tb.IN_DW))
     while clk_cnt < MAX_CLK_CNT:
         await RisingEdge(dut.clk_i)
-        if clk_cnt < MAX_TX:
-            data = (((int(waveform[clk_cnt].imag)  & ((2 ** (tb.IN_DW // 2)) - 1)) << (tb.IN_DW // 2)) \
-                + ((int(waveform[clk_cnt].real)) & ((2 ** (tb.IN_DW // 2)) - 1))) & ((2 ** tb.IN_DW) - 1)
-            dut.s_axis_in_tdata.value = data
-            dut.s_axis_in_tvalid.value = 1
-        else:
-            dut.s_axis_in_tvalid.value = 0
+        driver.drive(clk_cnt)
 
         #print(f"data[{in_counter}] = {(int(waveform[in_counter].imag)  & ((2 ** (tb.IN_DW // 2)) - 1)):4x} {(int(waveform[in_counter].real)  & ((2 ** (tb.IN_DW // 2)) - 1)):4x}")
         clk_cnt += 1
@@ -164,13 +166,13 @@ async def simple_test(dut):
         if dut.PBCH_valid_o.value.integer == 1:
             # print(f"rx PBCH[{len(received_PBCH):3d}] re = {dut.m_axis_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1):4x} " \
             #     "im = {(dut.m_axis_out_tdata.value.integer>>(FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1):4x}")
-            received_PBCH.append(_twos_comp(dut.m_axis_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2)
-                + 1j * _twos_comp((dut.m_axis_out_tdata.value.integer>>(FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2))
+            received_PBCH.append(dut.m_axis_out_tdata.value.integer)
 
         if dut.SSS_valid_o.value.integer == 1:
-            received_SSS.append(_twos_comp(dut.m_axis_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2)
-                + 1j * _twos_comp((dut.m_axis_out_tdata.value.integer>>(FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2))
+            received_SSS.append(dut.m_axis_out_tdata.value.integer)
 
+    received_PBCH = list(iq_codec.decode(received_PBCH, FFT_OUT_DW))
+    received_SSS = list(iq_codec.decode(received_SSS, FFT_OUT_DW))
     assert len(received_SSS) == SSS_LEN
 
     if 'PLOTS' in os.environ and os.environ['PLOTS'] == '1':
@@ -191,11 +193,8 @@ async def simple_test(dut):
     assert detected_N_id == expected_N_id
     assert detected_N_id_1 == expected_N_id_1
 
-    corr = np.zeros(335)
-    for i in range(335):
-        sss = py3gpp.nrSSS(i * 3 + expected_N_id_2)
-        corr[i] = np.abs(np.vdot(sss, received_SSS))
-    detected_NID1 = np.argmax(corr)
+    candidates, corr, margin = sss_codebook.detect(received_SSS, expected_N_id_2)
+    detected_NID1 = candidates[0]
     assert detected_NID1 == expected_N_id_1
 
 
@@ -282,23 +281,8 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, WINDOW_LEN, CFO, HALF_CP_ADVANCE, USE_TAP_
     sim_build='sim_build/' + folder
     os.environ['TEST_FILE'] = FILE
 
-    FFT_LEN = 2 ** NFFT
-    CP_LEN = 18 * FFT_LEN // 256
-    CP_ADVANCE = CP_LEN // 2
-    file_path = os.path.abspath(os.path.join(tests_dir, '../tools/generate_FFT_demod_tap_file.py'))
-    spec = importlib.util.spec_from_file_location("generate_FFT_demod_tap_file", file_path)
-    generate_FFT_demod_tap_file = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(generate_FFT_demod_tap_file)
-    generate_FFT_demod_tap_file.main(['--NFFT', str(NFFT),'--CP_LEN', str(CP_LEN), '--CP_ADVANCE', str(CP_ADVANCE),
-                                      '--OUT_DW', str(OUT_DW), '--path', sim_build])
-
-    for N_id_2 in range(3):
-        os.makedirs(sim_build, exist_ok=True)
-        file_path = os.path.abspath(os.path.join(tests_dir, '../tools/generate_PSS_tap_file.py'))
-        spec = importlib.util.spec_from_file_location("generate_PSS_tap_file", file_path)
-        generate_PSS_tap_file = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(generate_PSS_tap_file)
-        generate_PSS_tap_file.main(['--PSS_LEN', str(PSS_LEN),'--TAP_DW', str(TAP_DW), '--N_id_2', str(N_id_2), '--path', sim_build])
+    generate_FFT_demod_tap_file.link_lut_files(NFFT, HALF_CP_ADVANCE, OUT_DW, sim_build)
+    generate_PSS_tap_file.link_tap_files(PSS_LEN, TAP_DW, sim_build)
     
     extra_env = {f'PARAM_{k}': str(v) for k, v in parameters.items()}
     
@@ -307,7 +291,7 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, WINDOW_LEN, CFO, HALF_CP_ADVANCE, USE_TAP_
         compile_args = ['--no-timing', '-Wno-fatal', '-y', tests_dir + '/../submodules/verilator-unisims']
     else:
         compile_args = ['-sglbl', '-y' + unisim_dir]
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -317,7 +301,6 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, WINDOW_LEN, CFO, HALF_CP_ADVANCE, USE_TAP_
         sim_build=sim_build,
         extra_env=extra_env,
         testcase='simple_test',
-        force_compile=True,
         compile_args = compile_args,
         waves = os.environ.get('WAVES') == '1'
     )
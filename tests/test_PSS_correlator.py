@@ -9,18 +9,27 @@ import os
 import importlib.util
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import Timer
 from cocotb.triggers import RisingEdge
 
-import py3gpp
-import sigmf
 
 CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sigmf_reader', os.path.join(tests_dir, '../tools/sigmf_reader.py'))
+sigmf_reader = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sigmf_reader)
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('iq_codec', os.path.join(tests_dir, '../tools/iq_codec.py'))
+iq_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(iq_codec)
+spec = importlib.util.spec_from_file_location('generate_PSS_tap_file', os.path.join(tests_dir, '../tools/generate_PSS_tap_file.py'))
+generate_PSS_tap_file = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(generate_PSS_tap_file)
 
 class TB(object):
     def __init__(self, dut):
@@ -72,7 +81,7 @@ class TB(object):
 @cocotb.test()
 async def simple_test(dut):
     tb = TB(dut)
-    handle = sigmf.sigmffile.fromfile('../../tests/30720KSPS_dl_signal.sigmf-data')
+    handle = sigmf_reader.SigMFReader('../../tests/30720KSPS_dl_signal.sigmf-data')
     waveform = handle.read_samples()
     fs = 30720000
     CFO = int(os.getenv('CFO'))
@@ -92,10 +101,10 @@ async def simple_test(dut):
     received = np.empty(num_items, int)
     received_model = np.empty(num_items, int)
     dut.enable_i.value = 1
+    tdata = iq_codec.encode(waveform, tb.IN_DW)
     while rx_counter < num_items:
         await RisingEdge(dut.clk_i)
-        data = (((int(waveform[in_counter].imag)  & (2 ** (tb.IN_DW // 2) - 1)) << (tb.IN_DW // 2)) \
-              + ((int(waveform[in_counter].real)) & (2 ** (tb.IN_DW // 2) - 1))) & (2 ** tb.IN_DW - 1)
+        data = int(tdata[in_counter])
         dut.s_axis_in_tdata.value = data
         dut.s_axis_in_tvalid.value = 1
         tb.model.set_data(data)
@@ -172,28 +181,14 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, CFO, USE_TAP_FILE):
     N_id_2 = 2
 
     if not USE_TAP_FILE:
-        PSS = np.zeros(PSS_LEN, 'complex')
-        PSS[0:-1] = py3gpp.nrPSS(N_id_2)
-        taps = np.fft.ifft(np.fft.fftshift(PSS))
-        taps /= max(taps.real.max(), taps.imag.max())
-        taps *= 2 ** (TAP_DW // 2 - 1) - 1
-        parameters['PSS_LOCAL'] = 0
-        for i in range(len(taps)):
-            parameters['PSS_LOCAL'] += ((int(np.imag(taps[i])) & (2 ** (TAP_DW // 2) - 1)) << (TAP_DW * i + TAP_DW // 2)) \
-                                    +  ((int(np.real(taps[i])) & (2 ** (TAP_DW // 2) - 1)) << (TAP_DW * i))
+        parameters['PSS_LOCAL'] = generate_PSS_tap_file.generate(PSS_LEN, TAP_DW, (N_id_2,))[1][0]
     else:
         # every parameter combination needs to have its own TAP_FILE to allow parallel tests!
         parameters['TAP_FILE'] = f'\"../{folder}/PSS_taps_{N_id_2}.hex\"'
         os.environ['TAP_FILE'] = f'{rtl_dir}/../{sim_build}/PSS_taps_{N_id_2}.hex'
+        generate_PSS_tap_file.link_tap_files(PSS_LEN, TAP_DW, sim_build, (N_id_2,))
 
-        os.makedirs(sim_build, exist_ok=True)
-        file_path = os.path.abspath(os.path.join(tests_dir, '../tools/generate_PSS_tap_file.py'))
-        spec = importlib.util.spec_from_file_location("generate_PSS_tap_file", file_path)
-        generate_PSS_tap_file = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(generate_PSS_tap_file)
-        generate_PSS_tap_file.main(['--PSS_LEN', str(PSS_LEN),'--TAP_DW', str(TAP_DW), '--N_id_2', str(N_id_2), '--path', sim_build])
-
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -202,8 +197,7 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, CFO, USE_TAP_FILE):
         parameters=parameters,
         sim_build=sim_build,
         extra_env=extra_env,
-        testcase='simple_test',
-        force_compile=True
+        testcase='simple_test'
     )
 
 if __name__ == '__main__':
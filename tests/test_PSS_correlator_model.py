@@ -0,0 +1,90 @@
+import numpy as np
+import os
+import pytest
+import importlib.util
+
+tests_dir = os.path.abspath(os.path.dirname(__file__))
+spec = importlib.util.spec_from_file_location('PSS_correlator', os.path.join(tests_dir, '../model/PSS_correlator.py'))
+PSS_correlator = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(PSS_correlator)
+
+class TickReference:
+    '''
+    per sample model of PSS_correlator.sv with python ints, like the tick() of the model before it got a block engine
+
+    Every valid sample shifts the input pipeline and calculates a new result, the result register keeps its value
+    in clock cycles without valid input and the output is delayed by 3 clock cycles.
+    '''
+    def __init__(self, model):
+        self.model = model
+        self.taps = [(int(re), int(im)) for re, im in zip(model.taps_re, model.taps_im)]
+        self.reset()
+
+    def reset(self):
+        self.pipeline = [(0, 0)] * self.model.PSS_LEN
+        self.valid = [False] * 3
+        self.result = [0] * 3
+
+    def tick(self, data_in, valid):
+        self.valid = [bool(valid)] + self.valid[:-1]
+        self.result = self.result[:1] + self.result[:-1]
+        if valid:
+            OP_DW = self.model.IN_DW // 2
+            re = PSS_correlator._twos_comp(data_in & (2 ** OP_DW - 1), OP_DW)
+            im = PSS_correlator._twos_comp((data_in >> OP_DW) & (2 ** OP_DW - 1), OP_DW)
+            self.pipeline = [(re, im)] + self.pipeline[:-1]
+            result_re = sum(tap_re * re - tap_im * im for (tap_re, tap_im), (re, im) in zip(self.taps, self.pipeline))
+            result_im = sum(tap_re * im + tap_im * re for (tap_re, tap_im), (re, im) in zip(self.taps, self.pipeline))
+            if abs(result_re) > abs(result_im):
+                result_abs = abs(result_re) + (abs(result_im) >> 2)
+            else:
+                result_abs = abs(result_im) + (abs(result_re) >> 2)
+            self.result[0] = (result_abs >> self.model.truncate) & (2 ** self.model.OUT_DW - 1)
+        return self.result[-1], self.valid[-1]
+
+@pytest.mark.parametrize("IN_DW", [14, 32])
+@pytest.mark.parametrize("OUT_DW", [24, 48])
+@pytest.mark.parametrize("TAP_DW", [18, 32])
+def test_block_vs_tick(IN_DW, OUT_DW, TAP_DW):
+    # the same clock cycles go through the per sample reference, set_data() / tick() and process_block() with
+    # random block sizes, all three are reset in the middle of the input
+    PSS_LEN = 128
+    NUM_CLKS = 2000
+    RESET_CLK = 1100
+    rng = np.random.default_rng(IN_DW * 10000 + OUT_DW * 100 + TAP_DW)
+    taps = rng.integers(0, 2 ** TAP_DW, PSS_LEN)
+    PSS_LOCAL = sum(int(tap) << (TAP_DW * i) for i, tap in enumerate(taps))
+    samples = rng.integers(0, 2 ** IN_DW, NUM_CLKS, dtype = np.uint64).astype(np.int64)
+    valid = rng.random(NUM_CLKS) < 0.7
+
+    model = PSS_correlator.Model(IN_DW, OUT_DW, TAP_DW, PSS_LEN, PSS_LOCAL, 0)
+    reference = TickReference(model)
+    expected = np.zeros(NUM_CLKS, np.int64)
+    expected_valid = np.zeros(NUM_CLKS, bool)
+    tick_data = np.zeros(NUM_CLKS, np.int64)
+    tick_valid = np.zeros(NUM_CLKS, bool)
+    for i in range(NUM_CLKS):
+        if i == RESET_CLK:
+            reference.reset()
+            model.reset()
+        expected[i], expected_valid[i] = reference.tick(int(samples[i]), valid[i])
+        if valid[i]:
+            model.set_data(int(samples[i]))
+        model.tick()
+        tick_data[i] = model.get_data()
+        tick_valid[i] = model.data_valid()
+    assert np.count_nonzero(expected) > NUM_CLKS // 2
+    assert np.array_equal(tick_valid, expected_valid)
+    assert np.array_equal(tick_data, expected)
+
+    model.reset()
+    boundaries = np.unique(np.concatenate(([0, RESET_CLK, NUM_CLKS], rng.integers(0, NUM_CLKS, 20))))
+    block_data, block_valid = [], []
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        if start == RESET_CLK:
+            model.reset()
+        data, data_valid = model.process_block(samples[start:end], valid[start:end])
+        block_data.append(data)
+        block_valid.append(data_valid)
+    assert np.array_equal(np.concatenate(block_valid), expected_valid)
+    assert np.array_equal(np.concatenate(block_data), expected)
@@ -3,23 +3,36 @@ import scipy
 import os
 import pytest
 import logging
-import importlib
+import importlib.util
 import matplotlib.pyplot as plt
 import os
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import Timer
 from cocotb.triggers import RisingEdge
 
 import py3gpp
-import sigmf
 
 CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sigmf_reader', os.path.join(tests_dir, '../tools/sigmf_reader.py'))
+sigmf_reader = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sigmf_reader)
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('stream_decimator', os.path.join(tests_dir, '../tools/stream_decimator.py'))
+stream_decimator = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_decimator)
+spec = importlib.util.spec_from_file_location('stream_driver', os.path.join(tests_dir, '../tools/stream_driver.py'))
+stream_driver = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_driver)
+spec = importlib.util.spec_from_file_location('generate_PSS_tap_file', os.path.join(tests_dir, '../tools/generate_PSS_tap_file.py'))
+generate_PSS_tap_file = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(generate_PSS_tap_file)
 
 def _twos_comp(val, bits):
     """compute the 2's complement of int value val"""
@@ -41,11 +54,11 @@ class TB(object):
         self.log.setLevel(logging.DEBUG)
 
         tests_dir = os.path.abspath(os.path.dirname(__file__))
-        model_dir = os.path.abspath(os.path.join(tests_dir, '../model/PSS_correlator.py'))
-        spec = importlib.util.spec_from_file_location('PSS_correlator', model_dir)
+        model_dir = os.path.abspath(os.path.join(tests_dir, '../model/PSS_correlator_mr.py'))
+        spec = importlib.util.spec_from_file_location('PSS_correlator_mr', model_dir)
         foo = importlib.util.module_from_spec(spec)
         spec.loader.exec_module(foo)
-        self.model = foo.Model(self.IN_DW, self.OUT_DW, self.TAP_DW, self.PSS_LEN, self.PSS_LOCAL, ALGO = 0)
+        self.model = foo.Model(self.IN_DW, self.OUT_DW, self.TAP_DW, self.PSS_LEN, self.PSS_LOCAL, self.MULT_REUSE)
 
         cocotb.start_soon(Clock(self.dut.clk_i, CLK_PERIOD_NS, units='ns').start())
         cocotb.start_soon(self.model_clk(CLK_PERIOD_NS, 'ns'))
@@ -73,14 +86,14 @@ class TB(object):
 async def simple_test(dut):
     tb = TB(dut)
     FILE = '../../tests/' + os.environ['TEST_FILE'] + '.sigmf-data'
-    handle = sigmf.sigmffile.fromfile(FILE)
+    handle = sigmf_reader.SigMFReader(FILE)
     waveform = handle.read_samples()
     fs = 30720000
     CFO = int(os.getenv('CFO'))
     print(f'CFO = {CFO} Hz')
     waveform *= np.exp(np.arange(len(waveform))*1j*2*np.pi*CFO/fs)
     waveform /= max(waveform.real.max(), waveform.imag.max())
-    fs = handle.get_global_field(sigmf.SigMFFile.SAMPLE_RATE_KEY)
+    fs = handle.sample_rate
     dec_factor = int(fs / 1920000)
     print(f'test_file = {FILE}')
     print(f'sample_rate = {fs}, decimation_factor = {dec_factor}')
@@ -100,28 +113,24 @@ async def simple_test(dut):
         expected_SSB_start = 1065
     rx_cnt = 0
     rx_cnt_model = 0
-    tx_cnt = 0
     received = np.empty(num_items, int)
     received_model = np.empty(num_items, int)
-    clk_div = 0
+    clk_cnt = 0
     clk_decimation = 16
     C0 = []
     C1 = []
+    C0_model = []
+    C1_model = []
     C_DW = int(tb.IN_DW + tb.TAP_DW + 2 + 2*np.ceil(np.log2(tb.PSS_LEN)))
     dut.enable_i.value = 1
+    driver = stream_driver.StreamDriver(dut.s_axis_in_tdata, dut.s_axis_in_tvalid, stream_decimator.pack(waveform, tb.IN_DW),
+        IDLE_CLKS = clk_decimation - 1, DELAY = clk_decimation - 1)
     while rx_cnt < num_items:
         await RisingEdge(dut.clk_i)
-        if clk_div < (clk_decimation - 1):
-            dut.s_axis_in_tvalid.value = 0
-            clk_div += 1
-        else:
-            clk_div = 0
-            data = (((int(waveform[tx_cnt].imag)  & (2 ** (tb.IN_DW // 2) - 1)) << (tb.IN_DW // 2)) \
-                  + ((int(waveform[tx_cnt].real)) & (2 ** (tb.IN_DW // 2) - 1))) & (2 ** tb.IN_DW - 1)
-            dut.s_axis_in_tdata.value = data
-            dut.s_axis_in_tvalid.value = 1
+        data = driver.drive(clk_cnt)
+        if data is not None:
             tb.model.set_data(data)
-            tx_cnt += 1
+        clk_cnt += 1
 
         if dut.m_axis_out_tvalid == 1:
             # print(f'{rx_counter}: rx hdl {dut.m_axis_out_tdata.value}')
@@ -134,6 +143,8 @@ async def simple_test(dut):
 
         if tb.model.data_valid() and rx_cnt_model < num_items:
             received_model[rx_cnt_model] = tb.model.get_data()
+            C0_model.append(tb.model.get_C0())
+            C1_model.append(tb.model.get_C1())
             # print(f'{rx_counter_model}: rx mod {received_model[rx_counter_model]}')
             rx_cnt_model += 1
 
@@ -155,6 +166,8 @@ async def simple_test(dut):
     print(f'max model-hdl difference is {max(np.abs(received - received_model))}')
     for i in range(len(received)):
         assert received[i] == received_model[i]
+    assert np.array_equal(np.array(C0)[128:], np.array(C0_model)[128:])
+    assert np.array_equal(np.array(C1)[128:], np.array(C1_model)[128:])
 
     prod = C0[ssb_start+128] * np.conj(C1[ssb_start+128])
     # detectedCFO = np.arctan2(prod.imag, prod.real)
@@ -221,24 +234,14 @@ def test(IN_DW, OUT_DW, TAP_DW, CFO, MULT_REUSE, FILE = '30720KSPS_dl_signal'):
         N_id_2 = 0
 
     # imaginary part is in upper 16 Bit
-    PSS = np.zeros(PSS_LEN, 'complex')
-    PSS[0:-1] = py3gpp.nrPSS(N_id_2)
-    taps = np.fft.ifft(np.fft.fftshift(PSS))
-    taps /= max(taps.real.max(), taps.imag.max())
-    taps *= 2 ** (TAP_DW // 2 - 1) - 1
-    # for i in range(10):
-    #     print(f'taps[{i}] = {taps[i]}')
-    parameters['PSS_LOCAL'] = 0
-    for i in range(len(taps)):
-        parameters['PSS_LOCAL'] += ((int(np.imag(taps[i])) & (2 ** (TAP_DW // 2) - 1)) << (TAP_DW * i + TAP_DW // 2)) \
-                                +  ((int(np.real(taps[i])) & (2 ** (TAP_DW // 2) - 1)) << (TAP_DW * i))
+    parameters['PSS_LOCAL'] = generate_PSS_tap_file.generate(PSS_LEN, TAP_DW, (N_id_2,))[1][0]
     extra_env = {f'PARAM_{k}': str(v) for k, v in parameters.items()}
     os.environ['CFO'] = str(CFO)
     parameters_dirname = parameters.copy()
     del parameters_dirname['PSS_LOCAL']
     parameters_dirname['CFO'] = CFO
     sim_build='sim_build/' + '_'.join(('{}={}'.format(*i) for i in parameters_dirname.items()))
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -248,7 +251,6 @@ def test(IN_DW, OUT_DW, TAP_DW, CFO, MULT_REUSE, FILE = '30720KSPS_dl_signal'):
         sim_build=sim_build,
         extra_env=extra_env,
         testcase='simple_test',
-        force_compile=True,
         waves=True
     )
 
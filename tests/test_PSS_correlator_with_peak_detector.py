@@ -3,23 +3,32 @@ import scipy
 import os
 import pytest
 import logging
-import importlib
+import importlib.util
 import matplotlib.pyplot as plt
 import os
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import Timer
 from cocotb.triggers import RisingEdge
 
-import py3gpp
-import sigmf
 
 CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sigmf_reader', os.path.join(tests_dir, '../tools/sigmf_reader.py'))
+sigmf_reader = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sigmf_reader)
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('iq_codec', os.path.join(tests_dir, '../tools/iq_codec.py'))
+iq_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(iq_codec)
+spec = importlib.util.spec_from_file_location('generate_PSS_tap_file', os.path.join(tests_dir, '../tools/generate_PSS_tap_file.py'))
+generate_PSS_tap_file = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(generate_PSS_tap_file)
 
 
 class TB(object):
@@ -32,6 +41,7 @@ class TB(object):
         self.PSS_LOCAL = int(dut.PSS_LOCAL.value)
         self.ALGO = int(dut.ALGO.value)
         self.WINDOW_LEN = int(dut.WINDOW_LEN.value)
+        self.DETECTION_SHIFT = int(dut.DETECTION_SHIFT.value)
 
         self.log = logging.getLogger('cocotb.tb')
         self.log.setLevel(logging.DEBUG)
@@ -43,11 +53,18 @@ class TB(object):
         spec.loader.exec_module(foo)
         self.PSS_correlator_model = foo.Model(self.IN_DW, self.OUT_DW, self.TAP_DW, self.PSS_LEN, self.PSS_LOCAL, self.ALGO) 
 
+        model_file = os.path.abspath(os.path.join(tests_dir, '../model/PSS_correlator_mr.py'))
+        spec = importlib.util.spec_from_file_location('PSS_correlator_mr', model_file)
+        foo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(foo)
+        # MULT_REUSE = 0 models PSS_correlator.sv including ALGO = 1
+        self.PSS_correlator_mr_model = foo.Model(self.IN_DW, self.OUT_DW, self.TAP_DW, self.PSS_LEN, self.PSS_LOCAL, 0, self.ALGO)
+
         model_file = os.path.abspath(os.path.join(tests_dir, '../model/peak_detector.py'))
         spec = importlib.util.spec_from_file_location('peak_detector', model_file)
         foo = importlib.util.module_from_spec(spec)
         spec.loader.exec_module(foo)
-        self.peak_detector_model = foo.Model(self.OUT_DW, self.WINDOW_LEN)
+        self.peak_detector_model = foo.Model(self.OUT_DW, self.WINDOW_LEN, self.DETECTION_SHIFT)
 
         cocotb.start_soon(Clock(self.dut.clk_i, CLK_PERIOD_NS, units='ns').start())
         cocotb.start_soon(self.model_clk(CLK_PERIOD_NS, 'ns'))
@@ -77,8 +94,8 @@ class TB(object):
 async def simple_test(dut):
     tb = TB(dut)
     FILE = '../../tests/' + os.environ['TEST_FILE'] + '.sigmf-data'
-    handle = sigmf.sigmffile.fromfile(FILE)
-    fs = handle.get_global_field(sigmf.SigMFFile.SAMPLE_RATE_KEY)
+    handle = sigmf_reader.SigMFReader(FILE)
+    fs = handle.sample_rate
     waveform = handle.read_samples()
     waveform /= max(waveform.real.max(), waveform.imag.max())
     dec_factor = int(fs / 1920000)
@@ -100,13 +117,15 @@ async def simple_test(dut):
     rx_counter = 0
     in_counter = 0
     received = np.empty(num_items, int)
+    tx_data = []
+    tdata = iq_codec.encode(waveform, tb.IN_DW)
     while rx_counter < num_items:
         await RisingEdge(dut.clk_i)
-        data = (((int(waveform[in_counter].imag)  & ((2 ** (tb.IN_DW // 2)) - 1)) << (tb.IN_DW // 2)) \
-              + ((int(waveform[in_counter].real)) & ((2 ** (tb.IN_DW // 2)) - 1))) & ((2 ** tb.IN_DW) - 1)
+        data = int(tdata[in_counter])
         dut.s_axis_in_tdata.value = data
         dut.s_axis_in_tvalid.value = 1
         tb.PSS_correlator_model.set_data(data)
+        tx_data.append(data)
         in_counter += 1
 
         #if dut.m_axis_out_tvalid == 1:
@@ -130,6 +149,17 @@ async def simple_test(dut):
     print(f'highest peak at {peak_pos}')
     assert peak_pos == expected_peak_pos
 
+    # run the same input through the models, both index domains are clock cycles because a sample is written
+    # every cycle. The peak for the sample written in cycle k is high in cycle k + LATENCY + 1 (correlator + Peak_detector)
+    # and is read one cycle later, because values read after RisingEdge are the ones from before the edge.
+    PEAK_LATENCY = tb.PSS_correlator_mr_model.LATENCY + 2
+    correlator_model, _, _ = tb.PSS_correlator_mr_model.process_block(tx_data)
+    peaks_model = np.flatnonzero(tb.peak_detector_model.process_block(correlator_model)[0]) + PEAK_LATENCY
+    peaks_model = peaks_model[peaks_model < num_items]
+    peaks_hdl = np.flatnonzero(received)
+    print(f'peaks hdl at {peaks_hdl}, peaks model at {peaks_model}')
+    assert np.array_equal(peaks_hdl, peaks_model)
+
 # bit growth inside PSS_correlator is a lot, be careful to not make OUT_DW too small !
 @pytest.mark.parametrize("ALGO", [0, 1])
 @pytest.mark.parametrize("IN_DW", [32])
@@ -166,20 +196,12 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, DETECTION_SHIFT, WINDOW_LEN, FILE = '30720
         N_id_2 = 0
 
     # imaginary part is in upper 16 Bit
-    PSS = np.zeros(PSS_LEN, 'complex')
-    PSS[0:-1] = py3gpp.nrPSS(N_id_2)
-    taps = np.fft.ifft(np.fft.fftshift(PSS))
-    taps /= max(taps.real.max(), taps.imag.max())
-    taps *= 2 ** (TAP_DW // 2 - 1)
-    parameters['PSS_LOCAL'] = 0
-    for i in range(len(taps)):
-        parameters['PSS_LOCAL'] += ((int(np.round(np.imag(taps[i]))) & (2 ** (TAP_DW // 2) - 1)) << (TAP_DW * i + TAP_DW // 2)) \
-                                 + ((int(np.round(np.real(taps[i]))) & (2 ** (TAP_DW // 2) - 1)) << (TAP_DW * i))
+    parameters['PSS_LOCAL'] = generate_PSS_tap_file.generate(PSS_LEN, TAP_DW, (N_id_2,), MAX_TAP = 2 ** (TAP_DW // 2 - 1), ROUND = True)[1][0]
     extra_env = {f'PARAM_{k}': str(v) for k, v in parameters.items()}
     parameters_no_taps = parameters.copy()
     del parameters_no_taps['PSS_LOCAL']
     sim_build='sim_build/' + '_'.join(('{}={}'.format(*i) for i in parameters_no_taps.items()))
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -189,8 +211,7 @@ def test(IN_DW, OUT_DW, TAP_DW, ALGO, DETECTION_SHIFT, WINDOW_LEN, FILE = '30720
         sim_build=sim_build,
         extra_env=extra_env,
         waves=True,
-        testcase='simple_test',
-        force_compile=True
+        testcase='simple_test'
     )
 
 @pytest.mark.parametrize("FILE", ["772850KHz_3840KSPS_low_gain"])
@@ -1,26 +1,37 @@
 import numpy as np
-import scipy
 import os
 import pytest
 import logging
-import importlib
+import importlib.util
 import matplotlib.pyplot as plt
 import os
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import Timer
 from cocotb.triggers import RisingEdge
 from cocotbext.axi import AxiLiteBus, AxiLiteMaster
 
-import py3gpp
-import sigmf
 
 CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sigmf_reader', os.path.join(tests_dir, '../tools/sigmf_reader.py'))
+sigmf_reader = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sigmf_reader)
+spec = importlib.util.spec_from_file_location('stream_decimator', os.path.join(tests_dir, '../tools/stream_decimator.py'))
+stream_decimator = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_decimator)
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('iq_codec', os.path.join(tests_dir, '../tools/iq_codec.py'))
+iq_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(iq_codec)
+spec = importlib.util.spec_from_file_location('generate_PSS_tap_file', os.path.join(tests_dir, '../tools/generate_PSS_tap_file.py'))
+generate_PSS_tap_file = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(generate_PSS_tap_file)
 
 def _twos_comp(val, bits):
     """compute the 2's complement of int value val"""
@@ -65,29 +76,25 @@ class TB(object):
 @cocotb.test()
 async def simple_test(dut):
     tb = TB(dut)
-    handle = sigmf.sigmffile.fromfile('../../tests/30720KSPS_dl_signal.sigmf-data')
-    waveform = handle.read_samples()
-    waveform /= max(waveform.real.max(), waveform.imag.max())
-    waveform = scipy.signal.decimate(waveform, 16, ftype='fir')
-    waveform /= max(waveform.real.max(), waveform.imag.max())
-    waveform *= 2 ** (tb.IN_DW // 2 - 1)
-    waveform = waveform.real.astype(int) + 1j*waveform.imag.astype(int)
-
-    await tb.cycle_reset()
-
     if tb.USE_MODE:
         MAX_CLK_CNT = int(1.92e6 * 0.025)
     else:
         MAX_CLK_CNT = 3000
+    handle = sigmf_reader.SigMFReader('../../tests/30720KSPS_dl_signal.sigmf-data')
+    max_re, max_im = stream_decimator.peak(handle, 16)
+    waveform = stream_decimator.decimate(handle, 16, MAX_CLK_CNT, SCALE = 2 ** (tb.IN_DW // 2 - 1) / max(max_re, max_im))
+    waveform = waveform.real.astype(int) + 1j*waveform.imag.astype(int)
+
+    await tb.cycle_reset()
     clk_cnt = 0
     in_counter = 0
     received = []
     received_correlator = []
     dut.clear_ni.value = 1
+    tdata = iq_codec.encode(waveform, tb.IN_DW)
     while clk_cnt < MAX_CLK_CNT:
         await RisingEdge(dut.clk_i)
-        data = (((int(waveform[in_counter].imag)  & ((2 ** (tb.IN_DW // 2)) - 1)) << (tb.IN_DW // 2)) \
-              + ((int(waveform[in_counter].real)) & ((2 ** (tb.IN_DW // 2)) - 1))) & ((2 ** tb.IN_DW) - 1)
+        data = int(tdata[in_counter])
         dut.s_axis_in_tdata.value = data
         dut.s_axis_in_tvalid.value = 1
         in_counter += 1
@@ -165,31 +172,22 @@ def test(IN_DW, OUT_DW, TAP_DW, CFO_DW, DDS_DW, ALGO, WINDOW_LEN, USE_MODE, USE_
     folder = '_'.join(('{}={}'.format(*i) for i in parameters_no_taps.items()))
     sim_build='sim_build/' + folder
 
+    # imaginary part is in upper 16 Bit
+    _, PSS_LOCAL = generate_PSS_tap_file.generate(PSS_LEN, TAP_DW, MAX_TAP = 2 ** (TAP_DW // 2 - 1), ROUND = True)
     for i in range(3):
-        # imaginary part is in upper 16 Bit
-        PSS = np.zeros(PSS_LEN, 'complex')
-        PSS[0:-1] = py3gpp.nrPSS(i)
-        taps = np.fft.ifft(np.fft.fftshift(PSS))
-        taps /= max(taps.real.max(), taps.imag.max())
-        taps *= 2 ** (TAP_DW // 2 - 1)
-        parameters[f'PSS_LOCAL_{i}'] = 0
-        PSS_taps = np.empty(PSS_LEN, int)
-        for k in range(len(taps)):
-            if not USE_TAP_FILE:
-                parameters[f'PSS_LOCAL_{i}'] += ((int(np.round(np.imag(taps[k]))) & (2 ** (TAP_DW // 2) - 1)) << (TAP_DW * k + TAP_DW // 2)) \
-                                        + ((int(np.round(np.real(taps[k]))) & (2 ** (TAP_DW // 2) - 1)) << (TAP_DW * k))
-            PSS_taps[k] = ((int(np.imag(taps[k])) & (2 ** (TAP_DW // 2) - 1)) << (TAP_DW // 2)) \
-                                    + (int(np.real(taps[k])) & (2 ** (TAP_DW // 2) - 1))
+        parameters[f'PSS_LOCAL_{i}'] = 0 if USE_TAP_FILE else PSS_LOCAL[i]
         if USE_TAP_FILE:
             parameters[f'TAP_FILE_{i}'] = f'\"../{folder}_PSS_{i}_taps.txt\"'
             os.environ[f'TAP_FILE_{i}'] = f'../{folder}_PSS_{i}_taps.txt'
-            np.savetxt(sim_build + f'_PSS_{i}_taps.txt', PSS_taps, fmt = '%x', delimiter = ' ')
+    if USE_TAP_FILE:
+        generate_PSS_tap_file.link_tap_files(PSS_LEN, TAP_DW, 'sim_build', MAX_TAP = 2 ** (TAP_DW // 2 - 1),
+            filename = folder + '_PSS_{}_taps.txt')
 
     compile_args = []
     if os.environ.get('SIM') == 'verilator':
         compile_args = ['--no-timing', '-Wno-fatal', '-CFLAGS', '-DVL_VALUE_STRING_MAX_WORDS=256']
 
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -198,7 +196,6 @@ def test(IN_DW, OUT_DW, TAP_DW, CFO_DW, DDS_DW, ALGO, WINDOW_LEN, USE_MODE, USE_
         parameters=parameters,
         sim_build=sim_build,
         testcase='simple_test',
-        force_compile=True,
         waves=True,
         compile_args=compile_args
     )
@@ -251,7 +248,7 @@ def test_axi():
         os.path.join(rtl_dir, 'CIC')
     ]
 
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         toplevel=toplevel,
@@ -259,7 +256,6 @@ def test_axi():
         includes=includes,
         sim_build=sim_build,
         testcase='axi_tb',
-        force_compile=True,
         waves=True,
     )
 
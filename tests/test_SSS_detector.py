@@ -1,11 +1,11 @@
 import numpy as np
 import os
+import importlib.util
 import pytest
 import logging
 import os
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 
@@ -15,6 +15,9 @@ CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
 
 class TB(object):
     def __init__(self, dut):
@@ -23,6 +26,12 @@ class TB(object):
         self.log = logging.getLogger('cocotb.tb')
         self.log.setLevel(logging.DEBUG)
 
+        model_file = os.path.abspath(os.path.join(tests_dir, '../model/SSS_detector.py'))
+        spec = importlib.util.spec_from_file_location('SSS_detector', model_file)
+        foo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(foo)
+        self.model = foo.Model(int(dut.IN_DW.value))
+
         cocotb.start_soon(Clock(self.dut.clk_i, CLK_PERIOD_NS, units='ns').start())
 
     async def cycle_reset(self):
@@ -57,6 +66,16 @@ async def simple_test(dut):
     dut.s_axis_in_tvalid.value = 0
     await RisingEdge(dut.clk_i)
 
+    # clock cycle 0 of the model is the edge at which N_id_2_valid_i is sampled, followed by the SSS samples
+    model_tvalid = np.zeros(SSS_len + 2 + tb.model.DETECT_CLKS + 1000, int)
+    model_tvalid[1:][:SSS_len] = 1
+    model_tdata = np.zeros(len(model_tvalid), int)
+    model_tdata[1:][:SSS_len] = SSS_seq.astype(int) * 2 - 1
+    model_N_id_2_valid = np.zeros(len(model_tvalid), int)
+    model_N_id_2_valid[0] = 1
+    model_clk, model_N_id_1, model_N_id = tb.model.process(model_tdata, model_tvalid, N_id_2, model_N_id_2_valid)
+    assert len(model_clk) == 1
+
     max_wait_cycles = 335 * SSS_len + 1000
     cycle_counter = 0
     while cycle_counter < max_wait_cycles:
@@ -65,11 +84,17 @@ async def simple_test(dut):
             detected_N_id_1 = dut.m_axis_out_tdata.value.integer
             detected_N_id = dut.N_id_o.value.integer
             print(f'detected_N_id_1 = {detected_N_id_1}')
+            # values read after RisingEdge are the ones from before that edge
+            detected_clk = SSS_len + 2 + cycle_counter - 1
             break
         cycle_counter += 1
 
     assert detected_N_id_1 == N_id_1
     assert detected_N_id == N_id_1 * 3 + N_id_2
+    assert detected_N_id_1 == model_N_id_1[0]
+    assert detected_N_id == model_N_id[0]
+    print(f'tvalid at clk {detected_clk}, model predicts clk {model_clk[0]}')
+    assert detected_clk == model_clk[0]
     # assert dut.m_axis_out_tdata.value == N_id_1
 
 @pytest.mark.parametrize("N_ID_1", [0, 335])
@@ -91,7 +116,7 @@ def test(N_ID_1, N_ID_2):
     parameters['IN_DW'] = 32
 
     sim_build='sim_build/' + '_'.join(('{}={}'.format(*i) for i in parameters.items()))
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -99,8 +124,7 @@ def test(N_ID_1, N_ID_2):
         module=module,
         parameters=parameters,
         sim_build=sim_build,
-        testcase='simple_test',
-        force_compile=True
+        testcase='simple_test'
     )
 
 if __name__ == '__main__':
@@ -1,12 +1,12 @@
 import numpy as np
 import os
+import importlib.util
 import pytest
 import logging
 import matplotlib.pyplot as plt
 import os
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 
@@ -15,6 +15,12 @@ CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('stream_checker', os.path.join(tests_dir, '../tools/stream_checker.py'))
+stream_checker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_checker)
 
 def _twos_comp(val, bits):
     """compute the 2's complement of int value val"""
@@ -27,6 +33,12 @@ class TB(object):
         self.dut = dut
         self.INPUT_WIDTH = int(dut.INPUT_WIDTH.value)
         self.OUTPUT_WIDTH = int(dut.OUTPUT_WIDTH.value)
+        self.LUT_DW = int(dut.LUT_DW.value)
+
+        spec = importlib.util.spec_from_file_location('atan2_model', os.path.join(tests_dir, '../model/atan2.py'))
+        atan2_model = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(atan2_model)
+        self.model = atan2_model.Model(self.INPUT_WIDTH, self.LUT_DW, self.OUTPUT_WIDTH)
 
         self.log = logging.getLogger('cocotb.tb')
         self.log.setLevel(logging.DEBUG)
@@ -60,6 +72,7 @@ async def simple_test(dut):
     denominator[0] = MAX_VAL
     numerator[1] = 0
     denominator[1] = -MAX_VAL
+    expected_angles = tb.model.calc(numerator, denominator)
 
     tx_cnt = 0
     expected_results = []
@@ -86,6 +99,7 @@ async def simple_test(dut):
                 result = _twos_comp(dut.angle_o.value.integer, tb.OUTPUT_WIDTH) / PI * 180
                 print(f'atan2({numerator[rx_cnt]} / {denominator[rx_cnt]}) = {result:.3f}  expected {np.arctan2(numerator[rx_cnt], denominator[rx_cnt]) / np.pi * 180:.3f}')
                 assert np.abs(np.abs(np.arctan2(numerator[rx_cnt], denominator[rx_cnt]) / np.pi * 180) - np.abs(result)) < 0.1
+                assert _twos_comp(int(dut.angle_o.value), tb.OUTPUT_WIDTH) == expected_angles[rx_cnt]
                 rx_cnt += 1
 
                 if rx_cnt < max_rx_cnt:
@@ -114,11 +128,39 @@ async def simple_test(dut):
                 result = _twos_comp(dut.angle_o.value.integer, tb.OUTPUT_WIDTH) / PI * 180
                 print(f'atan2({numerator[rx_cnt]} / {denominator[rx_cnt]}) = {result:.3f}  expected {expected_results[rx_cnt] / np.pi * 180:.3f}')
                 # assert np.abs(np.abs(result) - np.abs(expected_results[rx_cnt] / np.pi * 180)) < 0.1
+                assert _twos_comp(int(dut.angle_o.value), tb.OUTPUT_WIDTH) == expected_angles[rx_cnt]
                 rx_cnt += 1
 
     if clk_cnt == max_clk_cnt:
         print("no result received!")
-    
+
+@cocotb.test()
+async def stream_test(dut):
+    tb = TB(dut)
+
+    dut.valid_i.value = 0
+    await tb.cycle_reset()
+
+    NUM_VECTORS = int(os.environ['NUM_VECTORS'])
+    MAX_VAL = 2 ** (tb.INPUT_WIDTH - 1) - 1
+    rng = np.random.default_rng(1)
+    numerator = rng.integers(-MAX_VAL - 1, MAX_VAL, NUM_VECTORS, endpoint = True)
+    denominator = rng.integers(-MAX_VAL - 1, MAX_VAL, NUM_VECTORS, endpoint = True)
+    # small operands for the first and last entries of the atan lut, equal magnitudes for the octant borders
+    small = NUM_VECTORS // 4
+    denominator[:small] >>= rng.integers(0, tb.INPUT_WIDTH - 1, small)
+    numerator[small:2 * small] = -denominator[small:2 * small] * rng.choice([-1, 1], small)
+    corner_cases = np.array([[0, 0], [0, MAX_VAL], [0, -MAX_VAL], [MAX_VAL, 0], [-MAX_VAL, 0], [MAX_VAL, MAX_VAL],
+        [-MAX_VAL - 1, -MAX_VAL - 1], [-MAX_VAL - 1, 0], [0, -MAX_VAL - 1], [-MAX_VAL - 1, MAX_VAL]])
+    numerator[:len(corner_cases)] = corner_cases[:, 0]
+    denominator[:len(corner_cases)] = corner_cases[:, 1]
+
+    checker = stream_checker.StreamChecker(dut.clk_i, dut.valid_i, [dut.numerator_i, dut.denominator_i],
+        dut.valid_o, [dut.angle_o])
+    num_checked = await checker.run(tb.model, numerator, denominator)
+    print(f'{num_checked} results are bit exact')
+    assert num_checked == NUM_VECTORS
+
 
 @pytest.mark.parametrize("INPUT_WIDTH", [16, 32])
 @pytest.mark.parametrize("OUTPUT_WIDTH", [16, 32])
@@ -142,7 +184,7 @@ def test(INPUT_WIDTH, OUTPUT_WIDTH, PIPELINED):
 
     parameters_dir = parameters.copy()
     sim_build='sim_build/_atan2_' + '_'.join(('{}={}'.format(*i) for i in parameters_dir.items()))
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -151,9 +193,41 @@ def test(INPUT_WIDTH, OUTPUT_WIDTH, PIPELINED):
         parameters=parameters,
         sim_build=sim_build,
         testcase='simple_test',
-        force_compile=True,
         waves=True
     )
 
+@pytest.mark.parametrize("INPUT_WIDTH", [16, 32])
+@pytest.mark.parametrize("OUTPUT_WIDTH", [16, 32])
+def test_stream(INPUT_WIDTH, OUTPUT_WIDTH, NUM_VECTORS = 2 ** 20):
+    dut = 'atan2'
+    module = os.path.splitext(os.path.basename(__file__))[0]
+    toplevel = dut
+
+    verilog_sources = [
+        os.path.join(rtl_dir, f'{dut}.sv'),
+        os.path.join(rtl_dir, 'atan.sv'),
+        os.path.join(rtl_dir, 'div.sv')
+    ]
+    includes = []
+
+    parameters = {}
+    parameters['INPUT_WIDTH'] = INPUT_WIDTH
+    parameters['OUTPUT_WIDTH'] = OUTPUT_WIDTH
+    extra_env = {'NUM_VECTORS': str(NUM_VECTORS)}
+
+    parameters_dir = parameters.copy()
+    sim_build='sim_build/_atan2_' + '_'.join(('{}={}'.format(*i) for i in parameters_dir.items())) + '_stream'
+    sim_build_cache.run(
+        python_search=[tests_dir],
+        verilog_sources=verilog_sources,
+        includes=includes,
+        toplevel=toplevel,
+        module=module,
+        parameters=parameters,
+        sim_build=sim_build,
+        extra_env=extra_env,
+        testcase='stream_test'
+    )
+
 if __name__ == '__main__':
     test(INPUT_WIDTH = 18, OUTPUT_WIDTH = 16, PIPELINED = 0)
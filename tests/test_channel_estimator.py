@@ -1,5 +1,6 @@
 import numpy as np
 import os
+import importlib.util
 import pytest
 import logging
 import os
@@ -7,17 +8,30 @@ import scipy
 import matplotlib.pyplot as plt
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 
 import py3gpp
-import sigmf
 
 CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sigmf_reader', os.path.join(tests_dir, '../tools/sigmf_reader.py'))
+sigmf_reader = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sigmf_reader)
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('iq_codec', os.path.join(tests_dir, '../tools/iq_codec.py'))
+iq_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(iq_codec)
+spec = importlib.util.spec_from_file_location('pbch_sequences', os.path.join(tests_dir, '../tools/pbch_sequences.py'))
+pbch_sequences = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pbch_sequences)
+spec = importlib.util.spec_from_file_location('polar_codec', os.path.join(tests_dir, '../tools/polar_codec.py'))
+polar_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(polar_codec)
 
 def _twos_comp(val, bits):
     """compute the 2's complement of int value val"""
@@ -65,7 +79,7 @@ async def simple_test(dut):
     cycle_counter = 0
     PBCH_DMRS = []
     ibar_SSB = 2
-    PBCH_DMRS_model = py3gpp.nrPBCHDMRS(N_id, ibar_SSB)*np.sqrt(2)
+    PBCH_DMRS_model = pbch_sequences.dmrs_symbols(N_id, ibar_SSB)*np.sqrt(2)
     while cycle_counter < max_wait_cycles:
         await RisingEdge(dut.clk_i)
         if dut.debug_PBCH_DMRS_valid_o.value == 1:
@@ -90,7 +104,7 @@ async def simple_test2(dut):
     await RisingEdge(dut.clk_i)
     dut.N_id_valid_i.value = 0
 
-    handle = sigmf.sigmffile.fromfile(tests_dir + '/30720KSPS_dl_signal.sigmf-data')
+    handle = sigmf_reader.SigMFReader(tests_dir + '/30720KSPS_dl_signal.sigmf-data')
     waveform = handle.read_samples()
     waveform = scipy.signal.decimate(waveform, 8, ftype='fir')  # decimate to 3.840 MSPS
 
@@ -114,13 +128,13 @@ async def simple_test2(dut):
     cycle_counter = 0
     PBCH_cnt = 0
     SC_cnt = 0
+    PBCH_tdata = iq_codec.encode(PBCH, tb.IN_DW)
     while cycle_counter < max_wait_cycles:
         await RisingEdge(dut.clk_i)
 
         if cycle_counter > 2000 and PBCH_cnt < 256*3:
             if SC_cnt >= SC_START and SC_cnt <= FFT_LEN - 2*SC_START:
-                data = (((int(PBCH[PBCH_cnt].imag)  & ((2 ** (tb.IN_DW // 2)) - 1)) << (tb.IN_DW // 2)) \
-                    + ((int(PBCH[PBCH_cnt].real)) & ((2 ** (tb.IN_DW // 2)) - 1)))
+                data = int(PBCH_tdata[PBCH_cnt])
                 dut.s_axis_in_tdata.value = data
                 dut.s_axis_in_tvalid.value = 1
                 dut.s_axis_in_tuser.value = PBCH_cnt == SC_START
@@ -157,7 +171,7 @@ async def simple_test3(dut):
     await RisingEdge(dut.clk_i)
     dut.N_id_valid_i.value = 0
 
-    handle = sigmf.sigmffile.fromfile(tests_dir + '/30720KSPS_dl_signal.sigmf-data')
+    handle = sigmf_reader.SigMFReader(tests_dir + '/30720KSPS_dl_signal.sigmf-data')
     waveform = handle.read_samples()
     waveform = scipy.signal.decimate(waveform, 8, ftype='fir')  # decimate to 3.840 MSPS
 
@@ -201,7 +215,8 @@ async def simple_test3(dut):
     ibar_SSB = 0
     ibar_SSBs = []
     IQ_data = []
-    corrected_PBCH = np.empty((10,432), 'complex')
+    symbol_tdata = iq_codec.encode(symbol, tb.IN_DW)
+    corrected_PBCH_words = np.zeros((10,432), np.int64)
     corrected_PBCH_idx = 0
     corrected_PBCH_sym_cnt = 0
     idle_clks = 0
@@ -229,8 +244,7 @@ async def simple_test3(dut):
                 idle_clks = 100
                 dut.s_axis_in_tvalid.value = 0
             elif (SC_cnt >= SC_START) and (SC_cnt <= FFT_LEN - SC_START - 1):
-                data = (((int(symbol[symbol_id][SC_cnt].imag)  & ((2 ** (tb.IN_DW // 2)) - 1)) << (tb.IN_DW // 2)) \
-                    + ((int(symbol[symbol_id][SC_cnt].real)) & ((2 ** (tb.IN_DW // 2)) - 1)))
+                data = int(symbol_tdata[symbol_id][SC_cnt])
                 dut.s_axis_in_tdata.value = data
                 dut.s_axis_in_tvalid.value = 1
                 if dut.s_axis_in_tvalid.value and ((symbol_id + START_SYMBOL) in SSB_pattern):
@@ -243,8 +257,7 @@ async def simple_test3(dut):
             dut.s_axis_in_tvalid.value = 0
 
         if (dut.m_axis_out_tvalid.value == 1) and (dut.m_axis_out_tuser.value == 1):
-            corrected_PBCH[corrected_PBCH_sym_cnt, corrected_PBCH_idx] = _twos_comp(dut.m_axis_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2) \
-                + 1j * _twos_comp((dut.m_axis_out_tdata.value.integer>>(FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2)
+            corrected_PBCH_words[corrected_PBCH_sym_cnt, corrected_PBCH_idx] = dut.m_axis_out_tdata.value.integer
             corrected_PBCH_idx += 1
         
             if dut.m_axis_out_tlast.value == 1:
@@ -258,40 +271,33 @@ async def simple_test3(dut):
             assert ibar_SSB_det == ibar_SSB
             ibar_SSB += 1
         clk_cnt += 1
+    corrected_PBCH = iq_codec.decode(corrected_PBCH_words, FFT_OUT_DW)
     assert corrected_PBCH_idx == 0
     assert corrected_PBCH_sym_cnt == 4
     print(f'finished after {clk_cnt} clk cycles')
     print(f'received {corrected_PBCH_sym_cnt} PBCH messages')
 
-    # try to decode PBCH
-    for i in range(corrected_PBCH_sym_cnt):
-        ibar_SSB = ibar_SSBs[i]
-        nVar = 1
-        print(f'PBCH message {i} with SSB index (ibar_SSB) = {ibar_SSB}')
-        for mode in ['hard', 'soft']:
-            print(f'demodulation mode: {mode}')
-            pbchBits = py3gpp.nrSymbolDemodulate(corrected_PBCH[i,:], 'QPSK', nVar, mode)  
-
-            E = 864
-            v = ibar_SSB
-            scrambling_seq = py3gpp.nrPBCHPRBS(N_id, v, E)
-            scrambling_seq_bpsk = (-1)*scrambling_seq*2 + 1
-            pbchBits_descrambled = pbchBits * scrambling_seq_bpsk
-
-            A = 32
-            P = 24
-            K = A+P
-            N = 512 # calculated according to Section 5.3.1 of 3GPP TS 38.212
-            decIn = py3gpp.nrRateRecoverPolar(pbchBits_descrambled, K, N, False, discardRepetition=False)
-            decoded = py3gpp.nrPolarDecode(decIn, K, 0, 0)
-
-            # check CRC
-            _, crc_result = py3gpp.nrCRCDecode(decoded, '24C')
-            if crc_result == 0:
-                print("nrPolarDecode: PBCH CRC ok")
+    # try to decode all PBCH messages at once
+    nVar = 1
+    print(f'PBCH messages with SSB index (ibar_SSB) = {ibar_SSBs[:corrected_PBCH_sym_cnt]}')
+    for mode in ['hard', 'soft']:
+        print(f'demodulation mode: {mode}')
+        pbchBits = np.array([py3gpp.nrSymbolDemodulate(corrected_PBCH[i,:], 'QPSK', nVar, mode) for i in range(corrected_PBCH_sym_cnt)])
+
+        E = 864
+        v = np.array(ibar_SSBs[:corrected_PBCH_sym_cnt])
+        scrambling_seq = pbch_sequences.scrambling_bits(N_id, v, E)
+        scrambling_seq_bpsk = (-1)*scrambling_seq*2 + 1
+        pbchBits_descrambled = pbchBits * scrambling_seq_bpsk
+
+        # rate recovery, polar decoding (K = 56, N = 512) and CRC-24C check
+        decoded, crc_result = polar_codec.decode(pbchBits_descrambled)
+        for i in range(corrected_PBCH_sym_cnt):
+            if crc_result[i] == 0:
+                print(f"PBCH message {i}: CRC ok")
             else:
-                print("nrPolarDecode: PBCH CRC failed")
-            assert crc_result == 0
+                print(f"PBCH message {i}: CRC failed")
+        assert np.all(crc_result == 0)
 
     if os.environ.get('PLOTS') == '1':
         IQ_data = np.array(IQ_data)
@@ -325,7 +331,7 @@ def test_PBCH_DMRS_gen(N_ID_1, N_ID_2):
     parameters_dirname['N_ID_2'] = str(N_ID_2)
 
     sim_build='sim_build/test' + '_'.join(('{}={}'.format(*i) for i in parameters_dirname.items()))
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -334,7 +340,6 @@ def test_PBCH_DMRS_gen(N_ID_1, N_ID_2):
         parameters=parameters,
         sim_build=sim_build,
         testcase='simple_test',
-        force_compile=True,
         waves=True
     )
 
@@ -363,7 +368,7 @@ def test_PBCH_ibar_SSB_det(IN_DW, ibar_SSB):
     parameters_dirname['ibar_SSB'] = str(ibar_SSB)
 
     sim_build='sim_build/test2' + '_'.join(('{}={}'.format(*i) for i in parameters_dirname.items()))
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -371,8 +376,7 @@ def test_PBCH_ibar_SSB_det(IN_DW, ibar_SSB):
         module=module,
         parameters=parameters,
         sim_build=sim_build,
-        testcase='simple_test2',
-        force_compile=True
+        testcase='simple_test2'
     )
 
 @pytest.mark.parametrize("IN_DW", [32])
@@ -397,7 +401,7 @@ def test_PBCH_stream(IN_DW):
     parameters_dirname = parameters.copy()
 
     sim_build='sim_build/test3' + '_'.join(('{}={}'.format(*i) for i in parameters_dirname.items()))
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -406,7 +410,6 @@ def test_PBCH_stream(IN_DW):
         parameters=parameters,
         sim_build=sim_build,
         testcase='simple_test3',
-        force_compile=True,
         defines = ['LUT_PATH=\"../../tests\"'],
         waves=True
     )
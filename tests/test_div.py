@@ -1,12 +1,12 @@
 import numpy as np
 import os
+import importlib.util
 import pytest
 import logging
 import matplotlib.pyplot as plt
 import os
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 
@@ -15,6 +15,12 @@ CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('stream_checker', os.path.join(tests_dir, '../tools/stream_checker.py'))
+stream_checker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_checker)
 
 def _twos_comp(val, bits):
     """compute the 2's complement of int value val"""
@@ -29,6 +35,11 @@ class TB(object):
         self.RESULT_WIDTH = int(dut.RESULT_WIDTH.value)
         self.PIPELINED = int(dut.PIPELINED.value)
 
+        spec = importlib.util.spec_from_file_location('div_model', os.path.join(tests_dir, '../model/div.py'))
+        div_model = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(div_model)
+        self.model = div_model.Model(self.INPUT_WIDTH, self.RESULT_WIDTH, self.PIPELINED)
+
         self.log = logging.getLogger('cocotb.tb')
         self.log.setLevel(logging.DEBUG)
 
@@ -84,7 +95,30 @@ async def simple_test(dut):
 
     if clk_cnt == max_clk_cnt:
         print("no result received!")
-    
+
+@cocotb.test()
+async def stream_test(dut):
+    tb = TB(dut)
+
+    dut.valid_i.value = 0
+    await tb.cycle_reset()
+
+    NUM_VECTORS = int(os.environ['NUM_VECTORS'])
+    MAX_VAL = 2 ** tb.INPUT_WIDTH - 1
+    rng = np.random.default_rng(1)
+    numerator = rng.integers(0, MAX_VAL, NUM_VECTORS, endpoint = True)
+    # spread the quotients over all result bits and beyond
+    denominator = rng.integers(0, MAX_VAL, NUM_VECTORS, endpoint = True) >> rng.integers(0, tb.INPUT_WIDTH, NUM_VECTORS)
+    corner_cases = np.array([[0, 0], [0, 1], [1, 0], [MAX_VAL, 0], [MAX_VAL, 1], [MAX_VAL, MAX_VAL], [1, MAX_VAL], [MAX_VAL - 1, MAX_VAL]])
+    numerator[:len(corner_cases)] = corner_cases[:, 0]
+    denominator[:len(corner_cases)] = corner_cases[:, 1]
+
+    checker = stream_checker.StreamChecker(dut.clk_i, dut.valid_i, [dut.numerator_i, dut.denominator_i],
+        dut.valid_o, [dut.result_o])
+    num_checked = await checker.run(tb.model, numerator, denominator)
+    print(f'{num_checked} results are bit exact')
+    assert num_checked == NUM_VECTORS
+
 
 @pytest.mark.parametrize("INPUT_WIDTH", [16, 32])
 @pytest.mark.parametrize("RESULT_WIDTH", [16, 32])
@@ -106,7 +140,7 @@ def test(INPUT_WIDTH, RESULT_WIDTH, PIPELINED):
 
     parameters_dir = parameters.copy()
     sim_build='sim_build/' + '_'.join(('{}={}'.format(*i) for i in parameters_dir.items()))
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -115,9 +149,42 @@ def test(INPUT_WIDTH, RESULT_WIDTH, PIPELINED):
         parameters=parameters,
         sim_build=sim_build,
         testcase='simple_test',
-        force_compile=True,
         waves=True
     )
 
+@pytest.mark.parametrize("INPUT_WIDTH", [16, 32])
+@pytest.mark.parametrize("RESULT_WIDTH", [16, 32])
+@pytest.mark.parametrize("PIPELINED", [0, 1])
+def test_stream(INPUT_WIDTH, RESULT_WIDTH, PIPELINED, NUM_VECTORS = 2 ** 20):
+    dut = 'div'
+    module = os.path.splitext(os.path.basename(__file__))[0]
+    toplevel = dut
+
+    verilog_sources = [
+        os.path.join(rtl_dir, f'{dut}.sv')
+    ]
+    includes = []
+
+    parameters = {}
+    parameters['INPUT_WIDTH'] = INPUT_WIDTH
+    parameters['RESULT_WIDTH'] = RESULT_WIDTH
+    parameters['PIPELINED'] = PIPELINED
+    # the not pipelined divider needs RESULT_WIDTH + 1 clock cycles per division
+    extra_env = {'NUM_VECTORS': str(NUM_VECTORS if PIPELINED else NUM_VECTORS // RESULT_WIDTH)}
+
+    parameters_dir = parameters.copy()
+    sim_build='sim_build/' + '_'.join(('{}={}'.format(*i) for i in parameters_dir.items())) + '_stream'
+    sim_build_cache.run(
+        python_search=[tests_dir],
+        verilog_sources=verilog_sources,
+        includes=includes,
+        toplevel=toplevel,
+        module=module,
+        parameters=parameters,
+        sim_build=sim_build,
+        extra_env=extra_env,
+        testcase='stream_test'
+    )
+
 if __name__ == '__main__':
     test(INPUT_WIDTH = 16, RESULT_WIDTH = 16, PIPELINED = 1)
@@ -1,6 +1,7 @@
 import numpy as np
 import scipy
 import os
+import importlib.util
 import pytest
 import logging
 import importlib
@@ -8,7 +9,6 @@ import matplotlib.pyplot as plt
 import os
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import Timer
 from cocotb.triggers import RisingEdge
@@ -20,6 +20,9 @@ CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
 
 def _twos_comp(val, bits):
     """compute the 2's complement of int value val"""
@@ -149,7 +152,7 @@ def test(A_DW, B_DW, LEN, OUT_DW, A_COMPLEX, B_COMPLEX):
     parameters['B_COMPLEX'] = B_COMPLEX
     
     sim_build='sim_build/' + '_'.join(('{}={}'.format(*i) for i in parameters.items()))
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -157,8 +160,7 @@ def test(A_DW, B_DW, LEN, OUT_DW, A_COMPLEX, B_COMPLEX):
         module=module,
         parameters=parameters,
         sim_build=sim_build,
-        testcase='simple_test',
-        force_compile=True
+        testcase='simple_test'
     )
 
 if __name__ == '__main__':
@@ -1,23 +1,33 @@
 import numpy as np
 import os
+import importlib.util
 import pytest
 import logging
 import os
-import scipy
 import matplotlib.pyplot as plt
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 
 import py3gpp
-import sigmf
 
 CLK_PERIOD_NS = 260416
 CLK_PERIOD_S = CLK_PERIOD_NS * 1e-12
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sigmf_reader', os.path.join(tests_dir, '../tools/sigmf_reader.py'))
+sigmf_reader = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sigmf_reader)
+spec = importlib.util.spec_from_file_location('stream_decimator', os.path.join(tests_dir, '../tools/stream_decimator.py'))
+stream_decimator = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_decimator)
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('iq_codec', os.path.join(tests_dir, '../tools/iq_codec.py'))
+iq_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(iq_codec)
 
 class TB(object):
     def __init__(self, dut):
@@ -44,12 +54,10 @@ async def stream_tb(dut):
     tb = TB(dut)
     await tb.cycle_reset()
 
-    handle = sigmf.sigmffile.fromfile(tests_dir + '/30720KSPS_dl_signal.sigmf-data')
-    waveform = handle.read_samples()
-    waveform /= max(waveform.real.max(), waveform.imag.max())
-    waveform = scipy.signal.decimate(waveform, 16//2, ftype='fir')
-    waveform /= max(waveform.real.max(), waveform.imag.max())
-    waveform *= 2 ** (tb.IN_DW // 2 - 1)
+    max_clk_cnt = int(3.84e6 * 0.025)  # 25ms
+    handle = sigmf_reader.SigMFReader(tests_dir + '/30720KSPS_dl_signal.sigmf-data')
+    max_re, max_im = stream_decimator.peak(handle, 16//2)
+    waveform = stream_decimator.decimate(handle, 16//2, max_clk_cnt, SCALE = 2 ** (tb.IN_DW // 2 - 1) / max(max_re, max_im))
     waveform = waveform.real.astype(int) + 1j*waveform.imag.astype(int)
 
     CP1_LEN = 20
@@ -81,13 +89,13 @@ async def stream_tb(dut):
     symbol *= (2 ** (tb.IN_DW // 2 - 1) - 1)
     symbol = symbol.real.astype(int) + 1j*symbol.imag.astype(int)
 
-    max_clk_cnt = int(3.84e6 * 0.025)  # 25ms
     clk_cnt = 0
     symbol_id = 0
     SC_cnt = 0
     pos = 0
     current_CP_len = CP2_LEN
     ibar_SSB_DEALAY = 1000
+    tdata = iq_codec.encode(waveform, tb.IN_DW)
     while clk_cnt < max_clk_cnt:
         await RisingEdge(dut.clk_i)
 
@@ -107,8 +115,7 @@ async def stream_tb(dut):
         else:
             dut.ibar_SSB_valid_i.value = 0
 
-        data = (((int(waveform[pos].imag)  & ((2 ** (tb.IN_DW // 2)) - 1)) << (tb.IN_DW // 2)) \
-            + ((int(waveform[pos].real)) & ((2 ** (tb.IN_DW // 2)) - 1)))
+        data = int(tdata[pos])
         dut.s_axis_in_tdata.value = data
         dut.s_axis_in_tvalid.value = 1
 
@@ -151,7 +158,7 @@ def test_stream(IN_DW):
     parameters_dirname = parameters.copy()
 
     sim_build='sim_build/test_stream' + '_'.join(('{}={}'.format(*i) for i in parameters_dirname.items()))
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -159,8 +166,7 @@ def test_stream(IN_DW):
         module=module,
         parameters=parameters,
         sim_build=sim_build,
-        testcase='stream_tb',
-        force_compile=True
+        testcase='stream_tb'
     )
 
 if __name__ == '__main__':
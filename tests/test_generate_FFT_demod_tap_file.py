@@ -0,0 +1,38 @@
+import numpy as np
+import os
+import pytest
+import importlib.util
+
+tests_dir = os.path.abspath(os.path.dirname(__file__))
+rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('generate_FFT_demod_tap_file', os.path.join(tests_dir, '../tools/generate_FFT_demod_tap_file.py'))
+generate_FFT_demod_tap_file = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(generate_FFT_demod_tap_file)
+
+@pytest.mark.parametrize("NFFT", [8, 9, 10, 11])
+@pytest.mark.parametrize("HALF_CP_ADVANCE", [0, 1])
+@pytest.mark.parametrize("OUT_DW", [16, 32])
+def test_CP1_CP2_luts(NFFT, HALF_CP_ADVANCE, OUT_DW, tmp_path, monkeypatch):
+    # FFT_demod.sv only loads the CP2 lut and uses it for CP1 symbols as well, this is only correct if both luts are the same
+    CP1_LEN, CP2_LEN = generate_FFT_demod_tap_file.CP_lengths(NFFT)
+    assert CP1_LEN > CP2_LEN
+    luts = generate_FFT_demod_tap_file.create_luts(NFFT, HALF_CP_ADVANCE, OUT_DW)
+    CP1_ADVANCE, CP1_taps = luts[(NFFT, HALF_CP_ADVANCE, CP1_LEN)]
+    CP2_ADVANCE, CP2_taps = luts[(NFFT, HALF_CP_ADVANCE, CP2_LEN)]
+    # both FFT windows start the same number of samples before the end of the CP
+    assert CP1_LEN - CP1_ADVANCE == CP2_LEN - CP2_ADVANCE
+    assert np.array_equal(CP1_taps, CP2_taps)
+    # the CP2 lut is the file that FFT_demod.sv loads and the taps that it calculates without a tap file
+    assert CP2_ADVANCE == (CP2_LEN // 2 if HALF_CP_ADVANCE else CP2_LEN)
+    assert np.array_equal(CP2_taps, generate_FFT_demod_tap_file.create_lut(NFFT, CP2_LEN, CP2_ADVANCE, OUT_DW))
+
+    artifact_store = generate_FFT_demod_tap_file.artifact_store
+    monkeypatch.setattr(artifact_store, '_STORE', artifact_store.ArtifactStore(str(tmp_path / 'store')))
+    files = generate_FFT_demod_tap_file.link_lut_files(NFFT, HALF_CP_ADVANCE, OUT_DW, str(tmp_path))
+    assert [os.path.basename(f) for f in files] == [generate_FFT_demod_tap_file.lut_filename(NFFT, CP2_LEN, CP2_ADVANCE, OUT_DW)]
+
+def test_FFT_demod_CP_skip():
+    # CP_advance() has to match the number of CP samples that the STATE_IN_SKIP_CP state of FFT_demod.sv skips
+    with open(os.path.join(rtl_dir, 'FFT_demod.sv')) as f:
+        hdl = f.read()
+    assert 'CP_cnt == (HALF_CP_ADVANCE ? current_CP_len - (CP2 >> 1) - 1 : current_CP_len - 1)' in hdl
@@ -1,5 +1,4 @@
 import numpy as np
-import scipy
 import os
 import pytest
 import logging
@@ -7,18 +6,52 @@ import matplotlib.pyplot as plt
 import importlib.util
 
 import cocotb
-import cocotb_test.simulator
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 from cocotbext.axi import AxiLiteBus, AxiLiteMaster
 
 import py3gpp
-import sigmf
 
 CLK_PERIOD_NS = 8
 CLK_PERIOD_S = CLK_PERIOD_NS * 0.000000001
 tests_dir = os.path.abspath(os.path.dirname(__file__))
 rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', 'hdl'))
+spec = importlib.util.spec_from_file_location('sigmf_reader', os.path.join(tests_dir, '../tools/sigmf_reader.py'))
+sigmf_reader = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sigmf_reader)
+spec = importlib.util.spec_from_file_location('stream_decimator', os.path.join(tests_dir, '../tools/stream_decimator.py'))
+stream_decimator = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_decimator)
+spec = importlib.util.spec_from_file_location('stimulus_cache', os.path.join(tests_dir, '../tools/stimulus_cache.py'))
+stimulus_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stimulus_cache)
+spec = importlib.util.spec_from_file_location('sim_build_cache', os.path.join(tests_dir, '../tools/sim_build_cache.py'))
+sim_build_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sim_build_cache)
+spec = importlib.util.spec_from_file_location('iq_codec', os.path.join(tests_dir, '../tools/iq_codec.py'))
+iq_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(iq_codec)
+spec = importlib.util.spec_from_file_location('stream_monitor', os.path.join(tests_dir, '../tools/stream_monitor.py'))
+stream_monitor = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_monitor)
+spec = importlib.util.spec_from_file_location('stream_driver', os.path.join(tests_dir, '../tools/stream_driver.py'))
+stream_driver = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_driver)
+spec = importlib.util.spec_from_file_location('sss_codebook', os.path.join(tests_dir, '../tools/sss_codebook.py'))
+sss_codebook = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sss_codebook)
+spec = importlib.util.spec_from_file_location('pbch_sequences', os.path.join(tests_dir, '../tools/pbch_sequences.py'))
+pbch_sequences = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pbch_sequences)
+spec = importlib.util.spec_from_file_location('polar_codec', os.path.join(tests_dir, '../tools/polar_codec.py'))
+polar_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(polar_codec)
+spec = importlib.util.spec_from_file_location('generate_PSS_tap_file', os.path.join(tests_dir, '../tools/generate_PSS_tap_file.py'))
+generate_PSS_tap_file = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(generate_PSS_tap_file)
+spec = importlib.util.spec_from_file_location('receiver_model', os.path.join(tests_dir, '../model/receiver.py'))
+receiver_model = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(receiver_model)
 
 def _twos_comp(val, bits):
     """compute the 2's complement of int value val"""
@@ -38,6 +71,11 @@ class TB(object):
         self.LLR_DW = int(dut.LLR_DW.value)
         self.NFFT = int(dut.NFFT.value)
         self.MULT_REUSE = int(dut.MULT_REUSE.value)
+        self.MULT_REUSE_FFT = int(dut.MULT_REUSE_FFT.value)
+        self.CLK_FREQ = int(dut.CLK_FREQ.value)
+        self.INITIAL_DETECTION_SHIFT = int(dut.INITIAL_DETECTION_SHIFT.value)
+        self.INITIAL_CFO_MODE = int(dut.INITIAL_CFO_MODE.value)
+        self.HAS_CFO_COR = int(dut.HAS_CFO_COR.value)
 
         self.log = logging.getLogger('cocotb.tb')
         self.log.setLevel(logging.DEBUG)
@@ -73,18 +111,16 @@ class TB(object):
 async def simple_test(dut):
     tb = TB(dut)
     FILE = '../../tests/' + os.environ['TEST_FILE'] + '.sigmf-data'
-    handle = sigmf.sigmffile.fromfile(FILE)
-    waveform = handle.read_samples()
-    fs = handle.get_global_field(sigmf.SigMFFile.SAMPLE_RATE_KEY)
+    handle = sigmf_reader.SigMFReader(FILE)
+    fs = handle.sample_rate
     NFFT = tb.NFFT
     FFT_LEN = 2 ** NFFT
     dec_factor = int((2048 * fs // 30720000) // (2 ** tb.NFFT))
     assert dec_factor != 0, f'NFFT = {tb.NFFT} and fs = {fs} is not possible!'
-    print(f'test_file = {FILE} with {len(waveform)} samples')
+    print(f'test_file = {FILE} with {len(handle)} samples')
     print(f'sample_rate = {fs}, decimation_factor = {dec_factor}')
     if dec_factor > 1:
         fs_dec = fs // dec_factor
-        waveform = scipy.signal.decimate(waveform, dec_factor, ftype='fir')
     else:
         fs_dec = fs
 
@@ -102,8 +138,8 @@ async def simple_test(dut):
         N_SSBs = 4
         MAX_TX = int((0.005 + 0.02 * (N_SSBs - 1)) * fs_dec)
         MAX_CLK_CNT = int(MAX_TX * (1 + EXTRA_IDLE_CLKS + RND_JITTER * 0.5) + 10000)
-        waveform /= max(np.abs(waveform.real.max()), np.abs(waveform.imag.max()))
-        waveform *= MAX_AMPLITUDE * 0.8  # need this 0.8 because rounding errors caused overflows, nasty bug!
+        delta_f = 0
+        scale = None  # normalize to MAX_AMPLITUDE * PEAK_FRACTION
     elif os.environ['TEST_FILE'] == '772850KHz_3840KSPS_low_gain':
         # waveform = waveform[int(0.04 * fs_dec):]
         expect_exact_timing = False
@@ -114,8 +150,7 @@ async def simple_test(dut):
         MAX_TX = int((0.01 + 0.02 * (N_SSBs - 1)) * fs_dec)
         MAX_CLK_CNT = int(MAX_TX * (1 + EXTRA_IDLE_CLKS + RND_JITTER * 0.5) + 10000)
         delta_f = -4e3
-        waveform = waveform * np.exp(-1j*(2*np.pi*delta_f/fs_dec*np.arange(waveform.shape[0])))
-        waveform *= 2**19
+        scale = 2**19
     elif os.environ['TEST_FILE'] == '762000KHz_3840KSPS_low_gain':
         expect_exact_timing = False
         expected_N_id_1 = 103
@@ -125,8 +160,7 @@ async def simple_test(dut):
         MAX_TX = int((0.01 + 0.02 * (N_SSBs - 1)) * fs_dec)
         MAX_CLK_CNT = int(MAX_TX * (1 + EXTRA_IDLE_CLKS + RND_JITTER * 0.5) + 10000)
         delta_f = 0e3
-        waveform = waveform * np.exp(-1j*(2*np.pi*delta_f/fs_dec*np.arange(waveform.shape[0])))
-        waveform *= 2**19
+        scale = 2**19
     elif os.environ['TEST_FILE'] == '763450KHz_7680KSPS_low_gain':
         expect_exact_timing = False
         expected_N_id_1 = 103
@@ -136,8 +170,7 @@ async def simple_test(dut):
         MAX_TX = int((0.01 + 0.02 * (N_SSBs - 1)) * fs_dec)
         MAX_CLK_CNT = int(MAX_TX * (1 + EXTRA_IDLE_CLKS + RND_JITTER * 0.5) + 10000)
         delta_f = 0e3
-        waveform = waveform * np.exp(-1j*(2*np.pi*delta_f/fs_dec*np.arange(waveform.shape[0])))
-        waveform *= 2**19
+        scale = 2**19
     else:
         file_string = os.environ['TEST_FILE']
         assert False, f'test file {file_string} is not supported'
@@ -145,11 +178,24 @@ async def simple_test(dut):
 
     CFO = int(os.getenv('CFO'))
     print(f'CFO = {CFO} Hz')
-    waveform *= np.exp(np.arange(len(waveform)) * 1j * 2 * np.pi * CFO / fs_dec)
 
-    assert np.abs(waveform.real).max().astype(int) <= MAX_AMPLITUDE, 'Error: input data overflow!'
-    assert np.abs(waveform.imag).max().astype(int) <= MAX_AMPLITUDE, 'Error: input data overflow!'
-    waveform = waveform.real.astype(int) + 1j * waveform.imag.astype(int)
+    PEAK_FRACTION = 0.8  # need this 0.8 because rounding errors caused overflows, nasty bug!
+    def create_stimulus():
+        if scale is None:
+            max_re, max_im = stream_decimator.peak(handle, dec_factor)
+            stimulus_scale = MAX_AMPLITUDE * PEAK_FRACTION / max(np.abs(max_re), np.abs(max_im))
+        else:
+            stimulus_scale = scale
+        # decimate, remove delta_f, add CFO and scale only the samples that are sent to the DUT
+        waveform = stream_decimator.decimate(handle, dec_factor, MAX_TX, FREQ_SHIFT = CFO - delta_f, FS = fs_dec, SCALE = stimulus_scale)
+        assert np.abs(waveform.real).max().astype(int) <= MAX_AMPLITUDE, 'Error: input data overflow!'
+        assert np.abs(waveform.imag).max().astype(int) <= MAX_AMPLITUDE, 'Error: input data overflow!'
+        return stream_decimator.pack(waveform, tb.IN_DW)
+    # stream_decimator creates the stimulus, MAX_AMPLITUDE and PEAK_FRACTION set the scale if scale is None
+    tdata = stimulus_cache.StimulusCache().get(FILE, create_stimulus, generator_file = stream_decimator.__file__,
+        dec_factor = dec_factor, MAX_TX = MAX_TX, CFO = CFO, delta_f = delta_f, scale = scale, IN_DW = tb.IN_DW,
+        MAX_AMPLITUDE = MAX_AMPLITUDE, PEAK_FRACTION = PEAK_FRACTION)
+    waveform = stream_decimator.unpack(tdata, tb.IN_DW)
 
     await tb.cycle_reset()
     USE_COCOTB_AXI = 0
@@ -186,14 +232,6 @@ async def simple_test(dut):
         assert data == 0x00010061
 
     clk_cnt = 0
-    received = []
-    rx_ADC_data = []
-    received_PBCH = []
-    received_SSS = []
-    corrected_PBCH = []
-    received_PBCH_LLR = []
-    received_N_ids = []
-    received_ibar_SSB = []
     if NFFT == 8:
         N_PRB = 20
     elif NFFT == 9:
@@ -206,85 +244,54 @@ async def simple_test(dut):
     NUM_TIMESTAMP_SAMPLES = 64 // FFT_OUT_DW
     RGS_TRANSFER_LEN = SYMBOL_LEN + NUM_TIMESTAMP_SAMPLES + 1
     print(RGS_TRANSFER_LEN)
-    received_rgs = np.zeros((1, RGS_TRANSFER_LEN), 'complex')
-    num_rgs_symbols = 0
-    rgs_sc_idx = 0
     HALF_CP_ADVANCE = tb.HALF_CP_ADVANCE
     CP2_LEN = 18 * FFT_LEN // 256
     SSS_LEN = 127
     SSS_START = FFT_LEN // 2 - (SSS_LEN + 1) // 2
-    clk_div = 0
-    tx_cnt = 0
-    sample_cnt = 0
-    random_extra_cycle = 0
+
+    monitor = stream_monitor.StreamMonitor(dut.clk_i)
+    monitor.add_stream('ibar_SSB', dut.ibar_SSB_valid_o, ibar_SSB = dut.ibar_SSB_o)
+    monitor.add_stream('peak', dut.peak_detected_debug_o)
+    monitor.add_stream('PSS_out', dut.m_axis_PSS_out_tvalid)
+    monitor.add_stream('N_id', dut.N_id_valid_o, N_id = dut.N_id_o)
+    monitor.add_stream('N_id_1', dut.m_axis_SSS_tvalid, N_id_1 = dut.m_axis_SSS_tdata)
+    monitor.add_stream('llr', dut.m_axis_llr_out_tvalid, tdata = dut.m_axis_llr_out_tdata, tuser = dut.m_axis_llr_out_tuser)
+    monitor.add_stream('cest', dut.m_axis_cest_out_tvalid, tdata = dut.m_axis_cest_out_tdata, tuser = dut.m_axis_cest_out_tuser)
+    monitor.add_stream('PBCH', dut.PBCH_valid_o, tdata = dut.m_axis_demod_out_tdata)
+    monitor.add_stream('SSS', dut.SSS_valid_o, tdata = dut.m_axis_demod_out_tdata)
+    received_rgs = stream_monitor.ResourceGridCapture(SYMBOL_LEN, FFT_OUT_DW)
+    monitor.add_stream('rgs', dut.m_axis_out_tvalid, buffer = received_rgs, tdata = dut.m_axis_out_tdata, tlast = dut.m_axis_out_tlast)
+    monitor_task = monitor.start(MAX_CLK_CNT)
+
     random_seq = (py3gpp.nrPSS(0)[:-1] + 1) // 2 # only use 126 bits to get an equal number of 0s and 1s
+    driver = stream_driver.StreamDriver(dut.s_axis_in_tdata, dut.s_axis_in_tvalid, tdata, EXTRA_IDLE_CLKS,
+        random_seq if RND_JITTER else None)
     while clk_cnt < MAX_CLK_CNT:
         await RisingEdge(dut.clk_i)
-        if (tx_cnt < MAX_TX) and (clk_div == 0 or EXTRA_IDLE_CLKS == 0):
-            clk_div += 1
-            data = (((int(waveform[tx_cnt].imag)  & ((2 ** (tb.IN_DW // 2)) - 1)) << (tb.IN_DW // 2)) \
-                + ((int(waveform[tx_cnt].real)) & ((2 ** (tb.IN_DW // 2)) - 1))) & ((2 ** tb.IN_DW) - 1)
-            tx_cnt += 1
-            dut.s_axis_in_tdata.value = data
-            dut.s_axis_in_tvalid.value = 1
-        else:
-            dut.s_axis_in_tvalid.value = 0
-            if clk_div == EXTRA_IDLE_CLKS + random_extra_cycle:
-                clk_div = 0
-                if RND_JITTER:
-                    random_extra_cycle = random_seq[clk_cnt % 126]
-            else:
-                clk_div += 1
-
+        driver.drive(clk_cnt)
         clk_cnt += 1
-
-        if dut.ibar_SSB_valid_o.value.integer:
-            received_ibar_SSB.append(dut.ibar_SSB_o.value.integer)
-
-        if dut.peak_detected_debug_o.value.integer:
-            received.append(sample_cnt)
-            print(f'peak pos = {sample_cnt}')
-        sample_cnt += dut.m_axis_PSS_out_tvalid.value.integer
-
-        if dut.N_id_valid_o.value.integer:
-            print(f'detected N_id = {dut.N_id_o.value.integer}')
-            received_N_ids.append(dut.N_id_o.value.integer)
-
-        if dut.m_axis_SSS_tvalid.value.integer:
-            print(f'detected N_id_1 = {dut.m_axis_SSS_tdata.value.integer}')
-
-        if dut.m_axis_llr_out_tvalid.value == 1 and dut.m_axis_llr_out_tuser.value == 1:
-            received_PBCH_LLR.append(_twos_comp(dut.m_axis_llr_out_tdata.value.integer & (2 ** (tb.LLR_DW) - 1), tb.LLR_DW))
-
-        if dut.m_axis_cest_out_tvalid.value == 1 and ((dut.m_axis_cest_out_tuser.value & 0x03) == 1):
-            blk_exp = dut.m_axis_cest_out_tuser.value.integer >> 2
-            corrected_PBCH.append((_twos_comp(dut.m_axis_cest_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2)
-                + 1j * _twos_comp((dut.m_axis_cest_out_tdata.value.integer >> (FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2)) / (2 ** blk_exp))
-
-        if dut.PBCH_valid_o.value.integer == 1:
-            # print(f"rx PBCH[{len(received_PBCH):3d}] re = {dut.m_axis_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1):4x} " \
-            #     "im = {(dut.m_axis_out_tdata.value.integer>>(FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1):4x}")
-            received_PBCH.append(_twos_comp(dut.m_axis_demod_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2)
-                + 1j * _twos_comp((dut.m_axis_demod_out_tdata.value.integer >> (FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2))
-
-        if dut.SSS_valid_o.value.integer == 1:
-            received_SSS.append(_twos_comp(dut.m_axis_demod_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2)
-                + 1j * _twos_comp((dut.m_axis_demod_out_tdata.value.integer >> (FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2))
-
-        if dut.m_axis_out_tvalid.value.integer:
-            if rgs_sc_idx < 1 + NUM_TIMESTAMP_SAMPLES:
-                received_rgs[num_rgs_symbols, rgs_sc_idx] = dut.m_axis_out_tdata.value.integer
-            else:
-                received_rgs[num_rgs_symbols, rgs_sc_idx] = _twos_comp(dut.m_axis_out_tdata.value.integer & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2) \
-                    + 1j * _twos_comp((dut.m_axis_out_tdata.value.integer >> (FFT_OUT_DW//2)) & (2**(FFT_OUT_DW//2) - 1), FFT_OUT_DW//2)
-
-            if dut.m_axis_out_tlast.value.integer:
-                num_rgs_symbols += 1
-                assert rgs_sc_idx == RGS_TRANSFER_LEN - 1, print('Error: wrong received number of bytes from ressource_grid_subscriber!')
-                rgs_sc_idx = 0
-                received_rgs = np.vstack((received_rgs, np.zeros((1, RGS_TRANSFER_LEN), 'complex')))
-            else:
-                rgs_sc_idx += 1
+    await monitor_task
+
+    # decode the captured streams
+    received_ibar_SSB = list(monitor['ibar_SSB']['ibar_SSB'])
+    # peak position in samples at the output of the PSS detector
+    received = list(np.searchsorted(monitor['PSS_out']['clk'], monitor['peak']['clk']))
+    for peak_pos in received:
+        print(f'peak pos = {peak_pos}')
+    received_N_ids = list(monitor['N_id']['N_id'])
+    for N_id in received_N_ids:
+        print(f'detected N_id = {N_id}')
+    for N_id_1 in monitor['N_id_1']['N_id_1']:
+        print(f'detected N_id_1 = {N_id_1}')
+    llr = monitor['llr']
+    received_PBCH_LLR = list(iq_codec.twos_comp(llr['tdata'][llr['tuser'] == 1], tb.LLR_DW))
+    cest = monitor['cest']
+    PBCH_beats = (cest['tuser'] & 0x03) == 1
+    corrected_PBCH = list(iq_codec.decode(cest['tdata'][PBCH_beats], FFT_OUT_DW, cest['tuser'][PBCH_beats] >> 2))
+    received_PBCH = list(iq_codec.decode(monitor['PBCH']['tdata'], FFT_OUT_DW))
+    received_SSS = list(iq_codec.decode(monitor['SSS']['tdata'], FFT_OUT_DW))
+    num_rgs_symbols = len(received_rgs)
+    print(f'received {num_rgs_symbols} symbols from ressource_grid_subscriber')
 
     print(f'received {len(corrected_PBCH)} PBCH IQ samples')
     print(f'received {len(received_PBCH_LLR)} PBCH LLRs samples')
@@ -302,7 +309,7 @@ async def simple_test(dut):
         assert data >= 864 * 2
         for i in range(864 * 2):
             data = await axi_master.read_dword(7 * 4)
-            fifo_data.append(_twos_comp(data & (2 ** (tb.LLR_DW) - 1), tb.LLR_DW))
+            fifo_data.append(data)
     else:
         addr = 0
         data = await tb.read_axil(addr * 4)
@@ -314,7 +321,8 @@ async def simple_test(dut):
         addr = 7
         for i in range(864 * 2):
             data = await tb.read_axil(addr * 4)
-            fifo_data.append(_twos_comp(data & (2 ** (tb.LLR_DW) - 1), tb.LLR_DW))
+            fifo_data.append(data)
+    fifo_data = list(iq_codec.twos_comp(fifo_data, tb.LLR_DW))
     assert not np.array_equal(np.array(fifo_data), np.zeros(len(fifo_data)))
     assert np.array_equal(np.array(received_PBCH_LLR)[:864 * 2], np.array(fifo_data))
 
@@ -406,26 +414,40 @@ async def simple_test(dut):
     for N_id in received_N_ids:
         assert N_id == expected_N_id, print(f'wrong N_id: expected {expected_N_id} but received {N_id}')
 
+    # the model gets the samples that were sent to the DUT and has to find the same events,
+    # the FFT core rounds its twiddle factors, the model calculates the exact DFT, so carriers can differ by one LSB
+    num_sent = np.count_nonzero(np.array(driver.index[:MAX_CLK_CNT]) >= 0)
+    PSS_LOCAL = generate_PSS_tap_file.generate(tb.PSS_LEN, tb.TAP_DW)[1]
+    model = receiver_model.Model(tb.IN_DW, tb.OUT_DW, tb.TAP_DW, tb.PSS_LEN, PSS_LOCAL[0], PSS_LOCAL[1], PSS_LOCAL[2],
+        WINDOW_LEN = tb.WINDOW_LEN, HALF_CP_ADVANCE = HALF_CP_ADVANCE, LLR_DW = tb.LLR_DW, NFFT = NFFT, MULT_REUSE = tb.MULT_REUSE,
+        CLK_FREQ = tb.CLK_FREQ, INITIAL_DETECTION_SHIFT = tb.INITIAL_DETECTION_SHIFT, INITIAL_CFO_MODE = tb.INITIAL_CFO_MODE,
+        HAS_CFO_COR = tb.HAS_CFO_COR, MULT_REUSE_FFT = tb.MULT_REUSE_FFT)
+    model_result = model.process(tdata[:num_sent])
+    assert np.array_equal(model_result['peak_pos'], received)
+    assert np.array_equal(model_result['N_id'], received_N_ids)
+    assert np.array_equal(model_result['N_id_1'], monitor['N_id_1']['N_id_1'])
+    assert np.array_equal(model_result['ibar_SSB'], received_ibar_SSB)
+    for name, received_carriers in [('SSS', received_SSS), ('PBCH', received_PBCH)]:
+        assert len(model_result[name]) == len(received_carriers), print(f'model and DUT have a different number of {name} carriers')
+        deviation = model_result[name] - np.array(received_carriers)
+        assert max(np.abs(deviation.real).max(), np.abs(deviation.imag).max()) <= 1, print(f'{name} carriers differ from the model')
+    assert len(model_result['llr']) == len(received_PBCH_LLR)
+    assert len(model_result['rgs']) == num_rgs_symbols
+    assert np.array_equal(model_result['rgs'][:, 0] & 0xFF, received_rgs.blk_exp())
+    deviation = iq_codec.decode(model_result['rgs'][:, 1 + NUM_TIMESTAMP_SAMPLES:], FFT_OUT_DW) - received_rgs.iq()
+    assert max(np.abs(deviation.real).max(), np.abs(deviation.imag).max()) <= 1
+
     # verify received SSS sequence
-    corr = np.zeros(335)
-    for i in range(335):
-        sss = py3gpp.nrSSS(i * 3 + expected_N_id_2)
-        corr[i] = np.abs(np.vdot(sss, received_SSS[:SSS_LEN]))
-    detected_N_id_1 = np.argmax(corr)
+    candidates, corr, margin = sss_codebook.detect(np.reshape(received_SSS, (len(received_SSS) // SSS_LEN, SSS_LEN)), expected_N_id_2)
+    print(f'SSS N_id_1 candidates = {candidates[:, 0]}, margin = {margin}')
+    detected_N_id_1 = candidates[0, 0]
     assert detected_N_id_1 == expected_N_id_1
     detected_N_id = detected_N_id_1 * 3 + expected_N_id_2
 
     # verify received ressource_grid_subscriber
-    def extract_timestamp(packet):
-        ts = 0
-        samples = packet[1:][:NUM_TIMESTAMP_SAMPLES]
-        for i in range(NUM_TIMESTAMP_SAMPLES):
-            ts += int(samples[i].real) << int(FFT_OUT_DW * i)
-        return ts
-
-    timestamp = extract_timestamp(received_rgs[0, :])
+    timestamps = received_rgs.timestamp().astype(np.int64)
     for i in range(1, num_rgs_symbols):
-        delta_samples = extract_timestamp(received_rgs[i, :]) - timestamp
+        delta_samples = timestamps[i] - timestamps[i - 1]
         # print(f'delta_samples = {delta_samples}')
         corr_factor = 2 ** (NFFT - 8)
         if expect_exact_timing:
@@ -433,7 +455,6 @@ async def simple_test(dut):
         else:
             if delta_samples not in [274 * corr_factor, 276 * corr_factor]:
                 print(f'timing deviation: delta_samples = {delta_samples}')
-        timestamp = extract_timestamp(received_rgs[i, :])
 
     # verify channel_estimator and demap
     # try to decode PBCH
@@ -449,20 +470,13 @@ async def simple_test(dut):
 
         E = 864
         v = ibar_SSB
-        scrambling_seq = py3gpp.nrPBCHPRBS(detected_N_id, v, E)
+        scrambling_seq = pbch_sequences.scrambling_bits(detected_N_id, v, E)
         scrambling_seq_bpsk = (-1) * scrambling_seq * 2 + 1
         pbchBits_descrambled = pbchBits * scrambling_seq_bpsk
 
-        A = 32
-        P = 24
-        K = A+P
-        N = 512 # calculated according to Section 5.3.1 of 3GPP TS 38.212
-        decIn = py3gpp.nrRateRecoverPolar(pbchBits_descrambled, K, N, False, discardRepetition=False)
-        decoded = py3gpp.nrPolarDecode(decIn, K, 0, 0)
-
-        # check CRC
+        # rate recovery, polar decoding (K = 56, N = 512) and CRC-24C check
+        decoded, crc_result = polar_codec.decode(pbchBits_descrambled)
         print(decoded)
-        _, crc_result = py3gpp.nrCRCDecode(decoded, '24C')
         if crc_result == 0:
             print('nrPolarDecode: PBCH CRC ok')
         else:
@@ -581,26 +595,13 @@ def test(IN_DW, OUT_DW, TAP_DW, WINDOW_LEN, CFO, HALF_CP_ADVANCE, USE_TAP_FILE,
     # the following parameters don't appear in the filename
     parameters['HAS_CFO_COR'] = HAS_CFO_COR
 
-    # prepare FFT_demod taps
-    FFT_LEN = 2 ** NFFT
-    CP_LEN = int(18 * FFT_LEN / 256)  # TODO: only CP2 supported so far! another lut for CP1 symbols is needed or use same CP_ADVANCE for CP1.
-    CP_ADVANCE = CP_LEN // 2
+    # prepare FFT_demod taps, CP1 symbols use the CP2 lut because FFT_demod starts the FFT window of every symbol
+    # CP2 / 2 samples before the end of the CP, see test_generate_FFT_demod_tap_file.py
     FFT_OUT_DW = 16
-    file_path = os.path.abspath(os.path.join(tests_dir, '../tools/generate_FFT_demod_tap_file.py'))
-    spec = importlib.util.spec_from_file_location("generate_FFT_demod_tap_file", file_path)
-    generate_FFT_demod_tap_file = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(generate_FFT_demod_tap_file)
-    generate_FFT_demod_tap_file.main(['--NFFT', str(NFFT),'--CP_LEN', str(CP_LEN), '--CP_ADVANCE', str(CP_ADVANCE),
-                                      '--OUT_DW', str(FFT_OUT_DW), '--path', sim_build])
+    generate_FFT_demod_tap_file.link_lut_files(NFFT, HALF_CP_ADVANCE, FFT_OUT_DW, sim_build)
 
     # prepare PSS_correlator taps
-    for N_id_2 in range(3):
-        os.makedirs(sim_build, exist_ok=True)
-        file_path = os.path.abspath(os.path.join(tests_dir, '../tools/generate_PSS_tap_file.py'))
-        spec = importlib.util.spec_from_file_location("generate_PSS_tap_file", file_path)
-        generate_PSS_tap_file = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(generate_PSS_tap_file)
-        generate_PSS_tap_file.main(['--PSS_LEN', str(PSS_LEN),'--TAP_DW', str(TAP_DW), '--N_id_2', str(N_id_2), '--path', sim_build])
+    generate_PSS_tap_file.link_tap_files(PSS_LEN, TAP_DW, sim_build)
 
     extra_env = {f'PARAM_{k}': str(v) for k, v in parameters.items()}
 
@@ -609,7 +610,7 @@ def test(IN_DW, OUT_DW, TAP_DW, WINDOW_LEN, CFO, HALF_CP_ADVANCE, USE_TAP_FILE,
         compile_args = ['--no-timing', '-Wno-fatal', '-Wno-width', '-Wno-PINMISSING', '-y', tests_dir + '/../submodules/verilator-unisims']
     else:
         compile_args = ['-sglbl', '-y' + unisim_dir]
-    cocotb_test.simulator.run(
+    sim_build_cache.run(
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
         includes=includes,
@@ -619,7 +620,6 @@ def test(IN_DW, OUT_DW, TAP_DW, WINDOW_LEN, CFO, HALF_CP_ADVANCE, USE_TAP_FILE,
         sim_build=sim_build,
         extra_env=extra_env,
         testcase='simple_test',
-        force_compile=True,
         waves = os.environ.get('WAVES') == '1',
         defines = ['LUT_PATH=\"../../tests\"'],   # used by DDS core
         compile_args = compile_args
@@ -655,6 +655,69 @@ def test_NFFT9_7680KSPS_recording(FILE, HALF_CP_ADVANCE, MULT_REUSE, RND_JITTER,
         NFFT = 9, MULT_REUSE = MULT_REUSE, INITIAL_DETECTION_SHIFT = 3, INITIAL_CFO_MODE = 1, RND_JITTER = RND_JITTER, FILE = FILE,
         HAS_CFO_COR = HAS_CFO_COR)
 
+@pytest.mark.parametrize('NFFT', [8, 9])
+def test_model(NFFT):
+    # synthetic capture with 4 frames, the PSS, SSS and PBCH of N_id are in subframe 0 of every frame,
+    # QPSK data in all other symbols and some noise everywhere, so that the correlators only see the PSS
+    N_id = 3 * 17 + 1
+    FFT_LEN = 2 ** NFFT
+    SAMPLE_RATE = 3840000 * FFT_LEN // 256
+    NUM_FRAMES = 4
+    SYMS_PER_FRAME = 14 * 20
+    FIRST_SYMBOL = 200
+    rng = np.random.default_rng(1)
+    qpsk = lambda num: (rng.integers(0, 2, num) * 2 - 1 + 1j * (rng.integers(0, 2, num) * 2 - 1)) / np.sqrt(2)
+    waveform = []
+    for k in range(FIRST_SYMBOL, FIRST_SYMBOL + NUM_FRAMES * SYMS_PER_FRAME):
+        carriers = np.zeros(FFT_LEN, 'complex')
+        symbol = k % SYMS_PER_FRAME
+        if symbol == 2:
+            carriers[FFT_LEN // 2 - 64:][:127] = py3gpp.nrPSS(N_id % 3)
+        elif symbol == 4:
+            carriers[FFT_LEN // 2 - 64:][:127] = py3gpp.nrSSS(N_id)
+        else:
+            carriers[FFT_LEN // 2 - 120:][:240] = qpsk(240)
+        data = np.fft.ifft(np.fft.ifftshift(carriers)) * FFT_LEN
+        CP_len = (20 if k % 7 == 0 else 18) * FFT_LEN // 256
+        waveform.append(np.concatenate((data[-CP_len:], data)))
+    waveform = np.concatenate(waveform) * 400 * np.sqrt(256 / FFT_LEN)
+    waveform += 20 * (rng.standard_normal(len(waveform)) + 1j * rng.standard_normal(len(waveform)))
+    samples = (np.round(waveform.real).astype(np.int64) & 0xFFFF) | ((np.round(waveform.imag).astype(np.int64) & 0xFFFF) << 16)
+
+    spec = importlib.util.spec_from_file_location('receiver_model', os.path.join(tests_dir, '../model/receiver.py'))
+    receiver_model = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(receiver_model)
+    PSS_LEN = 128
+    TAP_DW = 32
+    PSS_LOCAL = generate_PSS_tap_file.generate(PSS_LEN, TAP_DW)[1]
+    model = receiver_model.Model(32, 32, TAP_DW, PSS_LEN, PSS_LOCAL[0], PSS_LOCAL[1], PSS_LOCAL[2], NFFT = NFFT,
+        INITIAL_DETECTION_SHIFT = 3)
+    result = model.process(samples)
+
+    # peak_pos is one sample after the first CP sample of the PSS symbol
+    CP_lens = np.where(np.arange(FIRST_SYMBOL, SYMS_PER_FRAME + 2) % 7 == 0, 20, 18) * FFT_LEN // 256
+    first_PSS = np.sum(CP_lens) + len(CP_lens) * FFT_LEN + 1
+    assert np.array_equal(result['peak_pos'], first_PSS + np.arange(NUM_FRAMES) * SAMPLE_RATE // 50)
+    assert np.all(result['N_id_2'] == N_id % 3)
+    assert np.all(result['CFO_DDS_inc'] == 0)
+    assert len(result['N_id']) == NUM_FRAMES
+    assert np.all(result['N_id'] == N_id)
+    assert np.all(result['N_id_1'] == N_id // 3)
+    # there is no CFO and no multipath, so the SSS carriers have the signs of the transmitted sequence
+    SSS = np.reshape(result['SSS'], (NUM_FRAMES, 127))
+    assert np.all(np.sign(SSS.real) == py3gpp.nrSSS(N_id))
+    assert len(result['PBCH']) == NUM_FRAMES * 3 * 240
+
+    # the ressource grid starts with the first PSS symbol, every symbol starts FFT_LEN + CP samples after the previous
+    # one, except for the later PSS symbols, for them frame_sync signals sample_id_valid one clock cycle earlier
+    rgs = result['rgs']
+    timestamps = sum(rgs[:, 1 + i].astype(np.int64) << (16 * i) for i in range(4))
+    symbols = np.arange(len(rgs)) + 2
+    symbol_lens = FFT_LEN + np.where(symbols % 7 == 0, 20, 18) * FFT_LEN // 256
+    expected = timestamps[0] + np.concatenate(([0], np.cumsum(symbol_lens)[:-1])) - ((symbols % SYMS_PER_FRAME == 2) & (symbols > 2))
+    assert len(rgs) > (NUM_FRAMES - 1) * SYMS_PER_FRAME
+    assert np.array_equal(timestamps, expected)
+
 if __name__ == '__main__':
     os.environ['SIM'] = 'verilator'
     os.environ['PLOTS'] = '1'
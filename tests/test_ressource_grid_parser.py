@@ -0,0 +1,57 @@
+import numpy as np
+import os
+import pytest
+import importlib.util
+import tempfile
+import threading
+
+tests_dir = os.path.abspath(os.path.dirname(__file__))
+spec = importlib.util.spec_from_file_location('ressource_grid_parser', os.path.join(tests_dir, '../tools/ressource_grid_parser.py'))
+ressource_grid_parser = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ressource_grid_parser)
+
+@pytest.mark.parametrize('PIPE', [0, 1])
+def test_ressource_grid_parser(PIPE):
+    # synthetic ressource_grid_framer output with one full and one partial DMA block, read back with FileBuffer
+    # from a regular file (memory mapped) or from a named pipe
+    SYMBOL_LEN = 300
+    NUM_SYMBOLS = ressource_grid_parser.SYMBOLS_PER_FRAME + 10
+    rng = np.random.default_rng(0)
+    # the upper bits of the blk_exp word are not part of blk_exp
+    blk_exp_words = rng.integers(0, 16, NUM_SYMBOLS) | (rng.integers(0, 256, NUM_SYMBOLS) << 8)
+    timestamps = 2 ** 40 + np.arange(NUM_SYMBOLS, dtype = np.uint64) * 274 + rng.integers(0, 2 ** 32, NUM_SYMBOLS).astype(np.uint64)
+    re = rng.integers(-128, 128, (NUM_SYMBOLS, SYMBOL_LEN))
+    im = rng.integers(-128, 128, (NUM_SYMBOLS, SYMBOL_LEN))
+    timestamp_words = [(timestamps >> np.uint64(16 * i)) & np.uint64(0xFFFF) for i in range(4)]
+    rgs = np.column_stack([blk_exp_words] + timestamp_words + [(re & 0xFF) | ((im & 0xFF) << 8)])
+
+    def write(filename):
+        # tofile() does not work with pipes, because it needs the file position
+        with open(filename, 'wb') as f:
+            f.write(np.asarray(rgs, '<u2').tobytes())
+
+    with tempfile.TemporaryDirectory() as path:
+        filename = os.path.join(path, 'rgs')
+        if PIPE:
+            os.mkfifo(filename)
+            writer = threading.Thread(target = write, args = (filename,))
+            writer.start()
+        else:
+            write(filename)
+        blocks = []
+        with ressource_grid_parser.FileBuffer(filename, SYMBOL_LEN) as buffer:
+            assert (buffer.mmap is None) == bool(PIPE)
+            for symbols in buffer:
+                # like with IIO, a block is only valid until the next refill()
+                blocks.append((len(symbols), ressource_grid_parser.timestamp(symbols).copy(), ressource_grid_parser.blk_exp(symbols),
+                    ressource_grid_parser.iq(symbols), ressource_grid_parser.iq(symbols, scale = False)))
+                del symbols
+        if PIPE:
+            writer.join()
+
+    assert [block[0] for block in blocks] == [ressource_grid_parser.SYMBOLS_PER_FRAME, 10]
+    blk_exp = blk_exp_words & 0xFF
+    assert np.array_equal(np.concatenate([block[1] for block in blocks]), timestamps)
+    assert np.array_equal(np.concatenate([block[2] for block in blocks]), blk_exp)
+    assert np.array_equal(np.concatenate([block[3] for block in blocks]), (re + 1j * im) / 2.0 ** blk_exp[:, None])
+    assert np.array_equal(np.concatenate([block[4] for block in blocks]), re + 1j * im)
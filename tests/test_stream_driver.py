@@ -0,0 +1,59 @@
+import numpy as np
+import os
+import pytest
+import importlib.util
+
+tests_dir = os.path.abspath(os.path.dirname(__file__))
+spec = importlib.util.spec_from_file_location('stream_driver', os.path.join(tests_dir, '../tools/stream_driver.py'))
+stream_driver = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stream_driver)
+
+def inline_schedule(num_samples, EXTRA_IDLE_CLKS, random_seq, num_clks):
+    '''
+    sample index for every clock cycle like the valid / idle logic that simple_test in test_receiver.py had inline
+    before it used StreamDriver, -1 means s_axis_in_tvalid = 0
+    '''
+    index = np.full(num_clks, -1, int)
+    clk_div = 0
+    tx_cnt = 0
+    random_extra_cycle = 0
+    for clk_cnt in range(num_clks):
+        if (tx_cnt < num_samples) and (clk_div == 0 or EXTRA_IDLE_CLKS == 0):
+            clk_div += 1
+            index[clk_cnt] = tx_cnt
+            tx_cnt += 1
+        else:
+            if clk_div == EXTRA_IDLE_CLKS + random_extra_cycle:
+                clk_div = 0
+                if random_seq is not None:
+                    random_extra_cycle = random_seq[clk_cnt % len(random_seq)]
+            else:
+                clk_div += 1
+    return index
+
+@pytest.mark.parametrize('EXTRA_IDLE_CLKS', [0, 1, 3])
+@pytest.mark.parametrize('RND_JITTER', [0, 1])
+@pytest.mark.parametrize('NUM_SAMPLES', [1, 100, 5000])
+def test_schedule(EXTRA_IDLE_CLKS, RND_JITTER, NUM_SAMPLES):
+    # 126 bits with as many 0s as 1s, like the sequence simple_test in test_receiver.py uses
+    rng = np.random.default_rng(0)
+    random_seq = rng.permutation(np.repeat([0, 1], 63)) if RND_JITTER else None
+    num_clks = NUM_SAMPLES * (2 + EXTRA_IDLE_CLKS) + 10
+    expected = inline_schedule(NUM_SAMPLES, EXTRA_IDLE_CLKS, random_seq, num_clks)
+    index = stream_driver.schedule(NUM_SAMPLES, EXTRA_IDLE_CLKS, random_seq)
+    assert np.array_equal(index, expected[:len(index)])
+    # the schedule ends with the last sample
+    assert index[-1] == NUM_SAMPLES - 1
+    assert np.all(expected[len(index):] == -1)
+
+@pytest.mark.parametrize('DELAY', [0, 5])
+def test_schedule_delay(DELAY):
+    random_seq = np.array([1, 0, 0, 1, 1, 0, 1])
+    index = stream_driver.schedule(200, 2, random_seq, DELAY)
+    assert np.all(index[:DELAY] == -1)
+    assert index[DELAY] == 0
+    # with DELAY the jitter sequence is indexed with the absolute clock cycle, like without DELAY
+    starts = np.flatnonzero(index >= 0)
+    extra = np.diff(starts) - 3
+    assert np.array_equal(extra[1:], random_seq[(starts[1:-1] - 1) % len(random_seq)])
+    assert extra[0] == 0
@@ -0,0 +1,130 @@
+import argparse
+import hashlib
+import shutil
+import fcntl
+import json
+import sys
+import os
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'open5G_phy', 'artifacts')
+
+class ArtifactStore:
+    '''
+    Shared, content addressed store for generated files like tap and LUT hex files
+
+    get() looks up a file by its kind, the parameters it was generated with and the content of the generator
+    source file. If it does not exist yet, create() is called once and the content is stored under its sha256
+    in objects/, index/ maps the parameter hash to the content hash. A lock file per parameter hash makes
+    parallel pytest workers wait for the one worker that generates the file.
+    link() puts a hard link to the stored file where the simulator expects it, e.g. into sim_build.
+    Objects are read only, link() always replaces the destination instead of writing into it.
+    The store directory can be set with the environment variable ARTIFACT_STORE_DIR,
+    ARTIFACT_STORE=0 writes every file directly to its destination without the store.
+    '''
+    def __init__(self, path = None):
+        self.path = path or os.environ.get('ARTIFACT_STORE_DIR', DEFAULT_STORE_DIR)
+        self.enabled = os.environ.get('ARTIFACT_STORE', '1') != '0'
+
+    def key(self, kind, source_file = None, **params):
+        """hash of the kind, all parameters and the content of the generator source file"""
+        description = {'kind': kind, 'params': params}
+        if source_file is not None:
+            with open(source_file, 'rb') as f:
+                description['source'] = hashlib.sha256(f.read()).hexdigest()
+        return hashlib.sha256(json.dumps(description, sort_keys = True, default = str).encode()).hexdigest()
+
+    def _write(self, filename, content):
+        tmp_filename = filename + f'.{os.getpid()}.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_filename, filename)
+
+    def get(self, kind, create, source_file = None, **params):
+        """path of the stored file, create() returns the content as str or bytes and is only called if needed"""
+        key = self.key(kind, source_file, **params)
+        for subdir in ('objects', 'index', 'locks'):
+            os.makedirs(os.path.join(self.path, subdir), exist_ok = True)
+        index_filename = os.path.join(self.path, 'index', key)
+        with open(os.path.join(self.path, 'locks', key + '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(index_filename):
+                    with open(index_filename) as f:
+                        object_filename = os.path.join(self.path, 'objects', f.read().strip())
+                    if os.path.exists(object_filename):
+                        return object_filename
+                content = create()
+                if isinstance(content, str):
+                    content = content.encode()
+                digest = hashlib.sha256(content).hexdigest()
+                object_filename = os.path.join(self.path, 'objects', digest)
+                if not os.path.exists(object_filename):
+                    # objects are shared by all parameter sets with the same content
+                    self._write(object_filename, content)
+                    os.chmod(object_filename, 0o444)
+                self._write(index_filename, digest.encode())
+                print(f'artifact store: created {kind} {params} -> {digest[:16]}')
+                return object_filename
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def link(self, dest, kind, create, source_file = None, **params):
+        """make the file available at dest as hard link to the stored file, a copy is made if linking fails"""
+        dest_dir = os.path.dirname(dest)
+        if dest_dir != '':
+            os.makedirs(dest_dir, exist_ok = True)
+        if not self.enabled:
+            content = create()
+            self._write(dest, content.encode() if isinstance(content, str) else content)
+            return dest
+        object_filename = self.get(kind, create, source_file, **params)
+        if os.path.exists(dest) and os.path.samefile(dest, object_filename):
+            return dest
+        tmp_dest = dest + f'.{os.getpid()}.tmp'
+        try:
+            os.link(object_filename, tmp_dest)
+        except OSError:
+            # e.g. the store is on another file system
+            shutil.copyfile(object_filename, tmp_dest)
+        os.replace(tmp_dest, dest)
+        return dest
+
+    def clear(self):
+        for subdir in ('objects', 'index', 'locks'):
+            shutil.rmtree(os.path.join(self.path, subdir), ignore_errors = True)
+
+_STORE = None
+
+def default_store():
+    global _STORE
+    if _STORE is None:
+        _STORE = ArtifactStore()
+    return _STORE
+
+def link(dest, kind, create, source_file = None, **params):
+    """ArtifactStore.link() of the default store"""
+    return default_store().link(dest, kind, create, source_file, **params)
+
+def main(args):
+    print(sys.argv)
+
+    parser = argparse.ArgumentParser(description='Shows or clears the artifact store')
+    parser.add_argument('--path', metavar='path', required=False, default = None, help='store directory')
+    parser.add_argument('--clear', action='store_true', help='delete all files')
+    args = parser.parse_args(args)
+
+    store = ArtifactStore(args.path)
+    if not os.path.isdir(store.path):
+        print(f'{store.path} does not exist')
+        return
+    if args.clear:
+        store.clear()
+    objects_dir = os.path.join(store.path, 'objects')
+    objects = os.listdir(objects_dir) if os.path.isdir(objects_dir) else []
+    index_dir = os.path.join(store.path, 'index')
+    num_index = len(os.listdir(index_dir)) if os.path.isdir(index_dir) else 0
+    size = sum(os.path.getsize(os.path.join(objects_dir, name)) for name in objects)
+    print(f'{store.path}: {num_index} parameter sets, {len(objects)} files, {size} bytes')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,21 +1,91 @@
 import numpy as np
+import importlib.util
 import argparse
 import sys
 import os
 
-def create_lut_file(NFFT, CP_LEN, CP_ADVANCE, OUT_DW, path):
-    FFT_demod_taps = np.empty(2 ** NFFT, int)
+spec = importlib.util.spec_from_file_location('artifact_store', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifact_store.py'))
+artifact_store = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(artifact_store)
+
+def _phase_luts(NFFT, CP_LEN, CP_ADVANCE, OUT_DW, length):
+    """taps of several luts in one pass, the parameters are arrays with one entry per lut, indices >= 2 ** NFFT are 0"""
+    NFFT, CP_LEN, CP_ADVANCE = (np.asarray(x, int)[:, None] for x in (NFFT, CP_LEN, CP_ADVANCE))
+    i = np.arange(length)[None, :]
     angle_step = 2 * np.pi * (CP_LEN - CP_ADVANCE) / (2 ** NFFT)
     const_angle = np.pi * (CP_LEN - CP_ADVANCE)
-    for i in range(2 ** NFFT):
-        FFT_demod_taps[i] = int((np.cos(angle_step * i + const_angle) * (2 ** (OUT_DW // 2 - 1) - 1))) & (2 ** (OUT_DW // 2) - 1)
-        tmp = int((np.sin(angle_step * i + const_angle) * (2 ** (OUT_DW // 2 - 1) - 1))) & (2 ** (OUT_DW // 2) - 1)
-        # print(f'{FFT_demod_taps[i]} = {np.cos(angle_step * i + np.pi * (CP_LEN - CP_ADVANCE))}')
-        FFT_demod_taps[i] |= tmp << (OUT_DW // 2)
-    filename = f'FFT_demod_taps_{int(NFFT)}_{int(CP_LEN)}_{int(CP_ADVANCE)}_{int(OUT_DW)}.hex'
+    angle = angle_step * i + const_angle
+    MAX = 2 ** (OUT_DW // 2 - 1) - 1
+    MASK = 2 ** (OUT_DW // 2) - 1
+    real = np.trunc(np.cos(angle) * MAX).astype(int) & MASK
+    imag = np.trunc(np.sin(angle) * MAX).astype(int) & MASK
+    return np.where(i < 2 ** NFFT, real | (imag << (OUT_DW // 2)), 0)
+
+def create_lut(NFFT, CP_LEN, CP_ADVANCE, OUT_DW):
+    """phase correction taps for all 2 ** NFFT carriers, imaginary part in the upper OUT_DW // 2 bits"""
+    return _phase_luts([NFFT], [CP_LEN], [CP_ADVANCE], OUT_DW, 2 ** NFFT)[0]
+
+def CP_lengths(NFFT):
+    """CP1 (first symbol of every half subframe) and CP2 length in samples like FFT_demod.sv"""
+    return 20 * 2 ** NFFT // 256, 18 * 2 ** NFFT // 256
+
+def CP_advance(NFFT, CP_LEN, HALF_CP_ADVANCE):
+    """number of CP samples that FFT_demod.sv skips, with HALF_CP_ADVANCE the FFT starts CP2 / 2 samples before the symbol"""
+    return CP_LEN - CP_lengths(NFFT)[1] // 2 if HALF_CP_ADVANCE else CP_LEN
+
+def create_luts(NFFT = (8, 9, 10, 11), HALF_CP_ADVANCE = (0, 1), OUT_DW = 16):
+    '''
+    luts for CP1 and CP2 symbols of all NFFT and HALF_CP_ADVANCE settings, calculated in one vectorized pass
+
+    Returns a dict {(NFFT, HALF_CP_ADVANCE, CP_LEN): (CP_ADVANCE, taps)}. FFT_demod.sv starts the FFT window of CP1
+    and CP2 symbols CP2 / 2 samples before the end of the CP, so both luts of a setting have the same taps,
+    they only differ in the file name and FFT_demod.sv only loads the CP2 lut.
+    Without HALF_CP_ADVANCE no correction is needed and all taps are 1.
+    '''
+    keys = [(int(n), int(h), CP_LEN) for n in np.atleast_1d(NFFT) for h in np.atleast_1d(HALF_CP_ADVANCE)
+        for CP_LEN in CP_lengths(int(n))]
+    CP_ADVANCE = [CP_advance(n, CP_LEN, h) for n, h, CP_LEN in keys]
+    luts = _phase_luts([k[0] for k in keys], [k[2] for k in keys], CP_ADVANCE, OUT_DW, 2 ** max(k[0] for k in keys))
+    return {key: (advance, lut[:2 ** key[0]]) for key, advance, lut in zip(keys, CP_ADVANCE, luts)}
+
+def lut_filename(NFFT, CP_LEN, CP_ADVANCE, OUT_DW):
+    return f'FFT_demod_taps_{int(NFFT)}_{int(CP_LEN)}_{int(CP_ADVANCE)}_{int(OUT_DW)}.hex'
+
+def hex_file(taps):
+    """content of a lut file for $readmemh, same format as np.savetxt(fmt = '%x')"""
+    return ''.join(f'{tap:x}\n' for tap in np.asarray(taps).tolist())
+
+def lut_file_content(NFFT, CP_LEN, CP_ADVANCE, OUT_DW):
+    return hex_file(create_lut(NFFT, CP_LEN, CP_ADVANCE, OUT_DW))
+
+def create_lut_file(NFFT, CP_LEN, CP_ADVANCE, OUT_DW, path):
+    if not path == '':
+        os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, lut_filename(NFFT, CP_LEN, CP_ADVANCE, OUT_DW)), 'w') as f:
+        f.write(lut_file_content(NFFT, CP_LEN, CP_ADVANCE, OUT_DW))
+
+def link_lut_file(NFFT, CP_LEN, CP_ADVANCE, OUT_DW, path):
+    """like create_lut_file(), but the file is generated once in the artifact store and hard linked to path"""
+    return artifact_store.link(os.path.join(path, lut_filename(NFFT, CP_LEN, CP_ADVANCE, OUT_DW)), 'FFT_demod_taps',
+        lambda: lut_file_content(NFFT, CP_LEN, CP_ADVANCE, OUT_DW), os.path.abspath(__file__),
+        NFFT = int(NFFT), CP_LEN = int(CP_LEN), CP_ADVANCE = int(CP_ADVANCE), OUT_DW = int(OUT_DW))
+
+def create_lut_files(path, NFFT = (8, 9, 10, 11), HALF_CP_ADVANCE = (0, 1), OUT_DW = 16):
+    """write the CP1 and CP2 luts of all NFFT and HALF_CP_ADVANCE settings to path"""
     if not path == '':
         os.makedirs(path, exist_ok=True)
-    np.savetxt(os.path.join(path, filename), FFT_demod_taps.T, fmt = '%x', delimiter = ' ')
+    for (NFFT_, _, CP_LEN), (CP_ADVANCE, taps) in create_luts(NFFT, HALF_CP_ADVANCE, OUT_DW).items():
+        with open(os.path.join(path, lut_filename(NFFT_, CP_LEN, CP_ADVANCE, OUT_DW)), 'w') as f:
+            f.write(hex_file(taps))
+
+def link_lut_files(NFFT, HALF_CP_ADVANCE, OUT_DW, path):
+    """link the CP2 lut that FFT_demod.sv loads into path and the CP1 lut if its taps are different, returns the file names"""
+    CP1_LEN, CP2_LEN = CP_lengths(NFFT)
+    luts = create_luts(NFFT, HALF_CP_ADVANCE, OUT_DW)
+    CP_LENS = [CP2_LEN]
+    if not np.array_equal(luts[(NFFT, HALF_CP_ADVANCE, CP1_LEN)][1], luts[(NFFT, HALF_CP_ADVANCE, CP2_LEN)][1]):
+        CP_LENS.append(CP1_LEN)
+    return [link_lut_file(NFFT, CP_LEN, CP_advance(NFFT, CP_LEN, HALF_CP_ADVANCE), OUT_DW, path) for CP_LEN in CP_LENS]
 
 def main(args):
     print(sys.argv)
@@ -26,9 +96,13 @@ def main(args):
     parser.add_argument('--CP_LEN', metavar='CP_LEN', required=False, default = 8, help='CP length in number of samples')
     parser.add_argument('--CP_ADVANCE', metavar='CP_ADVANCE', required=False, default = 8, help='CP advance in number of samples')
     parser.add_argument('--OUT_DW', metavar='OUT_DW', required=False, default = 8, help='Data width of output')
+    parser.add_argument('--all', action='store_true', help='create the CP1 and CP2 luts for NFFT 8 .. 11 and both HALF_CP_ADVANCE settings')
     args = parser.parse_args(args)
 
-    create_lut_file(int(args.NFFT), int(args.CP_LEN), int(args.CP_ADVANCE), int(args.OUT_DW), args.path)
+    if args.all:
+        create_lut_files(args.path, OUT_DW = int(args.OUT_DW))
+    else:
+        create_lut_file(int(args.NFFT), int(args.CP_LEN), int(args.CP_ADVANCE), int(args.OUT_DW), args.path)
 
 if __name__ == "__main__":
     main(sys.argv[1:])
\ No newline at end of file
@@ -1,22 +1,80 @@
 import numpy as np
+import importlib.util
+import functools
 import argparse
 import sys
 import os
 import py3gpp
 
+spec = importlib.util.spec_from_file_location('artifact_store', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifact_store.py'))
+artifact_store = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(artifact_store)
+
+def taps(PSS_LEN, TAP_DW, N_id_2 = (0, 1, 2), MAX_TAP = None):
+    '''
+    complex PSS correlator taps with shape (len(N_id_2), PSS_LEN)
+
+    The taps are the time domain PSS of every N_id_2, scaled so that the largest real or imaginary part is MAX_TAP.
+    The default for MAX_TAP is 2 ** (TAP_DW // 2 - 1) - 1.
+    '''
+    if MAX_TAP is None:
+        MAX_TAP = 2 ** (TAP_DW // 2 - 1) - 1
+    PSS = np.zeros((len(N_id_2), PSS_LEN), 'complex')
+    PSS[:, 0:-1] = [py3gpp.nrPSS(int(i)) for i in N_id_2]
+    taps = np.fft.ifft(np.fft.fftshift(PSS, axes = -1), axis = -1)
+    taps /= np.maximum(taps.real.max(axis = -1), taps.imag.max(axis = -1))[:, None]
+    return taps * MAX_TAP
+
+def pack(taps, TAP_DW, ROUND = False):
+    """tap words with the imaginary part in the upper half, the parts are truncated or rounded to integers"""
+    to_int = np.round if ROUND else np.trunc
+    MASK = 2 ** (TAP_DW // 2) - 1
+    return ((to_int(taps.imag).astype(np.int64) & MASK) << (TAP_DW // 2)) + (to_int(taps.real).astype(np.int64) & MASK)
+
+def PSS_local(words, TAP_DW):
+    """PSS_LOCAL parameter of PSS_correlator.sv, tap i is in bits TAP_DW * i .. TAP_DW * (i + 1) - 1"""
+    words = np.asarray(words, np.int64)
+    if TAP_DW % 8 == 0:
+        return int.from_bytes(words.astype('<u8').view(np.uint8).reshape(-1, 8)[:, :TAP_DW // 8].tobytes(), 'little')
+    return sum(int(word) << (TAP_DW * i) for i, word in enumerate(words))
+
+def hex_file(words):
+    """content of a tap file for $readmemh, same format as np.savetxt(fmt = '%x')"""
+    return ''.join(f'{int(word):x}\n' for word in words)
+
+@functools.lru_cache(maxsize = None)
+def generate(PSS_LEN, TAP_DW, N_id_2 = (0, 1, 2), MAX_TAP = None, ROUND = False):
+    '''
+    hex file contents and PSS_LOCAL parameters of all N_id_2 in one call, the result is memoized
+
+    Returns two tuples with one entry per N_id_2. Like create_tap_file() always did, the tap files contain
+    truncated taps, ROUND only selects rounding for PSS_LOCAL.
+    '''
+    N_id_2 = tuple(int(i) for i in np.atleast_1d(N_id_2))
+    scaled = taps(PSS_LEN, TAP_DW, N_id_2, MAX_TAP)
+    words = pack(scaled, TAP_DW)
+    local_words = pack(scaled, TAP_DW, ROUND) if ROUND else words
+    return tuple(hex_file(w) for w in words), tuple(PSS_local(w, TAP_DW) for w in local_words)
+
+def create_tap_files(PSS_LEN, TAP_DW, path, N_id_2 = (0, 1, 2), MAX_TAP = None):
+    """write PSS_taps_<N_id_2>.hex for all N_id_2 to path"""
+    contents, _ = generate(PSS_LEN, TAP_DW, tuple(N_id_2), MAX_TAP)
+    for i, content in zip(N_id_2, contents):
+        with open(os.path.join(path, f'PSS_taps_{int(i)}.hex'), 'w') as f:
+            f.write(content)
+
 def create_tap_file(PSS_LEN, TAP_DW, N_id_2, path):
-    PSS = np.zeros(PSS_LEN, 'complex')
-    PSS[0:-1] = py3gpp.nrPSS(N_id_2)
-    taps = np.fft.ifft(np.fft.fftshift(PSS))
-    taps /= max(taps.real.max(), taps.imag.max())
-    taps *= 2 ** (TAP_DW // 2 - 1) - 1
-
-    PSS_taps = np.empty(PSS_LEN, int)
-    for i in range(len(taps)):
-        PSS_taps[i] = ((int(np.imag(taps[i])) & (2 ** (TAP_DW // 2) - 1)) << (TAP_DW // 2)) \
-                                + (int(np.real(taps[i])) & (2 ** (TAP_DW // 2) - 1))
-    filename = f'PSS_taps_{int(N_id_2)}.hex'
-    np.savetxt(os.path.join(path, filename), PSS_taps.T, fmt = '%x', delimiter = ' ')
+    create_tap_files(PSS_LEN, TAP_DW, path, (int(N_id_2),))
+
+def link_tap_files(PSS_LEN, TAP_DW, path, N_id_2 = (0, 1, 2), MAX_TAP = None, filename = 'PSS_taps_{}.hex'):
+    """like create_tap_files(), but every file is generated once in the artifact store and hard linked to path"""
+    N_id_2 = tuple(int(i) for i in np.atleast_1d(N_id_2))
+    filenames = []
+    for k, i in enumerate(N_id_2):
+        create = lambda k = k: generate(PSS_LEN, TAP_DW, N_id_2, MAX_TAP)[0][k]
+        filenames.append(artifact_store.link(os.path.join(path, filename.format(i)), 'PSS_taps', create, os.path.abspath(__file__),
+            PSS_LEN = int(PSS_LEN), TAP_DW = int(TAP_DW), N_id_2 = i, MAX_TAP = MAX_TAP))
+    return filenames
 
 def main(args):
     print(sys.argv)
@@ -31,4 +89,4 @@ def main(args):
     create_tap_file(int(args.PSS_LEN), int(args.TAP_DW), int(args.N_id_2), args.path)
 
 if __name__ == '__main__':
-    main(sys.argv[1:])
\ No newline at end of file
+    main(sys.argv[1:])
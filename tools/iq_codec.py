@@ -0,0 +1,44 @@
+import numpy as np
+
+_LUT_16 = None
+
+def lut_16():
+    """complex64 value of every 16 bit word with 8 bit signed real part in the lower and imaginary part in the upper byte"""
+    global _LUT_16
+    if _LUT_16 is None:
+        words = np.arange(2 ** 16, dtype = np.uint16)
+        _LUT_16 = words.view(np.int8).reshape(-1, 2).astype(np.float32).view(np.complex64)[:, 0]
+        _LUT_16.flags.writeable = False
+    return _LUT_16
+
+def twos_comp(values, bits):
+    """vectorized 2's complement of the lower bits of values"""
+    values = np.asarray(values, np.int64) & ((1 << bits) - 1)
+    return np.where(values >= (1 << (bits - 1)), values - (1 << bits), values)
+
+def decode(words, DW = 16, blk_exp = None):
+    '''
+    complex64 samples from DW bit words with the signed real part in the lower and the imaginary part in the upper half
+
+    16 bit words are decoded with a 65536 entry lookup table, 32 bit words by reinterpreting them as pairs of int16.
+    blk_exp is broadcast along the leading axes of words, i.e. one value per symbol for words with shape
+    (num_symbols, num_carriers) or one value per sample, the result is divided by 2 ** blk_exp.
+    '''
+    words = np.asarray(words)
+    if DW == 16:
+        samples = lut_16()[words.astype(np.int64) & 0xFFFF]
+    elif DW == 32:
+        samples = np.ascontiguousarray(words.astype(np.int64).astype(np.uint32)).view(np.int16) \
+            .reshape(words.shape + (2,)).astype(np.float32).view(np.complex64)[..., 0]
+    else:
+        samples = (twos_comp(words, DW // 2) + 1j * twos_comp(np.asarray(words, np.int64) >> (DW // 2), DW // 2)).astype(np.complex64)
+    if blk_exp is not None:
+        blk_exp = np.asarray(blk_exp)
+        samples = samples / (2.0 ** blk_exp.reshape(blk_exp.shape + (1,) * (samples.ndim - blk_exp.ndim))).astype(np.float32)
+    return samples
+
+def encode(samples, DW = 16):
+    """truncate complex samples to integers and pack them into DW bit words, the imaginary part is in the upper half"""
+    samples = np.asarray(samples)
+    OP_MASK = 2 ** (DW // 2) - 1
+    return (samples.real.astype(np.int64) & OP_MASK) + ((samples.imag.astype(np.int64) & OP_MASK) << (DW // 2))
@@ -0,0 +1,157 @@
+import numpy as np
+import argparse
+import sys
+import os
+
+NUM_N_ID = 1008
+NUM_IBAR_SSB = 8
+PBCH_DMRS_LEN = 144
+E = 864  # number of PBCH bits per SSB
+SCRAMBLING_LEN = NUM_IBAR_SSB * E
+Nc = 1600
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'open5G_phy')
+
+_tables = {}
+_x2_basis = {}
+
+def gold_sequences(c_init, length):
+    '''
+    pseudo random sequences c(n) from 38.211 5.2.1 for an array of c_init, result has shape c_init.shape + (length,)
+
+    x2 is linear in c_init, so it is the xor of the x2 sequences of the set bits of c_init.
+    These 31 basis sequences are calculated once per length, all sequences then need one matrix product.
+    '''
+    c_init = np.asarray(c_init, np.int64)
+    if length not in _x2_basis:
+        x1 = np.zeros(Nc + length + 31, np.uint8)
+        x2 = np.zeros((31, Nc + length + 31), np.uint8)
+        x1[0] = 1
+        x2[np.arange(31), np.arange(31)] = 1
+        for n in range(Nc + length):
+            x1[n + 31] = x1[n + 3] ^ x1[n]
+            x2[:, n + 31] = x2[:, n + 3] ^ x2[:, n + 2] ^ x2[:, n + 1] ^ x2[:, n]
+        _x2_basis[length] = (x1[Nc:][:length], x2[:, Nc:][:, :length].astype(np.float32))
+    x1, basis = _x2_basis[length]
+    bits = ((c_init.reshape(-1, 1) >> np.arange(31)) & 1).astype(np.float32)
+    x2 = (bits @ basis).astype(np.int64) & 1
+    return (x1 ^ x2).astype(np.uint8).reshape(c_init.shape + (length,))
+
+def dmrs_c_init(N_id, ibar_SSB):
+    """c_init of the PBCH DMRS (38.211 7.4.1.4.1), same formula as channel_estimator.sv"""
+    N_id = np.asarray(N_id, np.int64)
+    ibar_SSB = np.asarray(ibar_SSB, np.int64)
+    return (((ibar_SSB + 1) * ((N_id >> 2) + 1)) << 11) + ((ibar_SSB + 1) << 6) + (N_id % 4)
+
+def _create_dmrs():
+    c_init = dmrs_c_init(np.arange(NUM_N_ID)[:, None], np.arange(NUM_IBAR_SSB)[None, :])
+    return np.packbits(gold_sequences(c_init, 2 * PBCH_DMRS_LEN), axis = -1)
+
+def _create_scrambling():
+    return np.packbits(gold_sequences(np.arange(NUM_N_ID), SCRAMBLING_LEN), axis = -1)
+
+def _table(name, create, shape, path = None):
+    '''
+    bit packed table, created on first use and stored as .npy in path, a stored table with another shape is replaced
+
+    The default path is ~/.cache/open5G_phy, it can be changed with the environment variable PBCH_SEQUENCES_DIR.
+    '''
+    if name in _tables:
+        return _tables[name]
+    path = path or os.environ.get('PBCH_SEQUENCES_DIR', DEFAULT_CACHE_DIR)
+    filename = os.path.join(path, f'{name}.npy')
+    data = None
+    if os.path.exists(filename):
+        try:
+            data = np.load(filename)
+        except (OSError, ValueError):
+            data = None
+    if data is not None and data.shape != shape:
+        data = None
+    if data is None:
+        data = create()
+        try:
+            os.makedirs(path, exist_ok = True)
+            tmp_filename = filename + f'.{os.getpid()}.tmp'
+            with open(tmp_filename, 'wb') as tmp_file:
+                np.save(tmp_file, data)
+            os.replace(tmp_filename, filename)
+        except OSError as e:
+            print(f'PBCH sequences: could not store {filename}: {e}')
+    data.flags.writeable = False
+    _tables[name] = data
+    return data
+
+def dmrs_table(path = None):
+    """packed PBCH DMRS bits c(0) .. c(287) of all N_id and ibar_SSB, uint8 array with shape (1008, 8, 36)"""
+    return _table(f'PBCH_DMRS_{NUM_N_ID}x{NUM_IBAR_SSB}x{2 * PBCH_DMRS_LEN}', _create_dmrs,
+        (NUM_N_ID, NUM_IBAR_SSB, 2 * PBCH_DMRS_LEN // 8), path)
+
+def scrambling_table(path = None):
+    """packed PBCH scrambling bits c(0) .. c(8 * 864 - 1) with c_init = N_id, uint8 array with shape (1008, 864)"""
+    return _table(f'PBCH_scrambling_{NUM_N_ID}x{SCRAMBLING_LEN}', _create_scrambling, (NUM_N_ID, SCRAMBLING_LEN // 8), path)
+
+def dmrs_bits(N_id, ibar_SSB = None):
+    '''
+    PBCH DMRS bits with shape (..., 144, 2), the last axis is the bit of the real and of the imaginary part
+
+    N_id and ibar_SSB can be arrays and are broadcast against each other. If ibar_SSB is None,
+    the bits of all 8 ibar_SSB are returned with an additional axis of length 8 before the pilot axis.
+    '''
+    N_id = np.asarray(N_id, np.int64)
+    if ibar_SSB is None:
+        packed = dmrs_table()[N_id]
+    else:
+        packed = dmrs_table()[N_id, np.asarray(ibar_SSB, np.int64)]
+    bits = np.unpackbits(packed, axis = -1)
+    return bits.reshape(bits.shape[:-1] + (PBCH_DMRS_LEN, 2))
+
+def dmrs_symbols(N_id, ibar_SSB = None):
+    """QPSK PBCH DMRS like py3gpp.nrPBCHDMRS with shape (..., 144), see dmrs_bits()"""
+    bits = dmrs_bits(N_id, ibar_SSB).astype(np.float64)
+    return ((1 - 2 * bits[..., 0]) + 1j * (1 - 2 * bits[..., 1])) / np.sqrt(2)
+
+def dmrs_correlate(pilots, N_id, start = 0):
+    '''
+    correlation of received pilots with the DMRS of all 8 ibar_SSB in one operation
+
+    pilots has shape (..., num_pilots) and are the DMRS carriers start .. start + num_pilots - 1.
+    Returns complex correlations with shape (..., 8).
+    '''
+    pilots = np.asarray(pilots)
+    ref = dmrs_symbols(N_id)[..., start:start + pilots.shape[-1]]
+    return np.einsum('...n,...kn->...k', pilots, ref.conj())
+
+def scrambling_bits(N_id, v = None, E = E):
+    '''
+    PBCH scrambling bits c(v * E) .. c(v * E + E - 1) with c_init = N_id like py3gpp.nrPBCHPRBS(N_id, v, E)
+
+    Like py3gpp the bits are returned as int64, so that 1 - 2 * bits gives the BPSK sequence.
+
+    N_id and v can be arrays and are broadcast against each other. If v is None, the bits of all 8 v are returned
+    with an additional axis of length 8 before the last axis.
+    '''
+    N_id = np.asarray(N_id, np.int64)
+    num_v = NUM_IBAR_SSB if v is None else int(np.max(v)) + 1
+    if num_v * E > SCRAMBLING_LEN:
+        raise ValueError(f'PBCH scrambling table only has {SCRAMBLING_LEN} bits, v = {num_v - 1} with E = {E} needs {num_v * E}')
+    bits = np.unpackbits(scrambling_table()[N_id], axis = -1).astype(np.int64)
+    if v is None:
+        return bits[..., :NUM_IBAR_SSB * E].reshape(bits.shape[:-1] + (NUM_IBAR_SSB, E))
+    v = np.asarray(v, np.int64)
+    shape = np.broadcast_shapes(N_id.shape, v.shape)
+    bits = np.broadcast_to(bits, shape + bits.shape[-1:])
+    index = np.broadcast_to(v, shape)[..., None] * E + np.arange(E)
+    return np.take_along_axis(bits, index, axis = -1)
+
+def main(args):
+    print(sys.argv)
+
+    parser = argparse.ArgumentParser(description='Creates the PBCH DMRS and scrambling sequence tables')
+    parser.add_argument('--path', metavar='path', required=False, default = None, help='directory of the tables')
+    args = parser.parse_args(args)
+
+    print(f'PBCH DMRS table shape = {dmrs_table(args.path).shape}')
+    print(f'PBCH scrambling table shape = {scrambling_table(args.path).shape}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
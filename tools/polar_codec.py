@@ -0,0 +1,185 @@
+import numpy as np
+import argparse
+import sys
+
+from py3gpp.nrPolarDecode import generate_5g_ranking, interleave
+
+# PBCH configuration from 38.212 7.1.4 and 7.1.5
+A = 32
+CRC_LEN = 24
+K = A + CRC_LEN
+N = 512
+E = 864
+CRC24C_POLY = 0xB2B117  # D^24 + D^23 + D^21 + D^20 + D^17 + D^15 + D^13 + D^12 + D^8 + D^4 + D^2 + D + 1
+
+def _crc_table(poly, L):
+    """remainder of every byte value, for a byte wise CRC that processes the bits MSB first"""
+    table = np.zeros(256, np.int64)
+    for byte in range(256):
+        crc = byte << (L - 8)
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly if crc & (1 << (L - 1)) else crc << 1) & ((1 << L) - 1)
+        table[byte] = crc
+    return table
+
+CRC24C_TABLE = _crc_table(CRC24C_POLY, 24)
+
+def crc24c(bits):
+    '''
+    CRC-24C remainder of bit arrays with shape (..., num_bits) like py3gpp.nrCRCEncode, the register starts at 0
+
+    Leading zeros do not change the remainder, so the bits are padded to full bytes at the front and processed
+    one byte per step for all blocks at once. The remainder of a block with attached CRC is 0.
+    '''
+    bits = np.asarray(bits).astype(np.uint8)
+    pad = -bits.shape[-1] % 8
+    bits = np.concatenate((np.zeros(bits.shape[:-1] + (pad,), np.uint8), bits), axis = -1)
+    data = np.packbits(bits, axis = -1).astype(np.int64)
+    crc = np.zeros(bits.shape[:-1], np.int64)
+    for i in range(data.shape[-1]):
+        crc = ((crc << 8) & 0xFFFFFF) ^ CRC24C_TABLE[((crc >> 16) ^ data[..., i]) & 0xFF]
+    return crc
+
+def _subblock_interleaver(N):
+    """index J(n) of the sub-block interleaver from 38.212 5.4.1.1, y(n) = d(J(n))"""
+    P = np.array([0, 1, 2, 4, 3, 5, 6, 7, 8, 16, 9, 17, 10, 18, 11, 19,
+                  12, 20, 13, 21, 14, 22, 15, 23, 24, 25, 26, 28, 27, 29, 30, 31])
+    n = np.arange(N)
+    return P[32 * n // N] * (N // 32) + n % (N // 32)
+
+class PolarCode:
+    '''
+    Precomputed tables of a polar code with the parameters of the PBCH
+
+    The frozen set, the input bit interleaver and the sub-block interleaver are calculated once.
+    The successive cancellation decoder walks the code tree once for all codewords of a batch,
+    subtrees with only frozen bits or only information bits are decoded in one step.
+    '''
+    def __init__(self, K = K, N = N, E = E):
+        self.K = K
+        self.N = N
+        self.E = E
+        frozen_pos, info_pos = generate_5g_ranking(K, N)
+        self.info_pos = np.asarray(info_pos)
+        self.info_mask = np.zeros(N, bool)
+        self.info_mask[self.info_pos] = True
+        self.p_IL = np.asarray(interleave(K))
+        self.J = _subblock_interleaver(N)
+        # number of information bits in every node of the code tree, nodes are (start, length)
+        self.info_cumsum = np.concatenate(([0], np.cumsum(self.info_mask)))
+
+    def _num_info(self, start, length):
+        return self.info_cumsum[start + length] - self.info_cumsum[start]
+
+    @staticmethod
+    def transform(u):
+        """polar transform x = u * G_N over the last axis, G_N is its own inverse"""
+        x = np.array(u, np.uint8)
+        n = x.shape[-1]
+        half = 1
+        while half < n:
+            x = x.reshape(x.shape[:-1] + (n // (2 * half), 2, half))
+            x[..., 0, :] ^= x[..., 1, :]
+            x = x.reshape(x.shape[:-3] + (n,))
+            half *= 2
+        return x
+
+    def rate_match(self, x):
+        """sub-block interleaving and repetition to E bits like 38.212 5.4.1 for E >= N"""
+        y = np.asarray(x)[..., self.J]
+        return y[..., np.arange(self.E) % self.N]
+
+    def rate_recover(self, llr):
+        """inverse of rate_match(), repeated LLRs are added like py3gpp.nrRateRecoverPolar(discardRepetition = False)"""
+        llr = np.asarray(llr, np.float64)
+        y = np.zeros(llr.shape[:-1] + (self.N,))
+        for k in range(0, llr.shape[-1], self.N):
+            y[..., :min(self.N, llr.shape[-1] - k)] += llr[..., k:k + self.N]
+        d = np.zeros_like(y)
+        d[..., self.J] = y
+        return d
+
+    def encode(self, c):
+        """codewords of K input bits c (CRC already attached) with input bit interleaving, shape (..., N)"""
+        c = np.asarray(c, np.uint8)
+        u = np.zeros(c.shape[:-1] + (self.N,), np.uint8)
+        u[..., self.info_pos] = c[..., self.p_IL]
+        return self.transform(u)
+
+    def _sc_decode(self, llr, start, u):
+        length = llr.shape[-1]
+        num_info = self._num_info(start, length)
+        if num_info == 0:
+            return np.zeros(llr.shape, np.uint8)
+        if num_info == length:
+            x = (llr < 0).astype(np.uint8)
+            u[..., start:start + length] = self.transform(x)
+            return x
+        a = llr[..., :length // 2]
+        b = llr[..., length // 2:]
+        # min-sum approximation of the check node
+        x_left = self._sc_decode(np.sign(a) * np.sign(b) * np.minimum(np.abs(a), np.abs(b)), start, u)
+        x_right = self._sc_decode(b + (1 - 2 * x_left.astype(np.float64)) * a, start + length // 2, u)
+        return np.concatenate((x_left ^ x_right, x_right), axis = -1)
+
+    def decode(self, llr):
+        '''
+        successive cancellation decoding of rate recovered LLRs with shape (..., N), positive LLRs mean bit 0
+
+        Returns the K deinterleaved bits (payload and CRC) like py3gpp.nrPolarDecode(llr, K, 0, 0).
+        '''
+        llr = np.asarray(llr, np.float64)
+        batch_shape = llr.shape[:-1]
+        llr = llr.reshape(-1, self.N)
+        u = np.zeros(llr.shape, np.uint8)
+        self._sc_decode(llr, 0, u)
+        decoded = np.empty((len(llr), self.K), np.uint8)
+        decoded[:, self.p_IL] = u[:, self.info_pos]
+        return decoded.reshape(batch_shape + (self.K,))
+
+_PBCH = None
+
+def pbch_code():
+    global _PBCH
+    if _PBCH is None:
+        _PBCH = PolarCode()
+    return _PBCH
+
+def encode(payload):
+    """E = 864 PBCH bits of A = 32 bit payloads with shape (..., A): CRC-24C, polar encoding and rate matching"""
+    payload = np.asarray(payload, np.uint8)
+    crc = crc24c(payload)
+    crc_bits = ((crc[..., None] >> np.arange(CRC_LEN - 1, -1, -1)) & 1).astype(np.uint8)
+    code = pbch_code()
+    return code.rate_match(code.encode(np.concatenate((payload, crc_bits), axis = -1)))
+
+def decode(llr):
+    '''
+    decode descrambled PBCH LLRs with shape (E,) or (num_codewords, E), positive values mean bit 0
+
+    Does the same as py3gpp.nrRateRecoverPolar -> nrPolarDecode -> nrCRCDecode(decoded, '24C') for all
+    codewords at once. Returns the decoded K bits and the CRC remainder, which is 0 if the CRC is ok.
+    '''
+    code = pbch_code()
+    decoded = code.decode(code.rate_recover(llr))
+    return decoded, crc24c(decoded)
+
+def main(args):
+    print(sys.argv)
+
+    parser = argparse.ArgumentParser(description='Encodes and decodes random PBCH payloads to measure the block error rate')
+    parser.add_argument('--num', metavar='num', required=False, default = 1000, help='number of codewords')
+    parser.add_argument('--snr', metavar='snr', required=False, default = 0, help='Es/N0 of the BPSK symbols in dB')
+    parser.add_argument('--seed', metavar='seed', required=False, default = 0, help='seed of the random generator')
+    args = parser.parse_args(args)
+
+    rng = np.random.default_rng(int(args.seed))
+    payload = rng.integers(0, 2, (int(args.num), A))
+    sigma = np.sqrt(0.5 * 10 ** (-float(args.snr) / 10))
+    rx = 1 - 2 * encode(payload).astype(np.float64) + sigma * rng.standard_normal((int(args.num), E))
+    decoded, crc = decode(2 * rx / sigma ** 2)
+    errors = np.any(decoded[:, :A] != payload, axis = -1)
+    print(f'{len(payload)} codewords: {np.sum(errors)} block errors, {np.sum(crc != 0)} CRC failures')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,131 @@
+import numpy as np
+import argparse
+import mmap
+import stat
+import sys
+import os
+
+SYMBOLS_PER_FRAME = 140  # 10 subframes * 14 symbols with 15 kHz SCS
+
+def symbol_dtype(SYMBOL_LEN = 300, IQ_WIDTH = 16):
+    '''
+    Structured dtype of one ressource_grid_framer symbol as it arrives in a DMA block
+
+    Every IQ_WIDTH bit word of the AXI stream is stored little endian: the block exponent word,
+    the 64 bit timestamp in 64 / IQ_WIDTH words (LSB first) and SYMBOL_LEN I/Q words with the real part
+    in the lower half. With the default parameters a symbol has 610 bytes and a frame 85400 bytes.
+    '''
+    OP_BYTES = IQ_WIDTH // 16
+    return np.dtype([('blk_exp', f'<u{IQ_WIDTH // 8}'), ('timestamp', '<u8'), ('iq', f'<i{OP_BYTES}', (SYMBOL_LEN, 2))])
+
+def parse(buffer, SYMBOL_LEN = 300, IQ_WIDTH = 16, offset = 0, count = -1):
+    """structured view of the symbols in buffer (bytes, bytearray, mmap or memoryview), nothing is copied
+
+    An incomplete symbol at the end of buffer is ignored.
+    """
+    dtype = symbol_dtype(SYMBOL_LEN, IQ_WIDTH)
+    if count < 0:
+        count = (len(memoryview(buffer).cast('B')) - offset) // dtype.itemsize
+    return np.frombuffer(buffer, dtype, count, offset)
+
+def timestamp(symbols):
+    """sample index of every symbol, the timestamp words are already in the right order for a little endian uint64"""
+    return symbols['timestamp']
+
+def blk_exp(symbols, BLK_EXP_LEN = 8):
+    return (symbols['blk_exp'] & (2 ** BLK_EXP_LEN - 1)).astype(np.int64)
+
+def iq(symbols, scale = True, BLK_EXP_LEN = 8):
+    """I/Q samples of all symbols as complex64 array with shape (num_symbols, SYMBOL_LEN)
+
+    If scale is True, every symbol is divided by 2 ** blk_exp to undo the block scaling of FFT_demod.
+    """
+    samples = symbols['iq'].astype(np.float32).view(np.complex64)[..., 0]
+    if scale:
+        samples /= (2.0 ** blk_exp(symbols, BLK_EXP_LEN)).astype(np.float32)[:, None]
+    return samples
+
+class FileBuffer:
+    '''
+    Stand-in for the IIO DMA buffer that reads ressource_grid_framer data from a file or a named pipe
+
+    refill() returns the next block of SYMBOLS_PER_FRAME symbols like iio_buffer_refill() does.
+    Regular files are memory mapped and the returned view points directly into the file. Pipes are read into
+    one preallocated block which is reused, so like with IIO the view is only valid until the next refill().
+    The data can be created from the rgs output of model/receiver.py with
+    np.asarray(rgs, '<u2').tofile(path)
+    '''
+    def __init__(self, path, SYMBOL_LEN = 300, IQ_WIDTH = 16, SYMBOLS_PER_FRAME = SYMBOLS_PER_FRAME):
+        self.SYMBOL_LEN = SYMBOL_LEN
+        self.IQ_WIDTH = IQ_WIDTH
+        self.SYMBOLS_PER_FRAME = SYMBOLS_PER_FRAME
+        self.dtype = symbol_dtype(SYMBOL_LEN, IQ_WIDTH)
+        self.block_size = self.dtype.itemsize * SYMBOLS_PER_FRAME
+        self.file = open(path, 'rb', buffering = 0)
+        self.pos = 0
+        self.mmap = None
+        self.block = None
+        mode = os.fstat(self.file.fileno()).st_mode
+        if stat.S_ISREG(mode) and os.fstat(self.file.fileno()).st_size > 0:
+            self.mmap = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        else:
+            self.block = bytearray(self.block_size)
+
+    def refill(self):
+        """structured view of the next block, the last block can be shorter, None if there is no more data"""
+        if self.mmap is not None:
+            count = min(len(self.mmap) - self.pos, self.block_size) // self.dtype.itemsize
+            if count == 0:
+                return None
+            symbols = parse(self.mmap, self.SYMBOL_LEN, self.IQ_WIDTH, self.pos, count)
+            self.pos += count * self.dtype.itemsize
+            return symbols
+        view = memoryview(self.block)
+        num_bytes = 0
+        while num_bytes < self.block_size:
+            n = self.file.readinto(view[num_bytes:])
+            if not n:
+                break
+            num_bytes += n
+        count = num_bytes // self.dtype.itemsize
+        if count == 0:
+            return None
+        return parse(self.block, self.SYMBOL_LEN, self.IQ_WIDTH, 0, count)
+
+    def __iter__(self):
+        while (symbols := self.refill()) is not None:
+            yield symbols
+
+    def close(self):
+        if self.mmap is not None:
+            try:
+                self.mmap.close()
+            except BufferError:
+                # views returned by refill() are still in use, the mapping is closed when they are deleted
+                pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def main(args):
+    print(sys.argv)
+
+    parser = argparse.ArgumentParser(description='Parses ressource_grid_framer DMA data from a file or pipe')
+    parser.add_argument('--file', metavar='file', required=True, help='file or named pipe')
+    parser.add_argument('--SYMBOL_LEN', metavar='SYMBOL_LEN', required=False, default = 300, help='number of subcarriers per symbol')
+    parser.add_argument('--IQ_WIDTH', metavar='IQ_WIDTH', required=False, default = 16, help='width of a DMA word')
+    args = parser.parse_args(args)
+
+    with FileBuffer(args.file, int(args.SYMBOL_LEN), int(args.IQ_WIDTH)) as buffer:
+        for i, symbols in enumerate(buffer):
+            ts = timestamp(symbols)
+            exp = blk_exp(symbols)
+            power = np.mean(np.abs(iq(symbols)) ** 2)
+            print(f'frame {i}: {len(symbols)} symbols, timestamp {ts[0]} .. {ts[-1]}, blk_exp {exp.min()} .. {exp.max()}, mean power {power:.3g}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
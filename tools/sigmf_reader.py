@@ -0,0 +1,90 @@
+import numpy as np
+import argparse
+import json
+import sys
+import os
+import sigmf
+
+class SigMFReader:
+    '''
+    Memory mapped reader for .sigmf-data files
+
+    The data file is mapped according to core:datatype from the .sigmf-meta file, nothing is read
+    before samples are requested. read() and chunks() return integer (or float for cf32 files) arrays with one row
+    per sample and the I and Q components as columns, read_samples() returns complex64 like
+    sigmf.SigMFFile.read_samples() does. Reading a part of the file only needs memory for that part.
+    '''
+    def __init__(self, path):
+        base = os.path.splitext(path)[0]
+        self.data_file = base + '.sigmf-data'
+        with open(base + '.sigmf-meta', 'r') as meta_file:
+            meta = json.load(meta_file)
+        self.datatype = meta['global']['core:datatype']
+        self.sample_rate = meta['global'].get('core:sample_rate')
+        captures = meta.get('captures', [])
+        header_bytes = captures[0].get('core:header_bytes', 0) if len(captures) > 0 else 0
+
+        info = sigmf.sigmffile.dtype_info(self.datatype)
+        self.is_complex = info['is_complex']
+        self.is_fixedpoint = info['is_fixedpoint']
+        self.is_unsigned = info['is_unsigned']
+        self.component_size = info['component_size']
+        self.dtype = info['component_dtype']
+        components = 2 if self.is_complex else 1
+        self.num_samples = (os.path.getsize(self.data_file) - header_bytes) // info['sample_size']
+        if self.num_samples > 0:
+            self._data = np.memmap(self.data_file, dtype = self.dtype, mode = 'r', offset = header_bytes,
+                shape = (self.num_samples, components))
+        else:
+            self._data = np.zeros((0, components), self.dtype)
+
+    def __len__(self):
+        return self.num_samples
+
+    def read(self, start = 0, count = None):
+        """read count samples beginning at sample start, all remaining samples if count is None
+
+        Returns an array with shape (count, 2) for complex data and (count, 1) for real data
+        in native byte order.
+        """
+        stop = self.num_samples if count is None else min(start + count, self.num_samples)
+        return np.array(self._data[start:stop], dtype = self.dtype.newbyteorder('='))
+
+    def chunks(self, chunk_len, start = 0, count = None):
+        """generator for consecutive blocks of read(), every block except the last one has chunk_len samples"""
+        stop = self.num_samples if count is None else min(start + count, self.num_samples)
+        for pos in range(start, stop, chunk_len):
+            yield self.read(pos, min(chunk_len, stop - pos))
+
+    def read_samples(self, start = 0, count = None, autoscale = True):
+        """same as sigmf.SigMFFile.read_samples(), but only for the requested samples"""
+        data = self.read(start, count).astype(np.float32)
+        if autoscale and self.is_fixedpoint:
+            if self.is_unsigned:
+                data -= 2 ** (self.component_size * 8 - 1)
+            data *= 2 ** -(self.component_size * 8 - 1)
+        if self.is_complex:
+            return np.ascontiguousarray(data).view(np.complex64)[:, 0]
+        return data[:, 0]
+
+    def max_abs(self, chunk_len = 2 ** 20):
+        """largest absolute I or Q value of the whole file, without loading the whole file at once"""
+        result = 0
+        for chunk in self.chunks(chunk_len):
+            result = max(result, np.abs(chunk.astype(np.float64)).max())
+        return result
+
+def main(args):
+    print(sys.argv)
+
+    parser = argparse.ArgumentParser(description='Shows information about a SigMF recording')
+    parser.add_argument('--file', metavar='file', required=True, help='.sigmf-data or .sigmf-meta file')
+    args = parser.parse_args(args)
+
+    reader = SigMFReader(args.file)
+    print(f'datatype = {reader.datatype}')
+    print(f'sample_rate = {reader.sample_rate}')
+    print(f'num_samples = {reader.num_samples}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
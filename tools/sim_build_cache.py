@@ -0,0 +1,134 @@
+import cocotb_test.simulator
+import argparse
+import hashlib
+import shutil
+import fcntl
+import json
+import glob
+import sys
+import os
+
+DEFAULT_CACHE_DIR = os.path.join('sim_build', 'cache')
+MARKER = 'build_key'
+
+# arguments of cocotb_test.simulator.run() that change the compiled model,
+# everything else (module, testcase, extra_env, plus_args, ...) is only used at runtime
+COMPILE_ARGS = ['simulator', 'toplevel', 'toplevel_lang', 'verilog_sources', 'vhdl_sources', 'includes', 'defines',
+    'parameters', 'compile_args', 'vhdl_compile_args', 'verilog_compile_args', 'extra_args', 'waves', 'timescale']
+
+def _sources(sources):
+    if isinstance(sources, dict):
+        return [source for library in sources.values() for source in library]
+    return list(sources or [])
+
+def _file_hash(filename):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(2 ** 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _library_dirs(compile_args):
+    """library directories that are passed with -y in compile_args, as '-y', 'dir' (verilator) or '-ydir' (icarus)"""
+    args = [str(arg) for arg in compile_args or []]
+    dirs = []
+    for i, arg in enumerate(args):
+        if arg == '-y' and i + 1 < len(args):
+            dirs.append(args[i + 1])
+        elif arg.startswith('-y') and len(arg) > 2:
+            dirs.append(arg[2:])
+    return dirs
+
+def dependencies(**kwargs):
+    """all files whose content goes into the key
+
+    These are the verilog/vhdl sources, the files in the include directories and the .v/.sv files
+    in the library directories that are passed with -y in compile_args.
+    """
+    files = _sources(kwargs.get('verilog_sources')) + _sources(kwargs.get('vhdl_sources'))
+    for include in kwargs.get('includes') or []:
+        files += sorted(filename for filename in glob.glob(os.path.join(include, '*')) if os.path.isfile(filename))
+    for library in _library_dirs(kwargs.get('compile_args')):
+        files += sorted(filename for pattern in ('*.v', '*.sv') for filename in glob.glob(os.path.join(library, pattern)))
+    return [os.path.abspath(filename) for filename in files]
+
+def key(**kwargs):
+    """hash of the source file contents, the compile args and the elaboration parameters"""
+    description = {name: kwargs.get(name) for name in COMPILE_ARGS}
+    description['verilog_sources'] = _sources(kwargs.get('verilog_sources'))
+    description['vhdl_sources'] = _sources(kwargs.get('vhdl_sources'))
+    description['parameters'] = {k: str(v) for k, v in (kwargs.get('parameters') or {}).items()}
+    description['waves'] = bool(kwargs.get('waves') if kwargs.get('waves') is not None else int(os.environ.get('WAVES', 0)))
+    description['SIM'] = kwargs.get('simulator') or os.environ.get('SIM', 'icarus')
+    description['files'] = {filename: _file_hash(filename) for filename in dependencies(**kwargs)}
+    return hashlib.sha256(json.dumps(description, sort_keys = True, default = str).encode()).hexdigest()
+
+def run(sim_build = 'sim_build', cache_dir = None, **kwargs):
+    '''
+    Drop-in replacement for cocotb_test.simulator.run(..., force_compile = True)
+
+    The model is compiled into cache_dir/<toplevel>_<key>, where key is the hash from key(). It is compiled only
+    once and reused by every following run with the same sources, compile args and parameters, so that test cases
+    that only differ in runtime environment variables like CFO, RND_JITTER or TEST_FILE share one binary.
+    sim_build is used as working directory of the simulation, tap files that the RTL loads with $readmemh
+    and waveforms stay there like before.
+    A lock file per entry makes parallel pytest workers wait for the one worker that compiles the model.
+    The cache directory can be set with the environment variable SIM_BUILD_CACHE_DIR,
+    SIM_BUILD_CACHE=0 compiles every test again in sim_build.
+    '''
+    if os.environ.get('SIM_BUILD_CACHE', '1') == '0':
+        return cocotb_test.simulator.run(sim_build = sim_build, force_compile = True, **kwargs)
+
+    cache_dir = cache_dir or os.environ.get('SIM_BUILD_CACHE_DIR', DEFAULT_CACHE_DIR)
+    build_key = key(**kwargs)
+    build_dir = os.path.join(cache_dir, f'{kwargs.get("toplevel", "top")}_{build_key[:16]}')
+    os.makedirs(build_dir, exist_ok = True)
+    os.makedirs(sim_build, exist_ok = True)
+    marker = os.path.join(build_dir, MARKER)
+    with open(build_dir + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(marker):
+                print(f'sim build cache: compiling {build_dir}')
+                cocotb_test.simulator.run(sim_build = build_dir, work_dir = sim_build, force_compile = True,
+                    compile_only = True, **kwargs)
+                with open(marker, 'w') as f:
+                    f.write(build_key + '\n')
+            else:
+                print(f'sim build cache: using {build_dir}')
+                # cocotb_test recompiles if a source is newer than the model, but a newer
+                # modification time with the same content (git checkout, touch) does not change the model
+                newest = max((os.path.getmtime(filename) for filename in dependencies(**kwargs)), default = 0)
+                if newest > os.path.getmtime(marker):
+                    for filename in glob.glob(os.path.join(build_dir, '**'), recursive = True):
+                        os.utime(filename)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return cocotb_test.simulator.run(sim_build = build_dir, work_dir = sim_build, force_compile = False, **kwargs)
+
+def clear(cache_dir = None):
+    cache_dir = cache_dir or os.environ.get('SIM_BUILD_CACHE_DIR', DEFAULT_CACHE_DIR)
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+
+def main(args):
+    print(sys.argv)
+
+    parser = argparse.ArgumentParser(description='Shows or clears the compiled simulator cache')
+    parser.add_argument('--path', metavar='path', required=False, default = None, help='cache directory')
+    parser.add_argument('--clear', action='store_true', help='delete all entries')
+    args = parser.parse_args(args)
+
+    path = args.path or os.environ.get('SIM_BUILD_CACHE_DIR', DEFAULT_CACHE_DIR)
+    if args.clear:
+        clear(path)
+    if not os.path.isdir(path):
+        print(f'{path} does not exist')
+        return
+    entries = [name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name))]
+    print(f'{path}: {len(entries)} entries')
+    for name in sorted(entries):
+        print(name)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,110 @@
+import numpy as np
+import argparse
+import sys
+import os
+
+SSS_LEN = 127
+N_ID_1_MAX = 335
+NUM_N_ID = 3 * (N_ID_1_MAX + 1)
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'open5G_phy')
+FILENAME = f'SSS_codebook_{NUM_N_ID}x{SSS_LEN}.npy'
+
+_CODEBOOK = None
+
+def m_sequence(taps, length = SSS_LEN):
+    """binary m-sequence like LFSR.sv in SSS_detector.sv with START_VALUE = 1, x(i + 7) is the xor of x(i + k) for all bits k in taps"""
+    x = [1, 0, 0, 0, 0, 0, 0]
+    tap_pos = [k for k in range(7) if (taps >> k) & 1]
+    for i in range(length - 7):
+        x.append(int(np.bitwise_xor.reduce([x[i + k] for k in tap_pos])))
+    return np.array(x[:length], np.int64)
+
+def create():
+    '''
+    BPSK SSS sequences of all N_id = 3 * N_id_1 + N_id_2 as int8 array with shape (1008, 127)
+
+    Like SSS_detector.sv the sequences are built from the two m-sequences x0 and x1 with the cyclic shifts
+    m0 = 15 * (N_id_1 // 112) + 5 * N_id_2 and m1 = N_id_1 % 112 (38.211 7.4.2.3.1).
+    '''
+    x0 = 1 - 2 * m_sequence(0x11)
+    x1 = 1 - 2 * m_sequence(0x03)
+    n = np.arange(SSS_LEN)
+    N_id = np.arange(NUM_N_ID)
+    N_id_1 = N_id // 3
+    N_id_2 = N_id % 3
+    m0 = 15 * (N_id_1 // 112) + 5 * N_id_2
+    m1 = N_id_1 % 112
+    return (x0[(n[None, :] + m0[:, None]) % SSS_LEN] * x1[(n[None, :] + m1[:, None]) % SSS_LEN]).astype(np.int8)
+
+def codebook(path = None):
+    '''
+    Cached SSS codebook, row N_id is the SSS of cell N_id
+
+    The codebook is created only once and stored as .npy in path, the default is ~/.cache/open5G_phy which can be
+    changed with the environment variable SSS_CODEBOOK_DIR. Inside one process the array is kept in memory.
+    '''
+    global _CODEBOOK
+    if _CODEBOOK is not None:
+        return _CODEBOOK
+    path = path or os.environ.get('SSS_CODEBOOK_DIR', DEFAULT_CACHE_DIR)
+    filename = os.path.join(path, FILENAME)
+    data = None
+    if os.path.exists(filename):
+        try:
+            data = np.load(filename)
+        except (OSError, ValueError):
+            data = None
+        if data is not None and (data.shape != (NUM_N_ID, SSS_LEN) or data.dtype != np.int8):
+            data = None
+    if data is None:
+        data = create()
+        try:
+            os.makedirs(path, exist_ok = True)
+            tmp_filename = filename + f'.{os.getpid()}.tmp'
+            with open(tmp_filename, 'wb') as tmp_file:
+                np.save(tmp_file, data)
+            os.replace(tmp_filename, filename)
+        except OSError as e:
+            print(f'SSS codebook: could not store {filename}: {e}')
+    data.flags.writeable = False
+    _CODEBOOK = data
+    return _CODEBOOK
+
+def detect(received, N_id_2 = None):
+    '''
+    Correlate received SSS symbols with the codebook in one matrix product
+
+    received has shape (127,) or (N_SSBs, 127). If N_id_2 is given, only the 336 sequences of that N_id_2
+    are compared and the candidates are N_id_1 values, otherwise all 1008 sequences are compared and the
+    candidates are N_id values.
+    Returns (candidates, corr, margin): the candidates ranked by descending correlation magnitude, the
+    sorted correlation magnitudes and the margin (best - second best) / best of the winner.
+    For a batch every return value has one additional leading axis.
+    '''
+    received = np.asarray(received)
+    C = codebook() if N_id_2 is None else codebook()[N_id_2::3]
+    corr = np.abs(received[..., :SSS_LEN] @ C.T.astype(np.float32))
+    candidates = np.argsort(-corr, axis = -1, kind = 'stable')
+    corr = np.take_along_axis(corr, candidates, axis = -1)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        margin = np.where(corr[..., 0] > 0, (corr[..., 0] - corr[..., 1]) / corr[..., 0], 0)
+    return candidates, corr, margin
+
+def main(args):
+    print(sys.argv)
+
+    parser = argparse.ArgumentParser(description='Creates the SSS codebook and detects N_id in a file with SSS symbols')
+    parser.add_argument('--path', metavar='path', required=False, default = None, help='directory of the codebook')
+    parser.add_argument('--file', metavar='file', required=False, default = None, help='.npy file with received SSS symbols (N_SSBs x 127)')
+    parser.add_argument('--N_id_2', metavar='N_id_2', required=False, default = None, help='N_id_2, if not given all N_id are tested')
+    args = parser.parse_args(args)
+
+    print(f'SSS codebook shape = {codebook(args.path).shape}')
+    if args.file is not None:
+        N_id_2 = None if args.N_id_2 is None else int(args.N_id_2)
+        candidates, corr, margin = detect(np.atleast_2d(np.load(args.file)), N_id_2)
+        for i in range(len(candidates)):
+            print(f'SSB {i}: best = {candidates[i, 0]} second = {candidates[i, 1]} margin = {margin[i]:.3f}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,113 @@
+import numpy as np
+import argparse
+import hashlib
+import fcntl
+import json
+import sys
+import os
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'open5G_phy', 'stimulus')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+class StimulusCache:
+    '''
+    On-disk cache for s_axis_in_tdata stimulus
+
+    Entries are .npy files named by a hash of the source file (name, size and modification time), of the content
+    of the generator source file that creates the stimulus and of all parameters that were used to create it. get() returns a read only memmap of an entry and creates it
+    with create() if it does not exist yet. A lock file per entry makes parallel pytest workers wait for the
+    one worker that creates the entry instead of doing the same work again.
+    If the cache grows larger than max_bytes, the least recently used entries are deleted.
+    The cache directory can be set with the environment variable STIMULUS_CACHE_DIR,
+    STIMULUS_CACHE=0 disables the cache.
+    '''
+    def __init__(self, path = None, max_bytes = None):
+        self.path = path or os.environ.get('STIMULUS_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes or os.environ.get('STIMULUS_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.enabled = os.environ.get('STIMULUS_CACHE', '1') != '0'
+
+    def key(self, source_file, generator_file = None, **params):
+        """hash of the source file, all parameters and the content of the generator source file"""
+        stat = os.stat(source_file)
+        description = {'file': os.path.basename(source_file), 'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+            'params': params}
+        if generator_file is not None:
+            with open(generator_file, 'rb') as f:
+                description['generator'] = hashlib.sha256(f.read()).hexdigest()
+        return hashlib.sha256(json.dumps(description, sort_keys = True, default = str).encode()).hexdigest()
+
+    def get(self, source_file, create, generator_file = None, **params):
+        """return the cached stimulus for source_file and params, create() is called if it is not cached yet"""
+        if not self.enabled:
+            return np.asarray(create())
+        os.makedirs(self.path, exist_ok = True)
+        key = self.key(source_file, generator_file, **params)
+        filename = os.path.join(self.path, key + '.npy')
+        with open(os.path.join(self.path, key + '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(filename):
+                    data = np.asarray(create())
+                    tmp_filename = filename + f'.{os.getpid()}.tmp'
+                    with open(tmp_filename, 'wb') as tmp_file:
+                        np.save(tmp_file, data)
+                    os.replace(tmp_filename, filename)
+                    print(f'stimulus cache: created {filename}')
+                    self.evict(keep = filename)
+                else:
+                    print(f'stimulus cache: using {filename}')
+                # the modification time is the last use for the LRU eviction
+                os.utime(filename)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return np.load(filename, mmap_mode = 'r')
+
+    def evict(self, keep = None):
+        """delete least recently used entries until the cache is not larger than max_bytes"""
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith('.npy'):
+                filename = os.path.join(self.path, name)
+                try:
+                    stat = os.stat(filename)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, filename))
+        total = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if filename == keep:
+                continue
+            try:
+                os.remove(filename)
+                os.remove(os.path.splitext(filename)[0] + '.lock')
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            if name.endswith('.npy') or name.endswith('.lock'):
+                os.remove(os.path.join(self.path, name))
+
+def main(args):
+    print(sys.argv)
+
+    parser = argparse.ArgumentParser(description='Shows or clears the stimulus cache')
+    parser.add_argument('--path', metavar='path', required=False, default = None, help='cache directory')
+    parser.add_argument('--clear', action='store_true', help='delete all entries')
+    args = parser.parse_args(args)
+
+    cache = StimulusCache(args.path)
+    if not os.path.isdir(cache.path):
+        print(f'{cache.path} does not exist')
+        return
+    if args.clear:
+        cache.clear()
+    entries = [name for name in os.listdir(cache.path) if name.endswith('.npy')]
+    size = sum(os.path.getsize(os.path.join(cache.path, name)) for name in entries)
+    print(f'{cache.path}: {len(entries)} entries, {size} bytes')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,113 @@
+import numpy as np
+from cocotb.triggers import RisingEdge
+
+class StreamChecker:
+    '''
+    Streams operand arrays through a DUT with valid_i / valid_o handshake and compares the results exactly with a model
+
+    The model has to provide calc(*operands), latency(*operands) and interval(*operands) for arrays of operands,
+    like model/div.py and model/atan2.py. An operand set is sent every interval clock cycles, which is every cycle
+    for pipelined cores. Per clock cycle only precomputed python ints are written and the raw outputs are stored
+    if valid_o is set. The operands are processed in batches of BATCH_LEN, for each batch the expected results and
+    the clock cycle of every result are calculated at once and compared with the received ones as soon as
+    the batch is complete, while the next batch is already streaming.
+
+    Inputs written after clock edge n are sampled at edge n + 1, outputs set at edge m are read after edge m + 1,
+    therefore a result is received latency + IO_DELAY clock cycles after its operands were written.
+    '''
+    IO_DELAY = 2
+
+    def __init__(self, clk, valid_i, inputs, valid_o, outputs, BATCH_LEN = 2 ** 14):
+        self.clk = clk
+        self.valid_i = valid_i
+        self.inputs = list(inputs)
+        self.valid_o = valid_o
+        self.outputs = list(outputs)
+        self.BATCH_LEN = BATCH_LEN
+        self.input_masks = [(1 << len(handle)) - 1 for handle in self.inputs]
+        self.output_masks = [(1 << len(handle)) - 1 for handle in self.outputs]
+        self.num_checked = 0
+
+    def _batch(self, model, operands, start):
+        """clock cycles to send the operands, and the expected results and the clock cycles to receive them"""
+        intervals = model.interval(*operands)
+        send_clks = start + np.concatenate(([0], np.cumsum(intervals)[:-1]))
+        expected = model.calc(*operands)
+        if not isinstance(expected, tuple):
+            expected = (expected,)
+        expected = [np.asarray(e).astype(object) & mask for e, mask in zip(expected, self.output_masks)]
+        receive_clks = send_clks + model.latency(*operands) + self.IO_DELAY
+        return send_clks, start + int(np.sum(intervals)), expected, receive_clks
+
+    def _check(self, batch, received, received_clks):
+        operands, expected, receive_clks = batch
+        received = np.array(received, object).reshape(len(received), len(self.outputs))
+        for k, handle in enumerate(self.outputs):
+            mismatch = np.flatnonzero(expected[k] != received[:, k])
+            if len(mismatch):
+                i = mismatch[0]
+                raise AssertionError(f'{len(mismatch)} wrong results in {handle._name}, first at vector {self.num_checked + i}: '
+                    f'operands {[int(op[i]) for op in operands]} gave {received[i, k]} instead of {expected[k][i]}')
+        mismatch = np.flatnonzero(np.asarray(received_clks) != receive_clks)
+        if len(mismatch):
+            i = mismatch[0]
+            raise AssertionError(f'{len(mismatch)} results with wrong latency, first at vector {self.num_checked + i}: '
+                f'received at clock cycle {received_clks[i]} instead of {receive_clks[i]}')
+        self.num_checked += len(receive_clks)
+
+    async def run(self, model, *operands, MAX_DRAIN_CLKS = 1000):
+        """send all operand sets and check all results, returns the number of checked results"""
+        operands = [np.asarray(op) for op in operands]
+        num = len(operands[0])
+        pending = []
+        received = []
+        received_clks = []
+        send_clks = []
+        send_data = []
+        send_pos = 0
+        next_batch = 0
+        start = 0
+        clk_cnt = 0
+        last_send_clk = 0
+        valid = None
+        edge = RisingEdge(self.clk)
+        while True:
+            if send_pos == len(send_clks) and next_batch < num:
+                batch_ops = [op[next_batch:next_batch + self.BATCH_LEN] for op in operands]
+                batch_send_clks, start, expected, receive_clks = self._batch(model, batch_ops, max(start, clk_cnt))
+                send_clks = batch_send_clks.tolist()
+                send_data = list(zip(*[(op.astype(object) & mask).tolist() for op, mask in zip(batch_ops, self.input_masks)]))
+                send_pos = 0
+                pending.append((batch_ops, expected, receive_clks))
+                next_batch += self.BATCH_LEN
+                last_send_clk = send_clks[-1]
+
+            await edge
+
+            if int(self.valid_o.value):
+                if not pending:
+                    raise AssertionError(f'unexpected result at clock cycle {clk_cnt}')
+                received.append([int(handle.value) for handle in self.outputs])
+                received_clks.append(clk_cnt)
+                if len(received) == len(pending[0][2]):
+                    self._check(pending.pop(0), received, received_clks)
+                    received = []
+                    received_clks = []
+
+            if send_pos < len(send_clks) and send_clks[send_pos] == clk_cnt:
+                for handle, value in zip(self.inputs, send_data[send_pos]):
+                    handle.value = value
+                send_pos += 1
+                if valid != 1:
+                    self.valid_i.value = 1
+                    valid = 1
+            elif valid != 0:
+                self.valid_i.value = 0
+                valid = 0
+
+            clk_cnt += 1
+            if not pending and next_batch >= num:
+                break
+            if send_pos == len(send_clks) and next_batch >= num and clk_cnt > last_send_clk + MAX_DRAIN_CLKS:
+                raise AssertionError(f'received only {self.num_checked + len(received)} of {num} results')
+        return self.num_checked
@@ -0,0 +1,132 @@
+import numpy as np
+import scipy.signal
+import importlib.util
+import argparse
+import sys
+import os
+
+spec = importlib.util.spec_from_file_location('iq_codec', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'iq_codec.py'))
+iq_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(iq_codec)
+
+class StreamDecimator:
+    '''
+    Streaming version of scipy.signal.decimate(x, DEC_FACTOR, ftype = 'fir') with frequency shift and quantization
+
+    The filter is the same zero phase FIR that scipy.signal.decimate() uses, process() can be called with
+    consecutive blocks of any size and gives the same result as decimating the whole signal at once.
+    The last block has to be marked with last = True, so that the end is zero padded like in scipy.
+
+    The decimated samples are multiplied with exp(j * 2 * pi * FREQ_SHIFT / FS * n) and SCALE,
+    FS is the output sample rate and n counts the output samples. If IN_DW is not 0, the output
+    is truncated to integers and packed into IN_DW bit s_axis_in_tdata words with the imaginary part in the upper half.
+    max_re and max_im keep the largest real and imaginary value of the output before scaling.
+    '''
+    def __init__(self, DEC_FACTOR, FREQ_SHIFT = 0, FS = 1, SCALE = 1, IN_DW = 0):
+        self.DEC_FACTOR = int(DEC_FACTOR)
+        self.FREQ_SHIFT = FREQ_SHIFT
+        self.FS = FS
+        self.SCALE = SCALE
+        self.IN_DW = int(IN_DW)
+        if self.DEC_FACTOR > 1:
+            self.taps = scipy.signal.firwin(20 * self.DEC_FACTOR + 1, 1. / self.DEC_FACTOR, window = 'hamming')
+        else:
+            self.taps = np.ones(1)
+        self.DELAY = (len(self.taps) - 1) // 2
+        self.reset()
+
+    def reset(self):
+        # zero padding in front of the signal, like scipy.signal.resample_poly() does
+        self.buffer = np.zeros(self.DELAY, 'complex')
+        self.in_cnt = 0
+        self.out_cnt = 0
+        self.max_re = -np.inf
+        self.max_im = -np.inf
+
+    def process(self, data, last = False):
+        """decimate the next block of input samples, returns all output samples that can be calculated so far"""
+        data = np.asarray(data)
+        self.in_cnt += len(data)
+        buffer = np.concatenate((self.buffer, data))
+        if last:
+            buffer = np.concatenate((buffer, np.zeros(self.DELAY)))
+        # output n needs the input samples up to n * DEC_FACTOR + DELAY
+        num_out = max((len(buffer) - len(self.taps)) // self.DEC_FACTOR + 1, 0)
+        if last:
+            num_out = min(num_out, -(-self.in_cnt // self.DEC_FACTOR) - self.out_cnt)
+        if num_out == 0:
+            self.buffer = buffer
+            return self._output(np.zeros(0, 'complex'))
+        if self.DEC_FACTOR > 1:
+            needed = buffer[:(num_out - 1) * self.DEC_FACTOR + len(self.taps)]
+            result = scipy.signal.upfirdn(self.taps, needed, 1, self.DEC_FACTOR)[len(self.taps) // self.DEC_FACTOR:][:num_out]
+        else:
+            result = buffer[:num_out].astype('complex')
+        self.buffer = buffer[num_out * self.DEC_FACTOR:]
+        return self._output(result)
+
+    def _output(self, result):
+        n = self.out_cnt + np.arange(len(result))
+        self.out_cnt += len(result)
+        if len(result) > 0:
+            self.max_re = max(self.max_re, result.real.max())
+            self.max_im = max(self.max_im, result.imag.max())
+        if self.FREQ_SHIFT != 0:
+            result = result * np.exp(1j * 2 * np.pi * self.FREQ_SHIFT / self.FS * n)
+        result = result * self.SCALE
+        if self.IN_DW == 0:
+            return result
+        return pack(result, self.IN_DW)
+
+def pack(waveform, IN_DW):
+    """truncate complex samples to integers and pack them into IN_DW bit words, the imaginary part is in the upper half"""
+    return iq_codec.encode(waveform, IN_DW)
+
+def unpack(tdata, IN_DW):
+    """inverse of pack(), returns complex samples with integer real and imaginary parts"""
+    return iq_codec.decode(tdata, IN_DW)
+
+def blocks(reader, DEC_FACTOR, count = None, chunk_len = 2 ** 20, **kwargs):
+    """generator for the decimated samples of a SigMFReader, only the input that is needed for count output samples is read
+
+    kwargs are passed to StreamDecimator
+    """
+    decimator = StreamDecimator(DEC_FACTOR, **kwargs)
+    num_in = len(reader) if count is None else min(count * decimator.DEC_FACTOR + decimator.DELAY, len(reader))
+    num_out = 0
+    for pos in range(0, max(num_in, 1), chunk_len):
+        last = pos + chunk_len >= num_in and num_in == len(reader)
+        block = decimator.process(reader.read_samples(pos, min(chunk_len, num_in - pos)), last)
+        if count is not None:
+            block = block[:count - num_out]
+        num_out += len(block)
+        yield block
+
+def decimate(reader, DEC_FACTOR, count = None, chunk_len = 2 ** 20, **kwargs):
+    """decimated samples of a SigMFReader as one array, the same as scipy.signal.decimate(reader.read_samples(), DEC_FACTOR, ftype = 'fir')[:count]"""
+    result = list(blocks(reader, DEC_FACTOR, count, chunk_len, **kwargs))
+    return np.concatenate(result) if result else np.zeros(0, 'complex')
+
+def peak(reader, DEC_FACTOR, chunk_len = 2 ** 20):
+    """returns the largest real and imaginary value of the whole decimated signal, which testbenches use for normalization"""
+    decimator = StreamDecimator(DEC_FACTOR)
+    for pos in range(0, len(reader), chunk_len):
+        decimator.process(reader.read_samples(pos, chunk_len), pos + chunk_len >= len(reader))
+    return decimator.max_re, decimator.max_im
+
+def main(args):
+    print(sys.argv)
+
+    parser = argparse.ArgumentParser(description='Shows the peak values of a decimated SigMF recording')
+    parser.add_argument('--file', metavar='file', required=True, help='.sigmf-data file')
+    parser.add_argument('--dec_factor', metavar='dec_factor', required=False, default = 1, help='decimation factor')
+    args = parser.parse_args(args)
+
+    spec = importlib.util.spec_from_file_location('sigmf_reader', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sigmf_reader.py'))
+    sigmf_reader = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sigmf_reader)
+    max_re, max_im = peak(sigmf_reader.SigMFReader(args.file), int(args.dec_factor))
+    print(f'max real = {max_re}, max imag = {max_im}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,70 @@
+import numpy as np
+
+def schedule(num_samples, IDLE_CLKS = 0, JITTER_SEQ = None, DELAY = 0):
+    '''
+    Sample index for every clock cycle until the last sample is sent, -1 means s_axis_in_tvalid = 0
+
+    After each valid cycle IDLE_CLKS cycles with valid = 0 follow. If JITTER_SEQ is given, the idle cycle that ends
+    a sample period at clock cycle n adds JITTER_SEQ[n % len(JITTER_SEQ)] extra idle cycles to the next period.
+    DELAY inserts idle cycles before the first sample.
+    '''
+    if IDLE_CLKS == 0 or JITTER_SEQ is None:
+        period = IDLE_CLKS + 1
+        starts = DELAY + np.arange(num_samples) * period
+    else:
+        JITTER_SEQ = np.asarray(JITTER_SEQ, int)
+        n = len(JITTER_SEQ)
+        # the period that starts at clock cycle s has step[s % n] cycles, so the period lengths only depend on
+        # s % n and repeat after at most n periods, only this prefix and cycle are followed period by period
+        step = 1 + IDLE_CLKS + JITTER_SEQ[(np.arange(n) - 1) % n]
+        orbit = []
+        seen = {}
+        r = (DELAY + 1 + IDLE_CLKS) % n
+        while r not in seen:
+            seen[r] = len(orbit)
+            orbit.append(r)
+            r = (r + step[r]) % n
+        orbit = np.array(orbit)
+        cycle_start = seen[r]
+        i = np.arange(max(num_samples - 1, 0))
+        residues = orbit[np.where(i < cycle_start, i, cycle_start + (i - cycle_start) % (len(orbit) - cycle_start))]
+        # the first period has no extra cycles
+        periods = np.concatenate(([1 + IDLE_CLKS], step[residues]))[:num_samples]
+        starts = DELAY + np.concatenate(([0], np.cumsum(periods)[:-1]))[:num_samples]
+    index = np.full(starts[-1] + 1 if num_samples else DELAY, -1, int)
+    index[starts] = np.arange(num_samples)
+    return index
+
+class StreamDriver:
+    '''
+    Drives tdata and tvalid of an AXI-stream input from precomputed arrays
+
+    tdata are the already packed words (see stream_decimator.pack()), the valid/idle pattern is calculated
+    up front with schedule(). drive() only looks up the sample for the current clock cycle
+    and writes to the DUT if something changes.
+    '''
+    def __init__(self, tdata_handle, tvalid_handle, tdata, IDLE_CLKS = 0, JITTER_SEQ = None, DELAY = 0):
+        self.tdata_handle = tdata_handle
+        self.tvalid_handle = tvalid_handle
+        self.tdata = np.asarray(tdata, np.int64).tolist()
+        self.index = schedule(len(self.tdata), IDLE_CLKS, JITTER_SEQ, DELAY).tolist()
+        self.valid = None
+
+    def __len__(self):
+        """number of clock cycles until all samples are sent"""
+        return len(self.index)
+
+    def drive(self, clk_cnt):
+        """set the inputs for clock cycle clk_cnt, returns the word that is sent or None"""
+        i = self.index[clk_cnt] if clk_cnt < len(self.index) else -1
+        if i < 0:
+            if self.valid != 0:
+                self.tvalid_handle.value = 0
+                self.valid = 0
+            return None
+        data = self.tdata[i]
+        self.tdata_handle.value = data
+        if self.valid != 1:
+            self.tvalid_handle.value = 1
+            self.valid = 1
+        return data
@@ -0,0 +1,174 @@
+import numpy as np
+import importlib.util
+import os
+import cocotb
+from cocotb.triggers import RisingEdge
+
+spec = importlib.util.spec_from_file_location('iq_codec', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'iq_codec.py'))
+iq_codec = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(iq_codec)
+
+class RingBuffer:
+    '''
+    Preallocated ring buffer for rows of integers
+
+    push() writes one row without allocating, the buffer doubles its size if it gets full so that nothing is lost.
+    data() returns all rows that were not read with pop() yet.
+    '''
+    def __init__(self, width, capacity = 2 ** 12, dtype = np.int64):
+        self.buffer = np.zeros((capacity, width), dtype)
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, row):
+        if self.size == len(self.buffer):
+            self.buffer = np.concatenate((self.data(), np.zeros_like(self.buffer)))
+            self.head = 0
+        self.buffer[(self.head + self.size) % len(self.buffer)] = row
+        self.size += 1
+
+    def data(self):
+        return np.roll(self.buffer, -self.head, axis = 0)[:self.size]
+
+    def pop(self):
+        """return and remove all rows"""
+        rows = self.data()
+        self.head = (self.head + self.size) % len(self.buffer)
+        self.size = 0
+        return rows
+
+class ResourceGridCapture:
+    '''
+    Capture buffer for the packets of ressource_grid_framer
+
+    Each packet is one symbol: the block exponent, the 64 bit timestamp in 64 / IQ_WIDTH words (LSB first) and
+    SYMBOL_LEN I/Q samples, the last word has tlast set. push() takes rows [clk_cnt, tdata, tlast] like a
+    RingBuffer, so it can be used as buffer of a StreamMonitor stream. The words of a packet are collected
+    in a preallocated array and decoded into the typed arrays blk_exp, timestamp and iq when tlast arrives.
+    Storage is allocated in chunks of FRAME_LEN symbols, frame() returns views without copying.
+    '''
+    FRAME_LEN = 140
+
+    def __init__(self, SYMBOL_LEN, IQ_WIDTH = 16):
+        self.SYMBOL_LEN = SYMBOL_LEN
+        self.IQ_WIDTH = IQ_WIDTH
+        self.NUM_TIMESTAMP_SAMPLES = 64 // IQ_WIDTH
+        self.PACKET_LEN = 1 + self.NUM_TIMESTAMP_SAMPLES + SYMBOL_LEN
+        self.words = np.zeros(self.PACKET_LEN, np.int64)
+        self.word_cnt = 0
+        self.frames = []
+        self.size = 0
+
+    def __len__(self):
+        """number of received symbols"""
+        return self.size
+
+    def push(self, row):
+        if self.word_cnt == self.PACKET_LEN:
+            raise ValueError(f'ressource_grid_framer packet is longer than {self.PACKET_LEN} words')
+        self.words[self.word_cnt] = row[1]
+        self.word_cnt += 1
+        if row[2]:
+            if self.word_cnt != self.PACKET_LEN:
+                raise ValueError(f'ressource_grid_framer packet has {self.word_cnt} words instead of {self.PACKET_LEN}')
+            self._decode()
+            self.word_cnt = 0
+
+    def _decode(self):
+        if self.size == len(self.frames) * self.FRAME_LEN:
+            self.frames.append((np.zeros(self.FRAME_LEN, np.uint8), np.zeros(self.FRAME_LEN, np.uint64),
+                np.zeros((self.FRAME_LEN, self.SYMBOL_LEN), np.complex64)))
+        blk_exp, timestamp, samples = self.frames[-1]
+        i = self.size % self.FRAME_LEN
+        blk_exp[i] = self.words[0]
+        ts = self.words[1:1 + self.NUM_TIMESTAMP_SAMPLES].astype(np.uint64) & np.uint64(2 ** self.IQ_WIDTH - 1)
+        timestamp[i] = np.bitwise_or.reduce(ts << (np.arange(self.NUM_TIMESTAMP_SAMPLES, dtype = np.uint64) * np.uint64(self.IQ_WIDTH)))
+        samples[i] = iq_codec.decode(self.words[1 + self.NUM_TIMESTAMP_SAMPLES:], self.IQ_WIDTH)
+        self.size += 1
+
+    def frame(self, n):
+        """views of blk_exp, timestamp and iq of the symbols n * FRAME_LEN .. (n + 1) * FRAME_LEN - 1"""
+        num = min(self.size - n * self.FRAME_LEN, self.FRAME_LEN)
+        return tuple(array[:num] for array in self.frames[n])
+
+    def blk_exp(self):
+        return np.concatenate([self.frame(n)[0] for n in range(len(self.frames))] or [np.zeros(0, np.uint8)])
+
+    def timestamp(self):
+        return np.concatenate([self.frame(n)[1] for n in range(len(self.frames))] or [np.zeros(0, np.uint64)])
+
+    def iq(self):
+        return np.concatenate([self.frame(n)[2] for n in range(len(self.frames))] or [np.zeros((0, self.SYMBOL_LEN), np.complex64)])
+
+class Stream:
+    '''
+    Valid-qualified beats of one stream, each row of the buffer is [clk_cnt, field_0, field_1, ...]
+    '''
+    def __init__(self, valid, fields, capacity, buffer = None):
+        self.valid = valid
+        self.names = list(fields.keys())
+        self.handles = list(fields.values())
+        self.buffer = RingBuffer(len(self.handles) + 1, capacity) if buffer is None else buffer
+        self.row = np.zeros(len(self.handles) + 1, np.int64)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __getitem__(self, name):
+        """column of all captured beats, 'clk' is the clock cycle of each beat"""
+        if name == 'clk':
+            return self.buffer.data()[:, 0]
+        return self.buffer.data()[:, 1 + self.names.index(name)]
+
+class StreamMonitor:
+    '''
+    Captures the beats of several AXI-streams or valid qualified outputs of a DUT
+
+    One coroutine samples all streams on every rising edge of clk. Per clock it only reads the valid signals
+    and, if valid is set, the raw integer value of the fields of that stream. Everything else like the
+    conversion to signed or complex numbers is done afterwards for all beats at once with iq_codec.
+    '''
+    def __init__(self, clk, capacity = 2 ** 12):
+        self.clk = clk
+        self.capacity = capacity
+        self.streams = {}
+        self.clk_cnt = 0
+        self.running = False
+
+    def add_stream(self, name, valid, buffer = None, **fields):
+        """capture the fields whenever valid is 1, a stream without fields only records the clock cycles
+
+        buffer can be any object with a push(row) method like ResourceGridCapture, the default is a RingBuffer
+        """
+        self.streams[name] = Stream(valid, fields, self.capacity, buffer)
+        return self.streams[name]
+
+    def __getitem__(self, name):
+        return self.streams[name]
+
+    def start(self, num_clks = None):
+        """start sampling, stops after num_clks clock cycles or when stop() is called"""
+        self.running = True
+        return cocotb.start_soon(self._run(num_clks))
+
+    def stop(self):
+        self.running = False
+
+    async def _run(self, num_clks):
+        streams = list(self.streams.values())
+        edge = RisingEdge(self.clk)
+        end = None if num_clks is None else self.clk_cnt + num_clks
+        while self.running and self.clk_cnt != end:
+            await edge
+            for stream in streams:
+                if int(stream.valid.value):
+                    row = stream.row
+                    row[0] = self.clk_cnt
+                    for i, handle in enumerate(stream.handles):
+                        row[i + 1] = int(handle.value)
+                    stream.buffer.push(row)
+            self.clk_cnt += 1
+        self.running = False